@@ -1,9 +1,15 @@
 import os
-from flask import Flask, render_template, request, jsonify
+import click
+from flask import Flask, Response, render_template, request, jsonify, send_file, abort
 from flask_socketio import SocketIO, emit
 from dotenv import load_dotenv
+from models.session_manager import SessionManager
 from models.mbti_analyzer import MBTIAnalyzer
+from models.content_cache import prewarm
+from models.answer_classifier import AnswerClassifier, ExampleLog
 from models.voice_processor import VoiceProcessor
+from models.metrics import REGISTRY, Gauge
+from models.tracing import span
 
 # Load environment variables
 load_dotenv()
@@ -16,12 +22,28 @@ if not os.environ.get("OPENAI_API_KEY"):
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'mbti-personality-test'
-socketio = SocketIO(app, cors_allowed_origins="*")
+# A message queue (e.g. redis://...) lets several workers or nodes emit to any client
+socketio = SocketIO(
+    app,
+    cors_allowed_origins="*",
+    message_queue=os.environ.get("SOCKETIO_MESSAGE_QUEUE")
+)
 
-# Initialize MBTI analyzer and voice processor
-mbti_analyzer = MBTIAnalyzer()
+# Initialize per-client sessions and voice processor
+sessions = SessionManager()
 voice_processor = VoiceProcessor()
 
+# Load of this process, read whenever /metrics is scraped
+gateway = sessions.resources.gateway
+Gauge('mbti_active_sessions', 'Client connections bound to a test session', sessions.connections)
+Gauge('mbti_llm_queue_depth', 'LLM calls waiting for a gateway slot', lambda: gateway.waiting)
+Gauge('mbti_llm_in_flight', 'LLM calls being answered', lambda: gateway.in_flight)
+Gauge('mbti_llm_fallback_sites', 'Call sites currently routed to their fallback model',
+      lambda: sum(1 for site in gateway.router.stats().values() if site['degraded']))
+
+# Largest microphone frame accepted from a client (about two seconds of audio)
+MAX_AUDIO_CHUNK_BYTES = 64 * 1024
+
 @app.route('/')
 def index():
     """Render the main page of the application."""
@@ -32,57 +54,179 @@ def result():
     """Render the result page of the application."""
     return render_template('result.html')
 
-def handle_voice_input(text):
-    """Handle voice input from the speech recognition."""
-    # Process the voice input and emit response
-    response, is_complete, mbti_result = mbti_analyzer.process_message(text)
+@app.route('/metrics')
+def metrics():
+    """Expose this process's metrics in the Prometheus text format."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.cli.command('prewarm-content')
+@click.option('--refresh', is_flag=True, help='Regenerate variants that are already cached.')
+def prewarm_content(refresh):
+    """Fill the type content cache for every MBTI type."""
+    resources = sessions.resources
+    generated = prewarm(resources.content_cache, resources.type_generators, refresh=refresh)
+    click.echo(f"Generated {generated} cached variants in {resources.content_cache.path}")
+
+@app.cli.command('train-classifier')
+@click.option('--epochs', default=5, help='Passes over the logged examples.')
+def train_classifier(epochs):
+    """Train the local answer classifier from the analyses logged to MBTI_CLASSIFIER_LOG."""
+    log_path = os.environ.get("MBTI_CLASSIFIER_LOG")
+    if not log_path:
+        raise click.UsageError("Set MBTI_CLASSIFIER_LOG to the log of analysed answers")
+    examples = ExampleLog(log_path).read()
+    held_out = examples[::10]
+    classifier = AnswerClassifier().train([e for i, e in enumerate(examples) if i % 10], epochs=epochs)
     
-    # Emit the response back to the client
-    socketio.emit('response', {
-        'message': response,
-        'is_complete': is_complete,
-        'mbti_result': mbti_result,
-        'voice_input': text
-    })
+    # Agreement with the LLM on answers the model has not seen
+    agree = total = 0
+    for text, analysis in held_out:
+        predicted = classifier.analyze(text)['dimension_analysis']
+        for dimension, data in ((analysis or {}).get('dimension_analysis') or {}).items():
+            if dimension in predicted:
+                total += 1
+                agree += predicted[dimension]['preference'] == data.get('preference')
     
-    # Convert response to speech
-    voice_processor.text_to_speech(response)
+    classifier = AnswerClassifier().train(examples, epochs=epochs)
+    path = os.environ.get("MBTI_CLASSIFIER_PATH", os.path.join("cache", "classifier", "model.json"))
+    classifier.save(path)
+    accuracy = f"{agree / total:.0%}" if total else "n/a"
+    click.echo(f"Trained on {classifier.examples} examples, held-out agreement {accuracy}, saved to {path}")
+
+@app.route('/audio/<digest>.mp3')
+def audio(digest):
+    """Serve synthesized speech from the audio cache."""
+    path = voice_processor.audio_path(digest)
+    if path is None:
+        abort(404)
+    return send_file(path, mimetype='audio/mpeg', max_age=31536000)
+
+@app.route('/report/<section>')
+def report_section(section):
+    """Return one section of a completed session's report, generating it on first request."""
+    token = request.headers.get('X-Session-Token')
+    if not token or section not in MBTIAnalyzer.report_section_names:
+        abort(404)
+    with span("http.report_section", section=section):
+        try:
+            content = sessions.report_section(token, section)
+        except ValueError:
+            abort(404)
+    return jsonify({'section': section, 'content': content})
+
+def speak_to(sid, text):
+    """Synthesize text off the request path and tell one client where to fetch the audio."""
+    voice_processor.text_to_speech(
+        text,
+        lambda digest: socketio.emit('audio', {'url': f'/audio/{digest}.mp3'}, to=sid)
+    )
+
+def stream_to(sid):
+    """Build a token callback forwarding LLM output to one client as response_chunk events."""
+    def on_token(section, token):
+        socketio.emit('response_chunk', {'section': section, 'token': token}, to=sid)
+    return on_token
+
+def handle_voice_input(sid, token, text):
+    """Handle voice input from the speech recognition."""
+    with span("voice.message"):
+        # Show the final transcript before the answer starts streaming
+        socketio.emit('transcript', {'text': text, 'final': True}, to=sid)
+        
+        # Process the voice input and emit response
+        with sessions.session(token) as mbti_analyzer:
+            response, is_complete, mbti_result = mbti_analyzer.process_message(text, stream_to(sid))
+        
+        # Emit the response back to the client
+        socketio.emit('response', {
+            'message': response,
+            'is_complete': is_complete,
+            'mbti_result': mbti_result,
+            'voice_input': text
+        }, to=sid)
+        
+        # Convert response to speech
+        speak_to(sid, response)
+
+@socketio.on('connect')
+def handle_connect(auth=None):
+    """Bind the connection to a new or resumed session."""
+    token = (auth or {}).get('session_token')
+    token = sessions.bind(request.sid, token)
+    emit('session', {'session_token': token})
 
 @socketio.on('message')
 def handle_message(data):
     """Handle incoming messages from the client."""
     user_message = data.get('message', '')
     
-    # Process the message and get a response
-    response, is_complete, mbti_result = mbti_analyzer.process_message(user_message)
-    
-    # Emit the response back to the client
-    emit('response', {
-        'message': response,
-        'is_complete': is_complete,
-        'mbti_result': mbti_result,
-        'voice_input': None
-    })
-    
-    # Convert response to speech
-    voice_processor.text_to_speech(response)
+    with span("socket.message"):
+        # Process the message and get a response
+        with sessions.session(sessions.token_for(request.sid)) as mbti_analyzer:
+            response, is_complete, mbti_result = mbti_analyzer.process_message(
+                user_message, stream_to(request.sid)
+            )
+        
+        # Emit the response back to the client
+        emit('response', {
+            'message': response,
+            'is_complete': is_complete,
+            'mbti_result': mbti_result,
+            'voice_input': None
+        })
+        
+        # Convert response to speech
+        speak_to(request.sid, response)
+
+@socketio.on('typing')
+def handle_typing():
+    """Start drafting the next question while the user is still typing their answer."""
+    sessions.prefetch(sessions.token_for(request.sid))
+
+@socketio.on('report_section')
+def handle_report_section(data):
+    """Stream one section of the report to the client once it opens it."""
+    section = (data or {}).get('section')
+    if section not in MBTIAnalyzer.report_section_names:
+        return
+    with span("socket.report_section", section=section):
+        try:
+            content = sessions.report_section(sessions.token_for(request.sid), section, stream_to(request.sid))
+        except ValueError:
+            return
+        emit('report_section', {'section': section, 'content': content})
 
 @socketio.on('start_voice')
 def handle_start_voice():
-    """Start voice recognition."""
-    success = voice_processor.start_listening(handle_voice_input)
+    """Start recognizing the audio this client is about to stream."""
+    sid = request.sid
+    token = sessions.token_for(sid)
+    success = voice_processor.start_listening(
+        sid,
+        lambda text: socketio.emit('transcript', {'text': text, 'final': False}, to=sid),
+        # Run the turn as its own task, off the recognizer's shared worker
+        lambda text: socketio.start_background_task(handle_voice_input, sid, token, text)
+    )
     emit('voice_status', {'status': 'started' if success else 'error'})
 
+@socketio.on('audio_chunk')
+def handle_audio_chunk(chunk):
+    """Receive a binary frame of 16 kHz, 16-bit mono PCM from the client's microphone."""
+    if not isinstance(chunk, (bytes, bytearray)) or len(chunk) > MAX_AUDIO_CHUNK_BYTES:
+        return
+    voice_processor.feed_audio(request.sid, bytes(chunk))
+
 @socketio.on('stop_voice')
 def handle_stop_voice():
     """Stop voice recognition."""
-    voice_processor.stop_listening()
+    voice_processor.stop_listening(request.sid)
     emit('voice_status', {'status': 'stopped'})
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    """Clean up resources on client disconnect."""
-    voice_processor.cleanup()
+    """Release the connection; its session stays resumable until it expires."""
+    voice_processor.stop_listening(request.sid)
+    sessions.unbind(request.sid)
 
 if __name__ == '__main__':
     try:
@@ -0,0 +1,155 @@
+"""
+Asyncio-native server: the same app with the conversation pipeline running on one event loop.
+
+Socket.IO events are handled by coroutines that await the LLM calls, so a turn waiting
+on the model holds no thread. Plain HTTP routes are served by the Flask app from app.py.
+
+Usage:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+import os
+import asyncio
+import socketio
+from asgiref.wsgi import WsgiToAsgi
+import app as wsgi
+from models.mbti_analyzer import MBTIAnalyzer
+from models.tracing import span
+
+sessions = wsgi.sessions
+voice_processor = wsgi.voice_processor
+
+# A message queue (e.g. redis://...) lets several workers or nodes emit to any client
+message_queue = os.environ.get("SOCKETIO_MESSAGE_QUEUE")
+sio = socketio.AsyncServer(
+    async_mode='asgi',
+    cors_allowed_origins="*",
+    client_manager=socketio.AsyncRedisManager(message_queue) if message_queue else None
+)
+app = socketio.ASGIApp(
+    sio,
+    other_asgi_app=WsgiToAsgi(wsgi.app),
+    on_shutdown=sessions.resources.gateway.aclose
+)
+
+# Emits started from callbacks, kept until they finish so they are not garbage collected
+_pending = set()
+
+def spawn(coro):
+    """Run a coroutine in the background on the running loop."""
+    task = asyncio.get_running_loop().create_task(coro)
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+    return task
+
+def emit_threadsafe(loop, event, data, sid):
+    """Emit to one client from a worker thread, e.g. a speech recognizer or synthesizer."""
+    asyncio.run_coroutine_threadsafe(sio.emit(event, data, to=sid), loop)
+
+def speak_to(sid, text):
+    """Synthesize text off the loop and tell one client where to fetch the audio."""
+    loop = asyncio.get_running_loop()
+    voice_processor.text_to_speech(
+        text,
+        lambda digest: emit_threadsafe(loop, 'audio', {'url': f'/audio/{digest}.mp3'}, sid)
+    )
+
+def stream_to(sid):
+    """Build a token callback forwarding LLM output to one client as response_chunk events."""
+    def on_token(section, token):
+        spawn(sio.emit('response_chunk', {'section': section, 'token': token}, to=sid))
+    return on_token
+
+async def handle_voice_input(sid, token, text):
+    """Handle voice input from the speech recognition."""
+    with span("voice.message"):
+        # Show the final transcript before the answer starts streaming
+        await sio.emit('transcript', {'text': text, 'final': True}, to=sid)
+
+        async with sessions.asession(token) as mbti_analyzer:
+            response, is_complete, mbti_result = await mbti_analyzer.aprocess_message(text, stream_to(sid))
+
+        await sio.emit('response', {
+            'message': response,
+            'is_complete': is_complete,
+            'mbti_result': mbti_result,
+            'voice_input': text
+        }, to=sid)
+        speak_to(sid, response)
+
+@sio.event
+async def connect(sid, environ, auth=None):
+    """Bind the connection to a new or resumed session."""
+    token = (auth or {}).get('session_token')
+    token = await asyncio.to_thread(sessions.bind, sid, token)
+    await sio.emit('session', {'session_token': token}, to=sid)
+
+@sio.event
+async def message(sid, data):
+    """Handle incoming messages from the client."""
+    user_message = (data or {}).get('message', '')
+
+    with span("socket.message"):
+        token = await asyncio.to_thread(sessions.token_for, sid)
+        async with sessions.asession(token) as mbti_analyzer:
+            response, is_complete, mbti_result = await mbti_analyzer.aprocess_message(
+                user_message, stream_to(sid)
+            )
+
+        await sio.emit('response', {
+            'message': response,
+            'is_complete': is_complete,
+            'mbti_result': mbti_result,
+            'voice_input': None
+        }, to=sid)
+        speak_to(sid, response)
+
+@sio.event
+async def typing(sid):
+    """Start drafting the next question while the user is still typing their answer."""
+    token = await asyncio.to_thread(sessions.token_for, sid)
+    sessions.prefetch(token, asynchronous=True)
+
+@sio.event
+async def report_section(sid, data):
+    """Stream one section of the report to the client once it opens it."""
+    section = (data or {}).get('section')
+    if section not in MBTIAnalyzer.report_section_names:
+        return
+    with span("socket.report_section", section=section):
+        try:
+            token = await asyncio.to_thread(sessions.token_for, sid)
+            content = await sessions.areport_section(token, section, stream_to(sid))
+        except ValueError:
+            return
+        await sio.emit('report_section', {'section': section, 'content': content}, to=sid)
+
+@sio.event
+async def start_voice(sid):
+    """Start recognizing the audio this client is about to stream."""
+    loop = asyncio.get_running_loop()
+    token = await asyncio.to_thread(sessions.token_for, sid)
+    success = voice_processor.start_listening(
+        sid,
+        lambda text: emit_threadsafe(loop, 'transcript', {'text': text, 'final': False}, sid),
+        lambda text: asyncio.run_coroutine_threadsafe(handle_voice_input(sid, token, text), loop)
+    )
+    await sio.emit('voice_status', {'status': 'started' if success else 'error'}, to=sid)
+
+@sio.event
+async def audio_chunk(sid, chunk):
+    """Receive a binary frame of 16 kHz, 16-bit mono PCM from the client's microphone."""
+    if not isinstance(chunk, (bytes, bytearray)) or len(chunk) > wsgi.MAX_AUDIO_CHUNK_BYTES:
+        return
+    voice_processor.feed_audio(sid, bytes(chunk))
+
+@sio.event
+async def stop_voice(sid):
+    """Stop voice recognition."""
+    voice_processor.stop_listening(sid)
+    await sio.emit('voice_status', {'status': 'stopped'}, to=sid)
+
+@sio.event
+async def disconnect(sid):
+    """Release the connection; its session stays resumable until it expires."""
+    voice_processor.stop_listening(sid)
+    sessions.unbind(sid)
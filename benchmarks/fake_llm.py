@@ -0,0 +1,203 @@
+import json
+import asyncio
+import math
+import random
+import threading
+import time
+import zlib
+import contextvars
+from typing import Any
+from langchain.chat_models.base import SimpleChatModel
+from langchain.schema import AIMessage, ChatGeneration, ChatResult
+from models.llm_gateway import current_session
+from models.memory import estimate_tokens
+
+# Turn of the simulated session an LLM call belongs to; set by the benchmark driver
+current_turn = contextvars.ContextVar("current_turn", default=None)
+
+# Guards FakeChatModel.sent, which counts how often each prompt was sent
+_sent_lock = threading.Lock()
+
+DIMENSIONS = ["E-I", "S-N", "T-F", "J-P"]
+
+QUESTIONS = [
+    "What does a really good weekend look like for you?",
+    "When a plan falls apart at the last minute, what do you do first?",
+    "Tell me about a decision you are proud of and how you reached it.",
+    "How do you usually recharge after a long week?",
+    "What kind of problems do you enjoy getting stuck into?",
+    "How do you keep track of the things you need to get done?",
+]
+
+REPORT_SENTENCE = (
+    "People with this type tend to bring steady energy to the things they care about "
+    "and notice patterns that others miss. "
+)
+
+class LatencyModel:
+    def __init__(self, spec="fixed:0"):
+        """
+        Distribution of simulated LLM response times in seconds.
+
+        Args:
+            spec (str): "fixed:SECONDS", "uniform:LOW,HIGH" or "lognormal:MEDIAN,SIGMA"
+        """
+        self.spec = spec
+        kind, _, params = spec.partition(":")
+        values = [float(v) for v in params.split(",") if v]
+        if kind == "fixed" and len(values) == 1:
+            self._sample = lambda rng: values[0]
+        elif kind == "uniform" and len(values) == 2:
+            self._sample = lambda rng: rng.uniform(values[0], values[1])
+        elif kind == "lognormal" and len(values) == 2:
+            self._sample = lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+        else:
+            raise ValueError(f"Invalid latency spec: {spec}")
+
+    def sample(self, rng):
+        """Draw one response time."""
+        return max(0.0, self._sample(rng))
+
+class CallRecorder:
+    def __init__(self):
+        """Thread-safe log of the LLM calls made during a benchmark run."""
+        self._lock = threading.Lock()
+        self.calls = []
+
+    def record(self, **call):
+        with self._lock:
+            self.calls.append(call)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.calls)
+
+def classify(prompt):
+    """Name the call site a prompt comes from."""
+    if "NEXT QUESTION:" in prompt:
+        return "turn"
+    if "Format the response as JSON" in prompt:
+        return "analysis"
+    if "Update the summary of a personality test conversation" in prompt:
+        return "summary"
+    if "Generate a natural follow-up question" in prompt:
+        return "question"
+    return "report"
+
+def persona_for(session_id):
+    """Pick the MBTI type a simulated session answers like, stable per session id."""
+    rng = random.Random(zlib.crc32(str(session_id).encode()))
+    return [rng.choice(pair.split("-")) for pair in DIMENSIONS]
+
+class FakeChatModel(SimpleChatModel):
+    """
+    Deterministic stand-in for ChatOpenAI.
+
+    Replies are canned per call site: JSON analyses that lean towards the session's
+    persona, questions, summaries and report text. Response times are drawn from
+    latency models seeded by the prompt and how often it was sent before, so the same
+    run produces the same calls and delays, while a retried or hedged request gets a
+    delay of its own. Tokens are streamed evenly over the response time. Async calls sleep on the
+    event loop, like a real async HTTP client.
+    """
+    latency: Any = None
+    latency_by_kind: dict = {}
+    seed: int = 0
+    report_words: int = 250
+    recorder: Any = None
+    streaming: bool = True
+    sent: dict = {}
+
+    @property
+    def _llm_type(self):
+        return "fake"
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt, kind, text, delay = self._prepare(messages)
+        start = time.perf_counter()
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            time.sleep(self._until_token(start, delay, i, len(words)))
+            if run_manager:
+                run_manager.on_llm_new_token(word if i == len(words) - 1 else word + " ")
+        time.sleep(self._until_token(start, delay, len(words), len(words)))
+        self._record(prompt, kind, text, start)
+        return text
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt, kind, text, delay = self._prepare(messages)
+        start = time.perf_counter()
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self._until_token(start, delay, i, len(words)))
+            if run_manager:
+                await run_manager.on_llm_new_token(word if i == len(words) - 1 else word + " ")
+        await asyncio.sleep(self._until_token(start, delay, len(words), len(words)))
+        self._record(prompt, kind, text, start)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    @staticmethod
+    def _until_token(start, delay, index, count):
+        """
+        Seconds to wait before streaming token `index` of `count`.
+
+        Roughly a third of the time passes before the first token, the rest is spread
+        evenly. Waiting for a point on that schedule, rather than a fixed step, keeps
+        timer overshoot from adding up over long replies.
+        """
+        due = start + delay / 3 + delay * 2 / 3 * index / count
+        return max(0.0, due - time.perf_counter())
+
+    def _prepare(self, messages):
+        """Return the prompt, its call site, the canned reply and the response time of a call."""
+        prompt = "\n".join(message.content for message in messages)
+        kind = classify(prompt)
+        session_id = current_session.get()
+        rng = random.Random(zlib.crc32(f"{self.seed}\0{session_id}\0{prompt}".encode()))
+        text = self._reply(kind, session_id, rng)
+
+        with _sent_lock:
+            repeat = self.sent.get((session_id, prompt), 0)
+            self.sent[(session_id, prompt)] = repeat + 1
+        latency = self.latency_by_kind.get(kind) or self.latency or LatencyModel()
+        delay_rng = random.Random(zlib.crc32(f"{self.seed}\0{session_id}\0{prompt}\0{repeat}".encode()))
+        return prompt, kind, text, latency.sample(delay_rng)
+
+    def _record(self, prompt, kind, text, start):
+        if self.recorder is not None:
+            self.recorder.record(
+                session=current_session.get(),
+                turn=current_turn.get(),
+                kind=kind,
+                prompt_tokens=estimate_tokens(prompt),
+                completion_tokens=estimate_tokens(text),
+                seconds=time.perf_counter() - start,
+            )
+
+    def _reply(self, kind, session_id, rng):
+        if kind == "analysis":
+            return self._analysis(session_id, rng)
+        if kind == "turn":
+            return self._analysis(session_id, rng) + "\nNEXT QUESTION: " + rng.choice(QUESTIONS)
+        if kind == "question":
+            return rng.choice(QUESTIONS)
+        if kind == "summary":
+            return "They recharge alone, plan ahead and weigh decisions carefully."
+        sentence_words = len(REPORT_SENTENCE.split())
+        return (REPORT_SENTENCE * max(1, self.report_words // sentence_words)).strip()
+
+    def _analysis(self, session_id, rng):
+        persona = persona_for(session_id)
+        analysis = {}
+        for dimension, preferred in zip(DIMENSIONS, persona):
+            other = dimension.replace(preferred, "").strip("-")
+            analysis[dimension] = {
+                "confidence": round(rng.uniform(0.45, 0.9), 2),
+                "preference": preferred if rng.random() < 0.8 else other,
+                "indicators": ["canned indicator"],
+            }
+        return json.dumps({
+            "dimension_analysis": analysis,
+            "themes": ["routine", "people"],
+            "context_relevance": round(rng.uniform(0.5, 1.0), 2),
+        })
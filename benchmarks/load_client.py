@@ -0,0 +1,255 @@
+"""
+Simulate many test-takers connected to the app over Socket.IO.
+
+Each client follows the protocol of static/js/script.js. It connects over WebSocket
+and sends an empty message for the welcome, then "ready", then scripted answers until
+the response reports is_complete, then requests the report sections. The run measures
+connect time, round-trip latency of the welcome message, time to the first streamed
+token and to the full response, time until the report sections arrive, and the
+server's event-loop lag.
+
+Usage:
+    python -m benchmarks.load_client --spawn-server --clients 200 --ramp 20
+    python -m benchmarks.load_client --url http://127.0.0.1:5055 --clients 500 --output load.json
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+import urllib.request
+from collections import Counter
+
+try:
+    import aiohttp
+    import socketio
+except ImportError:
+    raise ImportError("The load client needs the asyncio Socket.IO client: pip install aiohttp python-socketio")
+
+from .pipeline import ANSWERS, percentiles
+
+# Sections the client loads as soon as the results page shows
+REPORT_SECTIONS = ['insights', 'recommendations', 'celebrities', 'relationship', 'career']
+
+class LoadStats:
+    def __init__(self):
+        """Measurements shared by all simulated clients."""
+        self.connect_seconds = []
+        self.connect_errors = Counter()
+        self.welcome_seconds = []
+        self.first_token_seconds = []
+        self.response_seconds = []
+        self.report_seconds = []
+        self.timeouts = 0
+        self.completed = 0
+        self.connected = 0
+        self.peak_connected = 0
+        self.client_lag = []
+        self.server = []
+
+async def run_client(index, args, stats):
+    """Take one simulated user through the test over a real Socket.IO connection."""
+    sio = socketio.AsyncClient(reconnection=False)
+    responses = asyncio.Queue()
+    sections = asyncio.Queue()
+    first_token = {}
+
+    @sio.on('response_chunk')
+    async def on_chunk(data):
+        first_token.setdefault('at', time.perf_counter())
+
+    @sio.on('response')
+    async def on_response(data):
+        responses.put_nowait((time.perf_counter(), data))
+
+    @sio.on('report_section')
+    async def on_section(data):
+        sections.put_nowait(data['section'])
+
+    start = time.perf_counter()
+    try:
+        await sio.connect(args.url, transports=['websocket'], wait_timeout=args.timeout)
+    except Exception as e:
+        stats.connect_errors[type(e).__name__] += 1
+        return
+    stats.connect_seconds.append(time.perf_counter() - start)
+    stats.connected += 1
+    stats.peak_connected = max(stats.peak_connected, stats.connected)
+
+    rng = random.Random(index)
+    try:
+        messages = ["", "ready"] + [ANSWERS[(index + i) % len(ANSWERS)] for i in range(args.max_turns)]
+        for turn, text in enumerate(messages):
+            first_token.clear()
+            sent = time.perf_counter()
+            await sio.emit('message', {'message': text})
+            try:
+                received, data = await asyncio.wait_for(responses.get(), args.timeout)
+            except asyncio.TimeoutError:
+                stats.timeouts += 1
+                return
+
+            if turn == 0:
+                stats.welcome_seconds.append(received - sent)
+            elif not data.get('is_complete'):
+                stats.response_seconds.append(received - sent)
+            if 'at' in first_token:
+                stats.first_token_seconds.append(first_token['at'] - sent)
+
+            if data.get('is_complete'):
+                # Open the report page, which asks for every section but the roast
+                for section in REPORT_SECTIONS:
+                    await sio.emit('report_section', {'section': section})
+                try:
+                    for _ in REPORT_SECTIONS:
+                        await asyncio.wait_for(sections.get(), args.timeout)
+                except asyncio.TimeoutError:
+                    stats.timeouts += 1
+                    return
+                stats.report_seconds.append(time.perf_counter() - sent)
+                stats.completed += 1
+                return
+            if turn > 0 and args.think:
+                await asyncio.sleep(rng.uniform(0.5, 1.5) * args.think)
+    finally:
+        stats.connected -= 1
+        await sio.disconnect()
+
+async def monitor_client_lag(stats, interval=0.05):
+    """Record how late this process's own event loop wakes up, to rule it out as the bottleneck."""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        stats.client_lag.append(max(0.0, time.perf_counter() - start - interval))
+
+async def poll_server(args, stats, session):
+    """Collect the server's event-loop lag and load every second."""
+    while True:
+        await asyncio.sleep(1)
+        try:
+            async with session.get(args.url + "/_bench/stats") as response:
+                sample = await response.json()
+        except Exception:
+            continue
+        sample["elapsed"] = time.perf_counter() - stats.started
+        stats.server.append(sample)
+
+async def run(args):
+    stats = LoadStats()
+    async with aiohttp.ClientSession() as session:
+        # Drop lag samples collected before the run
+        try:
+            async with session.get(args.url + "/_bench/stats"):
+                pass
+        except aiohttp.ClientError:
+            print("Server has no /_bench/stats route; server-side lag will not be reported")
+
+        stats.started = time.perf_counter()
+        lag_task = asyncio.create_task(monitor_client_lag(stats))
+        poll_task = asyncio.create_task(poll_server(args, stats, session))
+
+        clients = []
+        for index in range(args.clients):
+            clients.append(asyncio.create_task(run_client(index, args, stats)))
+            if args.ramp:
+                await asyncio.sleep(args.ramp / args.clients)
+        await asyncio.gather(*clients, return_exceptions=True)
+        wall_seconds = time.perf_counter() - stats.started
+
+        lag_task.cancel()
+        poll_task.cancel()
+
+    server_lag = [s["lag"] for s in stats.server if s.get("lag", {}).get("count")]
+    return {
+        "config": {
+            "url": args.url,
+            "clients": args.clients,
+            "ramp": args.ramp,
+            "think": args.think,
+            "timeout": args.timeout,
+        },
+        "wall_seconds": wall_seconds,
+        "completed_sessions": stats.completed,
+        "timeouts": stats.timeouts,
+        "connect_errors": dict(stats.connect_errors),
+        "peak_connected": stats.peak_connected,
+        "peak_server_connections": max((s.get("connections", 0) for s in stats.server), default=None),
+        "peak_llm_waiting": max((s.get("llm_waiting", 0) for s in stats.server), default=None),
+        "connect_latency": percentiles(stats.connect_seconds),
+        "round_trip_latency": percentiles(stats.welcome_seconds),
+        "first_token_latency": percentiles(stats.first_token_seconds),
+        "response_latency": percentiles(stats.response_seconds),
+        "report_latency": percentiles(stats.report_seconds),
+        "server_lag": {
+            "worst_p99": max((lag["p99"] for lag in server_lag), default=None),
+            "worst_max": max((lag["max"] for lag in server_lag), default=None),
+            "mean": sum(lag["mean"] for lag in server_lag) / len(server_lag) if server_lag else None,
+        },
+        "client_lag": percentiles(stats.client_lag),
+        "server_samples": stats.server,
+    }
+
+def print_summary(results):
+    config = results["config"]
+    print(f"{results['completed_sessions']}/{config['clients']} sessions completed in {results['wall_seconds']:.1f}s, "
+          f"peak {results['peak_connected']} connected, {results['timeouts']} timeouts, "
+          f"connect errors {results['connect_errors'] or 'none'}")
+    for key in ["connect_latency", "round_trip_latency", "first_token_latency", "response_latency",
+                "report_latency", "client_lag"]:
+        stats = results[key]
+        if stats["count"]:
+            print(f"  {key:<20} p50 {stats['p50']:.3f}s  p95 {stats['p95']:.3f}s  p99 {stats['p99']:.3f}s")
+    lag = results["server_lag"]
+    if lag["mean"] is not None:
+        print(f"  {'server_lag':<20} mean {lag['mean']:.3f}s  worst p99 {lag['worst_p99']:.3f}s  "
+              f"worst max {lag['worst_max']:.3f}s")
+
+def spawn_server(args):
+    """Start benchmarks.load_server in a subprocess and wait until it accepts connections."""
+    port = args.url.rsplit(":", 1)[-1].strip("/")
+    command = [sys.executable, "-m", "benchmarks.load_server", "--port", port, "--latency", args.latency]
+    server = subprocess.Popen(command)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(args.url + "/_bench/stats", timeout=1).read()
+            return server
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError("Load test server exited during startup")
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Load test server did not start within 30 seconds")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the app with simulated Socket.IO clients")
+    parser.add_argument("--url", default="http://127.0.0.1:5055")
+    parser.add_argument("--clients", type=int, default=100, help="Simulated test-takers")
+    parser.add_argument("--ramp", type=float, default=10, help="Seconds over which clients connect")
+    parser.add_argument("--think", type=float, default=2, help="Average seconds a client waits before answering")
+    parser.add_argument("--max-turns", type=int, default=30, help="Answers sent before a client gives up")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for a connection or response")
+    parser.add_argument("--spawn-server", action="store_true", help="Start benchmarks.load_server for the run")
+    parser.add_argument("--latency", default="lognormal:0.5,0.4", help="Fake LLM latency of a spawned server")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+    args.url = args.url.rstrip("/")
+
+    server = spawn_server(args) if args.spawn_server else None
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print_summary(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 0 if results["completed_sessions"] == args.clients else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
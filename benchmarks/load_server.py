@@ -0,0 +1,107 @@
+"""
+Run app.py under eventlet with the LLM replaced by the benchmark's fake model.
+
+The process is patched the same way the gunicorn eventlet worker patches it. It also
+measures event-loop lag: how late a greenlet that sleeps at a fixed interval wakes up.
+Lag and connection counts are served as JSON from /_bench/stats.
+
+Usage:
+    python -m benchmarks.load_server --port 5055 --latency lognormal:0.6,0.4
+"""
+import eventlet
+eventlet.monkey_patch()
+
+import os
+import time
+import argparse
+import tempfile
+import threading
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve app.py with a fake LLM for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--latency", default="lognormal:0.5,0.4", help="Response time of every fake LLM call")
+    parser.add_argument("--report-latency", help="Response time of report section calls")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--lag-interval", type=float, default=0.05, help="Seconds between event-loop lag probes")
+    parser.add_argument("--speech", action="store_true", help="Keep text-to-speech enabled (needs network access)")
+    return parser.parse_args(argv)
+
+class LagMonitor:
+    def __init__(self, interval=0.05):
+        """
+        Measure event-loop lag by sleeping a greenlet at a fixed interval.
+
+        Any time it wakes up late is time the loop spent running something else
+        without yielding, e.g. a blocking call.
+        """
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._samples = []
+
+    def start(self):
+        eventlet.spawn(self._run)
+
+    def _run(self):
+        while True:
+            start = time.perf_counter()
+            eventlet.sleep(self.interval)
+            lag = time.perf_counter() - start - self.interval
+            with self._lock:
+                self._samples.append(max(0.0, lag))
+
+    def drain(self):
+        """Return and forget the samples collected so far."""
+        with self._lock:
+            samples, self._samples = self._samples, []
+        return samples
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Keep fake content out of the real caches
+    scratch = tempfile.mkdtemp(prefix="mbti-load-")
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("MBTI_CONTENT_CACHE_DIR", os.path.join(scratch, "content"))
+    os.environ.setdefault("MBTI_AUDIO_CACHE_DIR", os.path.join(scratch, "audio"))
+    os.environ.setdefault("MBTI_LLM_CACHE", os.path.join(scratch, "llm.db"))
+
+    from flask import jsonify
+    from models.llm_gateway import LLMGateway, set_gateway
+    from .fake_llm import FakeChatModel, LatencyModel
+    from .pipeline import percentiles
+
+    fake = FakeChatModel(
+        latency=LatencyModel(args.latency),
+        latency_by_kind={"report": LatencyModel(args.report_latency)} if args.report_latency else {},
+        seed=args.seed,
+    )
+    # The app builds its sessions on import, so the fake gateway must be in place first
+    set_gateway(LLMGateway(client_factory=lambda model_name, temperature, max_tokens, timeout: fake))
+
+    import app as application
+
+    if not args.speech:
+        application.speak_to = lambda sid, text: None
+
+    monitor = LagMonitor(args.lag_interval)
+    monitor.start()
+
+    @application.app.route("/_bench/stats")
+    def bench_stats():
+        """Event-loop lag since the last call, plus current connection and gateway counts."""
+        samples = monitor.drain()
+        gateway = application.sessions.resources.gateway
+        return jsonify({
+            "lag": percentiles(samples),
+            "connections": application.sessions.connections(),
+            "llm_in_flight": gateway.in_flight,
+            "llm_waiting": gateway.waiting,
+        })
+
+    print(f"Load test server on http://{args.host}:{args.port} (scratch files in {scratch})", flush=True)
+    application.socketio.run(application.app, host=args.host, port=args.port, log_output=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""
+Benchmark the conversation pipeline end to end against a fake LLM.
+
+Drives simulated sessions through MBTIAnalyzer.process_message until the test is
+complete, then requests every report section at once. Reports per-turn latency, time
+to the first streamed token, report latency, prompt tokens per turn and memory per
+session. With --mode async, sessions are coroutines on one event loop driving
+aprocess_message instead of threads.
+
+Usage:
+    python -m benchmarks.pipeline --sessions 50 --concurrency 10 --latency lognormal:0.6,0.4
+    python -m benchmarks.pipeline --output results.json --baseline previous.json
+    python -m benchmarks.pipeline --mode async --sessions 200 --concurrency 200
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# Nothing reaches OpenAI, but the analyzer refuses to start without a key
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from models.mbti_analyzer import AnalyzerResources, MBTIAnalyzer
+from models.content_cache import TypeContentCache, prewarm
+from models.llm_gateway import SESSION_SITES, LLMGateway, current_session, submit
+from models.response_cache import ResponseCache
+from models.memory import estimate_tokens
+from models.tracing import Tracer, set_tracer, span
+from models.prompts import PROMPTS
+from models import metrics
+from .fake_llm import CallRecorder, FakeChatModel, LatencyModel, current_turn
+
+ANSWERS = [
+    "I love a quiet morning with a book before I see anyone.",
+    "I make a list, then work through it one item at a time.",
+    "Honestly I go with whatever feels right in the moment.",
+    "Spending the day outdoors with a couple of close friends.",
+    "I look at the facts first and then talk it over with people I trust.",
+    "Big parties drain me, but small dinners are great.",
+    "I keep a calendar for everything, otherwise I forget.",
+    "I like trying new ideas even if they might not work out.",
+    "Not sure, maybe.",
+]
+
+# Metrics compared against a baseline run: (path into the results, label)
+REGRESSION_METRICS = [
+    (("turn_latency", "p95"), "p95 turn latency"),
+    (("report_latency", "p95"), "p95 report latency"),
+    (("first_token_latency", "p95"), "p95 time to first token"),
+    (("prompt_tokens_per_turn", "p50"), "median prompt tokens per turn"),
+    (("memory", "state_bytes", "p50"), "median session state size"),
+]
+
+def percentiles(values):
+    """Summarize a list of numbers with count, mean and p50/p95/p99 (linear interpolation)."""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pick(q):
+        position = (len(ordered) - 1) * q
+        low = int(position)
+        high = min(low + 1, len(ordered) - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "max": ordered[-1],
+    }
+
+def run_session(resources, session_id, turn_mode, max_turns):
+    """
+    Take one simulated user through the whole test.
+
+    Returns:
+        dict: Timings and final state of the session
+    """
+    current_session.set(session_id)
+    analyzer = MBTIAnalyzer(resources, turn_mode=turn_mode)
+
+    analyzer.process_message("")
+    analyzer.process_message("ready")
+
+    turns = []
+    complete = False
+    for turn in range(max_turns):
+        current_turn.set(turn)
+        on_token, timing = turn_timer()
+        with span("turn", turn=turn):
+            _, complete, _ = analyzer.process_message(ANSWERS[turn % len(ANSWERS)], on_token)
+        turns.append(timing(turn, complete))
+        if complete:
+            break
+
+    # Time the report page: the client asks for every section at once
+    report_seconds = None
+    if complete:
+        current_turn.set(None)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(MBTIAnalyzer.report_section_names)) as pool:
+            futures = [submit(pool, analyzer.generate_section, name) for name in MBTIAnalyzer.report_section_names]
+            for future in futures:
+                future.result()
+        report_seconds = time.perf_counter() - start
+
+    return session_result(session_id, analyzer, complete, turns, report_seconds)
+
+async def arun_session(resources, session_id, turn_mode, max_turns):
+    """Async twin of run_session, driving the analyzer's coroutine pipeline."""
+    current_session.set(session_id)
+    analyzer = MBTIAnalyzer(resources, turn_mode=turn_mode)
+
+    await analyzer.aprocess_message("")
+    await analyzer.aprocess_message("ready")
+
+    turns = []
+    complete = False
+    for turn in range(max_turns):
+        current_turn.set(turn)
+        on_token, timing = turn_timer()
+        with span("turn", turn=turn):
+            _, complete, _ = await analyzer.aprocess_message(ANSWERS[turn % len(ANSWERS)], on_token)
+        turns.append(timing(turn, complete))
+        if complete:
+            break
+
+    report_seconds = None
+    if complete:
+        current_turn.set(None)
+        start = time.perf_counter()
+        await asyncio.gather(*(analyzer.agenerate_section(name) for name in MBTIAnalyzer.report_section_names))
+        report_seconds = time.perf_counter() - start
+
+    return session_result(session_id, analyzer, complete, turns, report_seconds)
+
+def turn_timer():
+    """
+    Time one turn from now.
+
+    Returns:
+        tuple: (on_token callback noting the first token, function(turn, final) returning the turn's timings)
+    """
+    first_token = []
+    start = time.perf_counter()
+
+    def on_token(section, token):
+        if not first_token:
+            first_token.append(time.perf_counter() - start)
+
+    def timing(turn, final):
+        return {
+            "turn": turn,
+            "seconds": time.perf_counter() - start,
+            "first_token": first_token[0] if first_token else None,
+            "final": final,
+        }
+
+    return on_token, timing
+
+def session_result(session_id, analyzer, complete, turns, report_seconds):
+    """Collect the timings and final state of a session."""
+    return {
+        "session": session_id,
+        "complete": complete,
+        "mbti_result": analyzer.mbti_result,
+        "turns": turns,
+        "report_seconds": report_seconds,
+        "state_bytes": len(json.dumps(analyzer.to_state())),
+        "history_tokens": estimate_tokens(analyzer.memory.render()),
+        "analyzer": analyzer,
+    }
+
+async def arun_sessions(resources, session_ids, args):
+    """Run sessions as coroutines, at most args.concurrency at a time."""
+    limit = asyncio.Semaphore(args.concurrency)
+
+    async def bounded(session_id):
+        async with limit:
+            return await arun_session(resources, session_id, args.turn_mode, args.max_turns)
+
+    return await asyncio.gather(*(bounded(session_id) for session_id in session_ids))
+
+def run(args):
+    """Run the benchmark described by parsed command line arguments and return the results."""
+    recorder = CallRecorder()
+    fake = FakeChatModel(
+        latency=LatencyModel(args.latency),
+        latency_by_kind={kind: LatencyModel(spec) for kind, spec in args.latency_for},
+        seed=args.seed,
+        report_words=args.report_words,
+        recorder=recorder,
+    )
+    if args.trace:
+        set_tracer(Tracer(args.trace, sample_rate=1.0))
+    with tempfile.TemporaryDirectory() as scratch:
+        # Fake replies must never end up in the real response cache
+        gateway = LLMGateway(
+            max_concurrency=args.llm_concurrency,
+            max_queue=max(64, args.concurrency * 8),
+            client_factory=lambda model_name, temperature, max_tokens, timeout: fake,
+            response_cache=ResponseCache(args.llm_cache or os.path.join(scratch, "llm.db")),
+        )
+        # Every session sends the same ANSWERS, so per-turn replies are only cached on request
+        if args.cache_turns:
+            gateway.cache_bypass -= set(SESSION_SITES)
+        else:
+            gateway.cache_bypass |= set(SESSION_SITES)
+        content_cache = TypeContentCache(path=args.content_cache or os.path.join(scratch, "content"))
+        resources = AnalyzerResources(gateway=gateway, content_cache=content_cache)
+        if args.warm:
+            prewarm(content_cache, resources.type_generators)
+            recorder.calls.clear()
+
+        if args.trace_memory:
+            tracemalloc.start()
+            traced_before = tracemalloc.get_traced_memory()[0]
+
+        session_ids = [f"bench-{args.seed}-{i}" for i in range(args.sessions)]
+        start = time.perf_counter()
+        if args.mode == "async":
+            sessions = asyncio.run(arun_sessions(resources, session_ids, args))
+        else:
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                sessions = list(executor.map(
+                    lambda session_id: run_session(resources, session_id, args.turn_mode, args.max_turns),
+                    session_ids
+                ))
+        wall_seconds = time.perf_counter() - start
+
+        traced_per_session = None
+        if args.trace_memory:
+            # Analyzers are still referenced from `sessions`, so this is what they retain
+            traced_per_session = (tracemalloc.get_traced_memory()[0] - traced_before) / max(1, len(sessions))
+            tracemalloc.stop()
+
+        resources.report_executor.shutdown(wait=True)
+
+    calls = recorder.snapshot()
+    tokens_by_turn = defaultdict(int)
+    calls_by_kind = defaultdict(lambda: {"count": 0, "prompt_tokens": 0, "completion_tokens": 0})
+    for call in calls:
+        summary = calls_by_kind[call["kind"]]
+        summary["count"] += 1
+        summary["prompt_tokens"] += call["prompt_tokens"]
+        summary["completion_tokens"] += call["completion_tokens"]
+        if call["turn"] is not None and call["kind"] != "report":
+            tokens_by_turn[(call["session"], call["turn"])] += call["prompt_tokens"]
+
+    turns = [turn for session in sessions for turn in session["turns"] if not turn["final"]]
+    return {
+        "config": {
+            "mode": args.mode,
+            "sessions": args.sessions,
+            "concurrency": args.concurrency,
+            "llm_concurrency": args.llm_concurrency,
+            "turn_mode": args.turn_mode,
+            "latency": args.latency,
+            "latency_for": dict(args.latency_for),
+            "report_words": args.report_words,
+            "seed": args.seed,
+            "warm": args.warm,
+            "cache_turns": args.cache_turns,
+        },
+        "wall_seconds": wall_seconds,
+        "completed_sessions": sum(1 for session in sessions if session["complete"]),
+        "turns_per_session": percentiles([len(session["turns"]) for session in sessions]),
+        "turn_latency": percentiles([turn["seconds"] for turn in turns]),
+        "first_token_latency": percentiles([turn["first_token"] for turn in turns if turn["first_token"] is not None]),
+        "report_latency": percentiles([s["report_seconds"] for s in sessions if s["report_seconds"] is not None]),
+        "prompt_tokens_per_turn": percentiles(list(tokens_by_turn.values())),
+        "llm_calls": dict(calls_by_kind),
+        "prefix_cache": {
+            "shared": prefix_cache_ratios("shared_prefix"),
+            "cached": prefix_cache_ratios("cached_prefix"),
+        },
+        "response_cache": gateway.response_cache.stats(),
+        "routes": gateway.router.stats(),
+        "memory": {
+            "state_bytes": percentiles([session["state_bytes"] for session in sessions]),
+            "history_tokens": percentiles([session["history_tokens"] for session in sessions]),
+            "traced_bytes_per_session": traced_per_session,
+        },
+        "types": dict(Counter(session["mbti_result"] for session in sessions)),
+    }
+
+def prefix_cache_ratios(kind):
+    """Share of the prompt tokens of each call site counted as shared_prefix or cached_prefix."""
+    ratios = {}
+    for site in PROMPTS:
+        prompt_tokens = metrics.LLM_TOKENS.value(site=site, kind="prompt")
+        if prompt_tokens:
+            ratios[site] = metrics.LLM_TOKENS.value(site=site, kind=kind) / prompt_tokens
+    return ratios
+
+def lookup(results, path):
+    for key in path:
+        results = (results or {}).get(key)
+    return results
+
+def compare(results, baseline, tolerance):
+    """Return descriptions of the metrics that got worse than the baseline by more than the tolerance."""
+    regressions = []
+    for path, label in REGRESSION_METRICS:
+        new, old = lookup(results, path), lookup(baseline, path)
+        if new is None or not old:
+            continue
+        if new > old * (1 + tolerance):
+            regressions.append(f"{label}: {old:.4g} -> {new:.4g} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+def print_summary(results):
+    print(f"{results['completed_sessions']}/{results['config']['sessions']} sessions completed "
+          f"in {results['wall_seconds']:.2f}s")
+    for key, unit in [("turn_latency", "s"), ("first_token_latency", "s"), ("report_latency", "s"),
+                      ("prompt_tokens_per_turn", " tokens")]:
+        stats = results[key]
+        if stats["count"]:
+            print(f"  {key:<24} p50 {stats['p50']:.3f}{unit}  p95 {stats['p95']:.3f}{unit}  p99 {stats['p99']:.3f}{unit}")
+    memory = results["memory"]
+    print(f"  {'state_bytes':<24} p50 {memory['state_bytes']['p50']:.0f}  max {memory['state_bytes']['max']:.0f}")
+    if memory["traced_bytes_per_session"] is not None:
+        print(f"  {'traced_bytes_per_session':<24} {memory['traced_bytes_per_session']:.0f}")
+    for kind, summary in sorted(results["llm_calls"].items()):
+        print(f"  calls[{kind}] {summary['count']}  prompt tokens {summary['prompt_tokens']}")
+    for kind, ratios in results["prefix_cache"].items():
+        if ratios:
+            print(f"  {kind} prefix " + "  ".join(f"{site} {ratio:.0%}" for site, ratio in sorted(ratios.items())))
+    cache = results["response_cache"]
+    print(f"  response cache hits {cache['hits']}  misses {cache['misses']}")
+
+def parse_latency_for(value):
+    kind, _, spec = value.partition("=")
+    if not spec:
+        raise argparse.ArgumentTypeError("expected KIND=SPEC, e.g. report=lognormal:3,0.3")
+    return kind, spec
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the MBTI conversation pipeline against a fake LLM")
+    parser.add_argument("--sessions", type=int, default=20, help="Simulated sessions to run")
+    parser.add_argument("--concurrency", type=int, default=8, help="Sessions running at the same time")
+    parser.add_argument("--llm-concurrency", type=int, default=32, help="Gateway limit on LLM calls in flight")
+    parser.add_argument("--turn-mode", choices=["split", "combined"], default="split")
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync",
+                        help="Run sessions as threads calling process_message, or as coroutines awaiting aprocess_message")
+    parser.add_argument("--max-turns", type=int, default=30, help="Give up on a session after this many answers")
+    parser.add_argument("--latency", default="lognormal:0.5,0.4",
+                        help="Response time of every LLM call: fixed:S, uniform:LO,HI or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--latency-for", type=parse_latency_for, action="append", default=[],
+                        help="Response time for one call site (analysis, question, turn, summary, report), "
+                             "e.g. report=lognormal:3,0.3")
+    parser.add_argument("--report-words", type=int, default=250, help="Length of each fake report section")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--content-cache", help="Report content cache directory. Defaults to an empty temporary one.")
+    parser.add_argument("--warm", action="store_true", help="Fill the report content cache before timing")
+    parser.add_argument("--llm-cache", help="LLM response cache file. Defaults to an empty temporary one.")
+    parser.add_argument("--cache-turns", action="store_true",
+                        help="Let per-turn calls use the response cache too; by default only report sections do")
+    parser.add_argument("--trace", help="Write a trace of every turn to this JSONL file")
+    parser.add_argument("--trace-memory", action="store_true", help="Measure memory retained per session (slower)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    print_summary(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import re
+import json
+import math
+
+DIMENSIONS = ['E-I', 'S-N', 'T-F', 'J-P']
+
+# Structure the analysis prompts ask for, also used to repair malformed replies
+ANALYSIS_SCHEMA = """{
+    "dimension_analysis": {
+        "E-I": {"confidence": float, "preference": "E" or "I", "indicators": []},
+        "S-N": {"confidence": float, "preference": "S" or "N", "indicators": []},
+        "T-F": {"confidence": float, "preference": "T" or "F", "indicators": []},
+        "J-P": {"confidence": float, "preference": "J" or "P", "indicators": []}
+    },
+    "themes": [list of key themes],
+    "context_relevance": float
+}"""
+
+# Spelled-out preferences models sometimes use instead of the letter
+PREFERENCE_WORDS = {
+    'extraversion': 'E', 'extroversion': 'E', 'extravert': 'E', 'extrovert': 'E', 'extraverted': 'E', 'extroverted': 'E',
+    'introversion': 'I', 'introvert': 'I', 'introverted': 'I',
+    'sensing': 'S', 'sensor': 'S',
+    'intuition': 'N', 'intuitive': 'N',
+    'thinking': 'T', 'thinker': 'T',
+    'feeling': 'F', 'feeler': 'F',
+    'judging': 'J', 'judger': 'J',
+    'perceiving': 'P', 'perceiver': 'P',
+}
+
+FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+class AnalysisParseError(ValueError):
+    """Raised when a reply holds no usable dimension analysis."""
+
+def extract_json(text):
+    """
+    Find the JSON object in a chat reply, preferring one with a dimension_analysis key.
+
+    Code fences, surrounding prose and trailing commas are tolerated.
+
+    Args:
+        text (str): The raw reply
+
+    Returns:
+        dict: The decoded object
+
+    Raises:
+        AnalysisParseError: If no JSON object can be decoded
+    """
+    if not text:
+        raise AnalysisParseError("Empty reply")
+
+    candidates = [match.group(1) for match in FENCE.finditer(text)] + [text]
+    decoder = json.JSONDecoder()
+    found = None
+    for candidate in candidates:
+        source = TRAILING_COMMA.sub(r"\1", candidate)
+        start = source.find("{")
+        while start != -1:
+            try:
+                value, end = decoder.raw_decode(source, start)
+            except json.JSONDecodeError:
+                start = source.find("{", start + 1)
+                continue
+            if isinstance(value, dict):
+                if 'dimension_analysis' in value:
+                    return value
+                found = found or value
+            start = source.find("{", end)
+    if found is None:
+        raise AnalysisParseError("No JSON object found in reply")
+    return found
+
+def clamp_confidence(value):
+    """Coerce a confidence to a float in [0, 1]; percentages such as 75 become 0.75."""
+    if isinstance(value, str):
+        value = value.strip().rstrip("%")
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if math.isnan(value):
+        return None
+    if 1 < value <= 100:
+        value /= 100
+    return min(1.0, max(0.0, value))
+
+def normalize_preference(value, dimension):
+    """Return the preference letter if it belongs to the dimension pair, otherwise None."""
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    letter = PREFERENCE_WORDS.get(value.lower(), value.upper())
+    return letter if letter in dimension.split('-') else None
+
+def validate_analysis(data):
+    """
+    Check a decoded analysis against the expected structure and normalize it.
+
+    Dimensions with an invalid preference or confidence are dropped, confidences are
+    clamped to [0, 1] and missing optional fields get defaults.
+
+    Args:
+        data (dict): Decoded analysis
+
+    Returns:
+        dict: The normalized analysis with at least one valid dimension
+
+    Raises:
+        AnalysisParseError: If no dimension is usable
+    """
+    dimensions = data.get('dimension_analysis')
+    if not isinstance(dimensions, dict):
+        raise AnalysisParseError("Missing dimension_analysis")
+
+    analysis = {}
+    for key, entry in dimensions.items():
+        dimension = str(key).upper().replace('/', '-').replace(' ', '')
+        if dimension not in DIMENSIONS or not isinstance(entry, dict):
+            continue
+        preference = normalize_preference(entry.get('preference'), dimension)
+        confidence = clamp_confidence(entry.get('confidence'))
+        if preference is None or confidence is None:
+            continue
+        indicators = entry.get('indicators')
+        analysis[dimension] = {
+            'confidence': confidence,
+            'preference': preference,
+            'indicators': [str(i) for i in indicators] if isinstance(indicators, list) else [],
+        }
+
+    if not analysis:
+        raise AnalysisParseError("No valid dimension in dimension_analysis")
+
+    themes = data.get('themes')
+    return {
+        'dimension_analysis': analysis,
+        'themes': [str(t) for t in themes] if isinstance(themes, list) else [],
+        'context_relevance': clamp_confidence(data.get('context_relevance')) or 0.0,
+    }
+
+def parse_analysis(text):
+    """Extract and validate the dimension analysis from a chat reply; raises AnalysisParseError."""
+    return validate_analysis(extract_json(text))
@@ -0,0 +1,221 @@
+import os
+import re
+import json
+import math
+import random
+import zlib
+import tempfile
+import threading
+
+DIMENSIONS = ['E-I', 'S-N', 'T-F', 'J-P']
+
+# Answers made only of these words carry no personality signal
+FILLER_WORDS = {
+    "ok", "okay", "k", "yes", "yeah", "yep", "no", "nope", "nah", "idk", "dunno", "maybe",
+    "sure", "fine", "not", "i", "don't", "dont", "know", "hmm", "um", "uh", "lol",
+    "whatever", "nothing", "same", "thanks", "thank", "you", "haha", "kinda", "guess",
+}
+
+# Local evidence counts for less than an LLM analysis of the same strength
+LOCAL_CONFIDENCE_SCALE = 0.5
+
+WORD = re.compile(r"[a-z']+")
+
+def tokenize(text):
+    return WORD.findall((text or "").lower())
+
+class AnswerClassifier:
+    def __init__(self, n_features=2 ** 18, weights=None, bias=None, examples=0,
+                 rich_words=None, margin=None):
+        """
+        Hashed bag-of-words logistic model scoring answers on the four dimensions.
+
+        It is trained on answers the LLM has already analysed. The analyzer uses it to
+        handle answers made only of filler, such as "ok" or "idk", without an LLM call. It
+        also resolves short answers locally when the model is confident on every dimension.
+        Everything else, one-word answers like "alone" included, still goes to the LLM.
+
+        Args:
+            n_features (int): Size of the hashed feature space
+            weights (dict, optional): Dimension -> {feature index: weight}
+            bias (dict, optional): Dimension -> bias
+            examples (int): Number of examples the model was trained on
+            rich_words (int, optional): Answers this long always go to the LLM.
+                Defaults to MBTI_LOCAL_RICH_WORDS or 25.
+            margin (float, optional): |2p - 1| the model needs on every dimension to skip
+                the LLM. Defaults to MBTI_LOCAL_MARGIN or 0.6.
+        """
+        self.n_features = n_features
+        self.weights = weights or {dimension: {} for dimension in DIMENSIONS}
+        self.bias = bias or {dimension: 0.0 for dimension in DIMENSIONS}
+        self.examples = examples
+        self.rich_words = rich_words or int(os.environ.get("MBTI_LOCAL_RICH_WORDS", 25))
+        self.margin = margin or float(os.environ.get("MBTI_LOCAL_MARGIN", 0.6))
+
+    def features(self, text):
+        """Hashed, L2-normalized counts of the words and word pairs in a text."""
+        words = tokenize(text)
+        grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        counts = {}
+        for gram in grams:
+            index = zlib.crc32(gram.encode("utf-8")) % self.n_features
+            counts[index] = counts.get(index, 0.0) + 1.0
+        norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+        return {index: value / norm for index, value in counts.items()}
+
+    def predict(self, text):
+        """Probability of the first letter of each dimension, e.g. {'E-I': 0.7, ...}."""
+        features = self.features(text)
+        probabilities = {}
+        for dimension in DIMENSIONS:
+            weights = self.weights[dimension]
+            z = self.bias[dimension] + sum(weights.get(i, 0.0) * v for i, v in features.items())
+            probabilities[dimension] = 1 / (1 + math.exp(-max(-30.0, min(30.0, z))))
+        return probabilities
+
+    def analyze(self, text, scale=LOCAL_CONFIDENCE_SCALE):
+        """Return a provisional analysis in the same shape the LLM analysis is parsed into."""
+        analysis = {}
+        for dimension, p_first in self.predict(text).items():
+            first, second = dimension.split('-')
+            analysis[dimension] = {
+                'confidence': round(abs(2 * p_first - 1) * scale, 3) if self.examples else 0.0,
+                'preference': first if p_first >= 0.5 else second,
+                'indicators': [],
+            }
+        return {'dimension_analysis': analysis, 'themes': [], 'context_relevance': 0.0, 'source': 'local'}
+
+    def classify(self, text):
+        """
+        Decide whether an answer needs the LLM.
+
+        Args:
+            text (str): The user's answer
+
+        Returns:
+            tuple: (provisional analysis, True if it can stand in for the LLM analysis)
+        """
+        words = tokenize(text)
+        meaningful = [word for word in words if word not in FILLER_WORDS]
+        if not meaningful:
+            # Only filler: nothing to learn from, record the turn without evidence
+            return self.analyze(text, scale=0.0), True
+
+        analysis = self.analyze(text)
+        if not self.examples or len(words) >= self.rich_words:
+            return analysis, False
+
+        margins = [data['confidence'] / LOCAL_CONFIDENCE_SCALE for data in analysis['dimension_analysis'].values()]
+        return analysis, min(margins) >= self.margin
+
+    def train(self, examples, epochs=5, learning_rate=0.5, l2=1e-5, seed=0):
+        """
+        Fit the model by stochastic gradient descent on (answer, analysis) pairs.
+
+        Each dimension's label is the preference the LLM found, weighted by its confidence.
+
+        Args:
+            examples (list): (answer text, parsed analysis) pairs
+            epochs (int): Passes over the examples
+            learning_rate (float): Step size
+            l2 (float): Weight decay
+            seed (int): Shuffling seed
+
+        Returns:
+            AnswerClassifier: self
+        """
+        rows = []
+        for text, analysis in examples:
+            dimensions = (analysis or {}).get('dimension_analysis', {})
+            labels = {}
+            for dimension, data in dimensions.items():
+                if dimension in DIMENSIONS and data.get('confidence'):
+                    labels[dimension] = (1.0 if data['preference'] == dimension[0] else 0.0, data['confidence'])
+            if labels:
+                rows.append((self.features(text), labels))
+
+        rng = random.Random(seed)
+        for _ in range(epochs):
+            rng.shuffle(rows)
+            for features, labels in rows:
+                for dimension, (label, weight) in labels.items():
+                    weights = self.weights[dimension]
+                    z = self.bias[dimension] + sum(weights.get(i, 0.0) * v for i, v in features.items())
+                    error = (1 / (1 + math.exp(-max(-30.0, min(30.0, z)))) - label) * weight
+                    self.bias[dimension] -= learning_rate * error
+                    for i, v in features.items():
+                        w = weights.get(i, 0.0)
+                        weights[i] = w - learning_rate * (error * v + l2 * w)
+        self.examples += len(rows)
+        return self
+
+    def save(self, path):
+        """Write the model to a JSON file atomically."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        data = {
+            'n_features': self.n_features,
+            'examples': self.examples,
+            'bias': self.bias,
+            'weights': {d: {str(i): round(w, 6) for i, w in ws.items() if abs(w) > 1e-6}
+                        for d, ws in self.weights.items()},
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=None):
+        """
+        Load a trained model, or return an untrained one when there is none.
+
+        Args:
+            path (str, optional): Model file. Defaults to MBTI_CLASSIFIER_PATH or cache/classifier/model.json.
+        """
+        path = path or os.environ.get("MBTI_CLASSIFIER_PATH", os.path.join("cache", "classifier", "model.json"))
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls()
+        return cls(
+            n_features=data['n_features'],
+            weights={d: {int(i): w for i, w in ws.items()} for d, ws in data['weights'].items()},
+            bias=data['bias'],
+            examples=data['examples'],
+        )
+
+class ExampleLog:
+    def __init__(self, path):
+        """
+        Append-only JSONL log of answers and their LLM analyses, the classifier's training data.
+
+        Args:
+            path (str): Log file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def append(self, text, analysis):
+        """Record one analysed answer."""
+        line = json.dumps({'text': text, 'analysis': analysis})
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+    def read(self):
+        """Return all logged (answer, analysis) pairs, skipping damaged lines."""
+        examples = []
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    examples.append((entry.get('text', ""), entry.get('analysis')))
+        except OSError:
+            pass
+        return examples
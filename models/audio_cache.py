@@ -0,0 +1,99 @@
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+class AudioCache:
+    def __init__(self, path=None, max_bytes=None):
+        """
+        Content-addressed, size-bounded disk cache of synthesized speech.
+
+        Files are named by a hash of the text and voice settings, so repeated phrases
+        such as the welcome message and the opening questions are synthesized once.
+        The least recently used files are removed once the cache grows past max_bytes.
+
+        Args:
+            path (str, optional): Cache directory. Defaults to MBTI_AUDIO_CACHE_DIR or cache/audio.
+            max_bytes (int, optional): Size limit. Defaults to MBTI_AUDIO_CACHE_MB (200) megabytes.
+        """
+        self.path = path or os.environ.get("MBTI_AUDIO_CACHE_DIR", os.path.join("cache", "audio"))
+        self.max_bytes = max_bytes or int(float(os.environ.get("MBTI_AUDIO_CACHE_MB", 200)) * 1024 * 1024)
+        os.makedirs(self.path, exist_ok=True)
+
+        self._lock = threading.Lock()
+
+        # Digest -> file size, least recently used first
+        self._entries = OrderedDict()
+        self._size = 0
+        files = [f for f in os.listdir(self.path) if f.endswith(".mp3")]
+        for name in sorted(files, key=lambda f: os.path.getmtime(os.path.join(self.path, f))):
+            size = os.path.getsize(os.path.join(self.path, name))
+            self._entries[name[:-4]] = size
+            self._size += size
+
+    @staticmethod
+    def key(text, lang="en", tld="com", slow=False):
+        """Return the content address for a text and voice."""
+        source = "\0".join([text, lang, tld, str(slow)])
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+    def file_path(self, digest):
+        """Return the path of a cached file."""
+        return os.path.join(self.path, f"{digest}.mp3")
+
+    def get(self, digest):
+        """Return the path of a cached file and mark it as recently used, or None on a miss."""
+        if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+            return None
+        path = self.file_path(digest)
+        with self._lock:
+            if digest not in self._entries:
+                # Another worker sharing the directory may have synthesized it
+                if not os.path.exists(path):
+                    return None
+                size = os.path.getsize(path)
+                self._entries[digest] = size
+                self._size += size
+            self._entries.move_to_end(digest)
+        try:
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._size -= self._entries.pop(digest, 0)
+            return None
+        return path
+
+    def put(self, digest, write):
+        """
+        Store a new file, evicting the least recently used ones past the size limit.
+
+        Args:
+            digest (str): Content address of the file
+            write (callable): Called with a temporary path to write the audio to
+
+        Returns:
+            str: Path of the cached file
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        os.close(fd)
+        try:
+            write(tmp_path)
+            path = self.file_path(digest)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        size = os.path.getsize(path)
+        with self._lock:
+            self._size += size - self._entries.pop(digest, 0)
+            self._entries[digest] = size
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                old_digest, old_size = self._entries.popitem(last=False)
+                self._size -= old_size
+                try:
+                    os.remove(self.file_path(old_digest))
+                except OSError:
+                    pass
+        return path
@@ -1,46 +1,15 @@
-import os
-import sys
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
-from langchain.chat_models import ChatOpenAI
+from .llm_gateway import get_gateway
+from .content_cache import prompt_version
+from .prompts import CAREER_PROMPT
 
 class CareerInsightsGenerator:
-    def __init__(self):
+    def __init__(self, content_cache=None, gateway=None):
         """Initialize the career insights generator with LLM components."""
-        self.llm = ChatOpenAI(
-            temperature=0.7,
-            model_name="gpt-3.5-turbo",
-        )
-        
-        self.career_template = """
-        Generate brief career insights for the MBTI personality type {mbti_type}:
-
-        Provide a shallow dive into career dynamics, work preferences, professional strengths, 
-        and potential growth areas for {traits} individuals.
-
-        Explore the following aspects:
-        - Professional environment preferences
-        - Ideal work settings and cultures
-        - Motivational triggers
-        - Potential career paths
-        - Workplace strengths and challenges
-        - Learning and development approaches
-        - Decision-making in professional contexts
-        - Potential areas of professional growth
-
-        Consider both technical and soft skill dimensions.
-        Provide actionable, inspiring career guidance.
+        # Calls go through the shared LLM gateway
+        self.gateway = gateway or get_gateway()
         
-        Output should be nuanced, motivational, and tailored to the specific MBTI type's 
-        unique cognitive and emotional landscape not more than 5 sentences.
-        """
-        
-        self.prompt = PromptTemplate(
-            input_variables=["mbti_type", "traits"],
-            template=self.career_template
-        )
-        
-        self.chain = LLMChain(llm=self.llm, prompt=self.prompt)
+        # Registered prompt: static instructions first, the type and its traits last
+        self.prompt = CAREER_PROMPT
         
         # MBTI type traits and career characteristics
         self.mbti_career_traits = {
@@ -61,14 +30,20 @@ class CareerInsightsGenerator:
             "ENFJ": "inspirational, empathetic, and leadership-oriented",
             "ENTJ": "strategic, ambitious, and results-focused"
         }
+        
+        # Optional on-disk cache of generated content per type
+        self.content_cache = content_cache
+        self.cache_name = "career"
+        self.prompt_version = prompt_version(self.prompt.template, self.mbti_career_traits)
     
-    def generate_career_insights(self, mbti_type, conversation=None):
+    def generate_career_insights(self, mbti_type, conversation=None, callbacks=None):
         """
         Generate personalized career insights based on MBTI type.
         
         Args:
             mbti_type (str): The MBTI personality type
             conversation (optional): Conversation context for additional personalization
+            callbacks (list, optional): LangChain callbacks receiving streamed tokens on a cache miss
         
         Returns:
             str: Brief career insights not more than 5 sentences
@@ -76,13 +51,59 @@ class CareerInsightsGenerator:
         if mbti_type not in self.mbti_career_traits:
             raise ValueError(f"Invalid MBTI type: {mbti_type}")
         
+        # Serve insights from the type cache, generating them on a miss
+        if self.content_cache is None:
+            result = self.generate_content(mbti_type, callbacks)
+        else:
+            result = self.content_cache.get(
+                self.cache_name, self.prompt_version, mbti_type,
+                lambda: self.generate_content(mbti_type, callbacks),
+                refresh=lambda: self.generate_content(mbti_type)
+            )
+        
+        # Parse and format the result for better readability
+        return self._format_career_insights(result, mbti_type)
+    
+    def generate_content(self, mbti_type, callbacks=None):
+        """Generate uncached career insights for a type using the LLM."""
         traits = self.mbti_career_traits[mbti_type]
         
         # Generate insights using LLM
-        result = self.chain.run(mbti_type=mbti_type, traits=traits)
+        return self.gateway.predict(
+            self.prompt.format(mbti_type=mbti_type, traits=traits),
+            callbacks=callbacks,
+            site=self.cache_name,
+            # The type content cache already persists these, with several variants
+            cache=self.content_cache is None,
+            version=self.prompt_version,
+            template=self.prompt
+        )
+
+    async def agenerate_career_insights(self, mbti_type, conversation=None, callbacks=None):
+        """Async twin of generate_career_insights."""
+        if mbti_type not in self.mbti_career_traits:
+            raise ValueError(f"Invalid MBTI type: {mbti_type}")
         
-        # Parse and format the result for better readability
+        if self.content_cache is None:
+            result = await self.agenerate_content(mbti_type, callbacks)
+        else:
+            result = await self.content_cache.aget(
+                self.cache_name, self.prompt_version, mbti_type,
+                lambda: self.agenerate_content(mbti_type, callbacks),
+                refresh=lambda: self.generate_content(mbti_type)
+            )
         return self._format_career_insights(result, mbti_type)
+
+    async def agenerate_content(self, mbti_type, callbacks=None):
+        """Async twin of generate_content."""
+        return await self.gateway.apredict(
+            self.prompt.format(mbti_type=mbti_type, traits=self.mbti_career_traits[mbti_type]),
+            callbacks=callbacks,
+            site=self.cache_name,
+            cache=self.content_cache is None,
+            version=self.prompt_version,
+            template=self.prompt
+        )
     
     def _format_career_insights(self, insights, mbti_type):
         """
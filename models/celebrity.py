@@ -1,32 +1,15 @@
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
-from langchain.chat_models import ChatOpenAI
+from .llm_gateway import get_gateway
+from .content_cache import prompt_version
+from .prompts import CELEBRITIES_PROMPT
 
 class CelebrityDoppelgangerGenerator:
-    def __init__(self):
+    def __init__(self, content_cache=None, gateway=None):
         """Initialize the celebrity doppelganger generator with LLM components."""
-        self.llm = ChatOpenAI(
-            temperature=0.7,
-            model_name="gpt-3.5-turbo",
-        )
-        
-        self.doppelganger_template = """
-        For the MBTI personality type {mbti_type}, identify 3 celebrity doppelgangers that embody the {traits} characteristics:
-
-        - Select celebrities who authentically represent the core traits of {mbti_type}
-        - Provide a brief, insightful description that captures their personality essence
-        - Highlight specific qualities that make them a quintessential match for this personality type
-
-        Ensure the descriptions are nuanced, perceptive, and reveal the unique personality dimensions of each celebrity.
-        Use a thoughtful and descriptive tone that goes beyond surface-level observations.
-        """
+        # Calls go through the shared LLM gateway
+        self.gateway = gateway or get_gateway()
         
-        self.prompt = PromptTemplate(
-            input_variables=["mbti_type", "traits"],
-            template=self.doppelganger_template
-        )
-        
-        self.chain = LLMChain(llm=self.llm, prompt=self.prompt)
+        # Registered prompt: static instructions first, the type and its traits last
+        self.prompt = CELEBRITIES_PROMPT
         
         # MBTI type traits mapping (same as in recommendation generator)
         self.mbti_traits = {
@@ -47,15 +30,61 @@ class CelebrityDoppelgangerGenerator:
             "ENFJ": "charismatic, idealistic, and people-focused",
             "ENTJ": "strategic, logical, and efficient"
         }
+        
+        # Optional on-disk cache of generated content per type
+        self.content_cache = content_cache
+        self.cache_name = "celebrities"
+        self.prompt_version = prompt_version(self.prompt.template, self.mbti_traits)
     
-    def find_doppelgangers(self, mbti_type):
-        """Generate celebrity doppelgangers based on MBTI type."""
+    def find_doppelgangers(self, mbti_type, callbacks=None):
+        """Generate celebrity doppelgangers based on MBTI type, streaming to callbacks on a cache miss."""
         if mbti_type not in self.mbti_traits:
             raise ValueError(f"Invalid MBTI type: {mbti_type}")
             
+        # Serve doppelgangers from the type cache, generating them on a miss
+        if self.content_cache is None:
+            return self.generate_content(mbti_type, callbacks)
+        return self.content_cache.get(
+            self.cache_name, self.prompt_version, mbti_type,
+            lambda: self.generate_content(mbti_type, callbacks),
+            refresh=lambda: self.generate_content(mbti_type)
+        )
+
+    def generate_content(self, mbti_type, callbacks=None):
+        """Generate uncached celebrity doppelgangers for a type using the LLM."""
         traits = self.mbti_traits[mbti_type]
         
         # Generate doppelganger recommendations using LLM
-        result = self.chain.run(mbti_type=mbti_type, traits=traits)
+        return self.gateway.predict(
+            self.prompt.format(mbti_type=mbti_type, traits=traits),
+            callbacks=callbacks,
+            site=self.cache_name,
+            # The type content cache already persists these, with several variants
+            cache=self.content_cache is None,
+            version=self.prompt_version,
+            template=self.prompt
+        )
+
+    async def afind_doppelgangers(self, mbti_type, callbacks=None):
+        """Async twin of find_doppelgangers."""
+        if mbti_type not in self.mbti_traits:
+            raise ValueError(f"Invalid MBTI type: {mbti_type}")
         
-        return result
+        if self.content_cache is None:
+            return await self.agenerate_content(mbti_type, callbacks)
+        return await self.content_cache.aget(
+            self.cache_name, self.prompt_version, mbti_type,
+            lambda: self.agenerate_content(mbti_type, callbacks),
+            refresh=lambda: self.generate_content(mbti_type)
+        )
+
+    async def agenerate_content(self, mbti_type, callbacks=None):
+        """Async twin of generate_content."""
+        return await self.gateway.apredict(
+            self.prompt.format(mbti_type=mbti_type, traits=self.mbti_traits[mbti_type]),
+            callbacks=callbacks,
+            site=self.cache_name,
+            cache=self.content_cache is None,
+            version=self.prompt_version,
+            template=self.prompt
+        )
@@ -0,0 +1,216 @@
+import os
+import json
+import asyncio
+import hashlib
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .single_flight import SingleFlight, AsyncSingleFlight
+from . import metrics
+
+MBTI_TYPES = [
+    "ISTJ", "ISFJ", "INFJ", "INTJ",
+    "ISTP", "ISFP", "INFP", "INTP",
+    "ESTP", "ESFP", "ENFP", "ENTP",
+    "ESTJ", "ESFJ", "ENFJ", "ENTJ"
+]
+
+def prompt_version(template, traits=None):
+    """Derive a short version tag from a prompt template and its trait table so edits invalidate old entries."""
+    source = template + json.dumps(traits or {}, sort_keys=True)
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()[:10]
+
+class TypeContentCache:
+    def __init__(self, path=None, variants=None, refresh_after=None):
+        """
+        On-disk cache of generated content for the 16 MBTI types.
+
+        Entries are keyed by generator, prompt version and type. Each entry keeps up to
+        `variants` generations that are served in rotation. Missing variants and stale
+        ones are generated in the background, so only the very first request for a key
+        ever waits on the LLM. Concurrent first requests for the same key share that one
+        generation. Lookups are counted in mbti_llm_cache_total under the generator's
+        name: a hit, a miss (the caller waited for the first variant), a shared wait
+        on another caller's first generation, and a refresh scheduled in the background.
+
+        Args:
+            path (str, optional): Cache directory. Defaults to MBTI_CONTENT_CACHE_DIR or cache/content.
+            variants (int, optional): Variants kept per key. Defaults to MBTI_CONTENT_VARIANTS or 3.
+            refresh_after (float, optional): Age in seconds after which the oldest variant is
+                regenerated. Defaults to MBTI_CONTENT_REFRESH_AFTER or one week.
+        """
+        self.path = path or os.environ.get("MBTI_CONTENT_CACHE_DIR", os.path.join("cache", "content"))
+        self.variants = variants or int(os.environ.get("MBTI_CONTENT_VARIANTS", 3))
+        self.refresh_after = refresh_after or float(os.environ.get("MBTI_CONTENT_REFRESH_AFTER", 7 * 24 * 3600))
+
+        self._lock = threading.Lock()
+        self._cursors = {}
+        self._refreshing = set()
+        self._inflight = SingleFlight()
+        self._ainflight = AsyncSingleFlight()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="content-cache")
+
+    def get(self, generator, version, mbti_type, produce, refresh=None):
+        """
+        Return cached content for a key, generating it only when nothing is cached yet.
+
+        Args:
+            generator (str): Name of the generator owning the content
+            version (str): Prompt version the content was generated with
+            mbti_type (str): The MBTI personality type
+            produce (callable): Zero-argument function that generates fresh content
+            refresh (callable, optional): Generator used for background refreshes. Defaults to produce.
+
+        Returns:
+            str: One of the cached variants
+        """
+        key = (generator, version, mbti_type)
+        entries = self._load(key)
+        if not entries:
+            # Sessions finishing together with the same type wait on a single LLM call
+            text, shared = self._inflight.do(key, lambda: self._produce_first(key, produce))
+            metrics.LLM_CACHE.inc(site=generator, result="shared" if shared else "miss")
+            return text
+        metrics.LLM_CACHE.inc(site=generator, result="hit")
+        return self._pick(key, entries, refresh or produce)
+
+    async def aget(self, generator, version, mbti_type, aproduce, refresh):
+        """
+        Async twin of get for code running on an event loop.
+
+        Args:
+            aproduce (callable): Zero-argument coroutine function that generates fresh content
+            refresh (callable): Blocking generator used for background refreshes
+
+        Returns:
+            str: One of the cached variants
+        """
+        key = (generator, version, mbti_type)
+        entries = await asyncio.to_thread(self._load, key)
+        if not entries:
+            text, shared = await self._ainflight.do(key, lambda: self._aproduce_first(key, aproduce))
+            metrics.LLM_CACHE.inc(site=generator, result="shared" if shared else "miss")
+            return text
+        metrics.LLM_CACHE.inc(site=generator, result="hit")
+        return self._pick(key, entries, refresh)
+
+    def _pick(self, key, entries, refresh):
+        """Return the next variant of a key, scheduling a refresh when it is incomplete or stale."""
+        if len(entries) < self.variants or time.time() - entries[0]["created"] > self.refresh_after:
+            self._schedule_refresh(key, refresh)
+
+        # Rotate through the available variants
+        with self._lock:
+            cursor = self._cursors.get(key, random.randrange(len(entries)))
+            self._cursors[key] = cursor + 1
+        return entries[cursor % len(entries)]["text"]
+
+    def _produce_first(self, key, produce):
+        """Generate and store the first variant of a key, unless another worker just did."""
+        entries = self._load(key)
+        if entries:
+            return entries[-1]["text"]
+        text = produce()
+        self._append(key, text)
+        return text
+
+    async def _aproduce_first(self, key, aproduce):
+        """Async twin of _produce_first."""
+        entries = await asyncio.to_thread(self._load, key)
+        if entries:
+            return entries[-1]["text"]
+        text = await aproduce()
+        await asyncio.to_thread(self._append, key, text)
+        return text
+
+    def fill(self, generator, version, mbti_type, produce, refresh=False):
+        """
+        Synchronously generate variants for a key until it is full.
+
+        Args:
+            refresh (bool): Regenerate every variant even if the key is already full
+
+        Returns:
+            int: Number of variants generated
+        """
+        key = (generator, version, mbti_type)
+        missing = self.variants if refresh else self.variants - len(self._load(key))
+        for _ in range(max(0, missing)):
+            self._append(key, produce())
+        return max(0, missing)
+
+    def _schedule_refresh(self, key, produce):
+        """Generate one more variant for a key in the background, once at a time."""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        metrics.LLM_CACHE.inc(site=key[0], result="refresh")
+
+        def refresh():
+            try:
+                self._append(key, produce())
+            except Exception as e:
+                print(f"Error refreshing cached content for {'/'.join(key)}: {e!r}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._executor.submit(refresh)
+
+    def _file(self, key):
+        generator, version, mbti_type = key
+        return os.path.join(self.path, generator, version, f"{mbti_type}.json")
+
+    def _load(self, key):
+        """Read the variants stored for a key, oldest first."""
+        try:
+            with open(self._file(key), encoding="utf-8") as f:
+                return json.load(f).get("variants", [])
+        except (OSError, ValueError):
+            return []
+
+    def _append(self, key, text):
+        """Store a new variant for a key, dropping the oldest once the key is full."""
+        with self._lock:
+            entries = self._load(key)
+            entries.append({"text": text, "created": time.time()})
+            entries = entries[-self.variants:]
+
+            # Write atomically so concurrent readers never see a partial file
+            path = self._file(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"variants": entries}, f)
+            os.replace(tmp_path, path)
+
+def prewarm(cache, generators, refresh=False, max_workers=8):
+    """
+    Fill the cache for every MBTI type of each type-only generator.
+
+    Args:
+        cache (TypeContentCache): Cache to fill
+        generators (list): Generators exposing cache_name, prompt_version and generate_content
+        refresh (bool): Regenerate entries that are already full
+        max_workers (int): Number of keys filled concurrently
+
+    Returns:
+        int: Number of variants generated
+    """
+    def fill(generator, mbti_type):
+        return cache.fill(
+            generator.cache_name, generator.prompt_version, mbti_type,
+            lambda: generator.generate_content(mbti_type),
+            refresh=refresh
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(fill, generator, mbti_type)
+            for generator in generators
+            for mbti_type in MBTI_TYPES
+        ]
+        return sum(future.result() for future in futures)
@@ -1,41 +1,12 @@
-import os
-import sys
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
-from langchain.chat_models import ChatOpenAI
+from .llm_gateway import GatewayBusy, get_gateway
+from .content_cache import prompt_version
+from .prompts import ROAST_PROMPT
 
 class PersonalityRoastGenerator:
-    def __init__(self):
+    def __init__(self, gateway=None):
         """Initialize the personality roast generator with LLM components."""
-        # Check for OpenAI API key
-        if not os.environ.get("OPENAI_API_KEY"):
-            print("ERROR: OPENAI_API_KEY environment variable is not set.")
-            print("Please set it in the .env file or as an environment variable.")
-            sys.exit(1)
-        
-        # Setup OpenAI model
-        self.llm = ChatOpenAI(
-            temperature=0.8,  # Higher temperature for more creative roasting
-            model_name="gpt-3.5-turbo",
-        )
-        
-        # Roast template with nuanced humor for each MBTI type
-        self.roast_template = """
-        Create a witty, good-humored roast that playfully highlights the stereotypical quirks of the {mbti_type} personality type.
-
-        Consider these conversation details for personalization:
-        Conversation Context: {conversation_context}
-
-        Guidelines for the roast:
-        - Keep it light-hearted and funny, not mean-spirited
-        - Use clever wordplay and observational humor
-        - Highlight the unique personality traits in a humorous way
-        - Make it sound like a friendly, teasing joke a close friend might make
-        - Aim for maximum comedic effect while maintaining respect
-
-        Roast Format:
-        A punchy, 3-4 sentence roast that captures the essence of {mbti_type} with humor and warmth.
-        """
+        # Calls go through the shared LLM gateway
+        self.gateway = gateway or get_gateway()
         
         # MBTI type roast characteristics
         self.mbti_roast_traits = {
@@ -57,23 +28,20 @@ class PersonalityRoastGenerator:
             "ENTJ": "the ambitious bulldozer who sees life as a strategy game"
         }
         
-        # Create prompt template
-        self.prompt = PromptTemplate(
-            input_variables=["mbti_type", "conversation_context"],
-            template=self.roast_template
-        )
+        # Registered prompt: static instructions first, the type and conversation last
+        self.prompt = ROAST_PROMPT
+        self.prompt_version = prompt_version(self.prompt.template, self.mbti_roast_traits)
         
-        # Create LLM chain
-        self.chain = LLMChain(llm=self.llm, prompt=self.prompt)
     
-    def generate_roast(self, mbti_type, conversation, max_context_length=500):
+    def generate_roast(self, mbti_type, conversation_context, max_context_length=500, callbacks=None):
         """
         Generate a personalized roast based on MBTI type and conversation context.
         
         Args:
             mbti_type (str): The MBTI personality type
-            conversation (ConversationChain): The conversation chain to extract context
+            conversation_context (str): Formatted conversation history
             max_context_length (int, optional): Maximum length of context to include. Defaults to 500.
+            callbacks (list, optional): LangChain callbacks receiving streamed tokens
         
         Returns:
             str: A humorous roast tailored to the MBTI type
@@ -81,21 +49,47 @@ class PersonalityRoastGenerator:
         if mbti_type not in self.mbti_roast_traits:
             raise ValueError(f"Invalid MBTI type: {mbti_type}")
         
-        # Extract conversation context (truncate to avoid overwhelming the model)
-        try:
-            conversation_context = conversation.memory.chat_memory.messages[-5:]
-            context_str = " ".join([msg.content for msg in conversation_context])
-            context_str = context_str[:max_context_length]
-        except Exception:
+        # Use the most recent conversation context (truncate to avoid overwhelming the model)
+        context_str = (conversation_context or "")[-max_context_length:].strip()
+        if not context_str:
             context_str = "No specific context available"
         
         # Generate roast
         try:
-            roast = self.chain.run(
-                mbti_type=mbti_type, 
-                conversation_context=context_str
+            roast = self.gateway.predict(
+                self.prompt.format(mbti_type=mbti_type, conversation_context=context_str),
+                callbacks=callbacks,
+                site="roast",
+                version=self.prompt_version,
+                template=self.prompt
             )
             return roast
+        except GatewayBusy:
+            # Like the other sections, let the caller report that the service is busy
+            raise
+        except Exception as e:
+            print(f"Error generating roast: {e}")
+            return f"Looks like a {mbti_type} can't even handle a good roast! 😉"
+
+    async def agenerate_roast(self, mbti_type, conversation_context, max_context_length=500, callbacks=None):
+        """Async twin of generate_roast."""
+        if mbti_type not in self.mbti_roast_traits:
+            raise ValueError(f"Invalid MBTI type: {mbti_type}")
+        
+        context_str = (conversation_context or "")[-max_context_length:].strip()
+        if not context_str:
+            context_str = "No specific context available"
+        
+        try:
+            return await self.gateway.apredict(
+                self.prompt.format(mbti_type=mbti_type, conversation_context=context_str),
+                callbacks=callbacks,
+                site="roast",
+                version=self.prompt_version,
+                template=self.prompt
+            )
+        except GatewayBusy:
+            raise
         except Exception as e:
             print(f"Error generating roast: {e}")
             return f"Looks like a {mbti_type} can't even handle a good roast! 😉"
@@ -0,0 +1,81 @@
+import os
+import math
+
+DIMENSIONS = ['E-I', 'S-N', 'T-F', 'J-P']
+
+class DimensionScorer:
+    def __init__(self, stop_confidence=None, min_evidence=None, prior=1.0):
+        """
+        Running posterior over the four MBTI preference pairs.
+
+        Each analysed answer adds its confidence as evidence for the preferred letter.
+        A dimension's evidence forms a Beta(prior + first, prior + second) posterior over
+        how strongly the person leans towards the first letter. Certainty is the posterior
+        probability of the letter currently ahead, from a normal approximation. A dimension
+        is resolved once that certainty and the total evidence are both high enough.
+
+        Args:
+            stop_confidence (float, optional): Certainty needed to resolve a dimension.
+                Defaults to MBTI_STOP_CONFIDENCE or 0.9.
+            min_evidence (float, optional): Evidence needed before a dimension can resolve,
+                so one emphatic answer is not enough. Defaults to MBTI_MIN_EVIDENCE or 1.5.
+            prior (float): Pseudo-evidence for each letter before any answer
+        """
+        self.stop_confidence = stop_confidence or float(os.environ.get("MBTI_STOP_CONFIDENCE", 0.9))
+        self.min_evidence = min_evidence or float(os.environ.get("MBTI_MIN_EVIDENCE", 1.5))
+        self.prior = prior
+        self.evidence = {letter: 0.0 for dimension in DIMENSIONS for letter in dimension.split('-')}
+
+    def update(self, analysis):
+        """Add the evidence of one parsed analysis; None (an unparseable turn) adds nothing."""
+        if not analysis:
+            return
+        for dimension, data in analysis.get('dimension_analysis', {}).items():
+            letter = data.get('preference')
+            if dimension in DIMENSIONS and letter in dimension.split('-'):
+                self.evidence[letter] += data.get('confidence', 0)
+
+    def certainty(self, dimension):
+        """Posterior probability that the letter currently ahead is the person's preference."""
+        first, second = dimension.split('-')
+        alpha = self.prior + self.evidence[first]
+        beta = self.prior + self.evidence[second]
+        total = alpha + beta
+        mean = alpha / total
+        sd = math.sqrt(alpha * beta / (total * total * (total + 1)))
+        p_first = 0.5 * (1 + math.erf((mean - 0.5) / (sd * math.sqrt(2))))
+        return max(p_first, 1 - p_first)
+
+    def resolved(self, dimension):
+        """Whether a dimension is decided with enough evidence."""
+        first, second = dimension.split('-')
+        return (self.evidence[first] + self.evidence[second] >= self.min_evidence
+                and self.certainty(dimension) >= self.stop_confidence)
+
+    def is_decisive(self):
+        """Whether every dimension is resolved."""
+        return all(self.resolved(dimension) for dimension in DIMENSIONS)
+
+    def most_uncertain(self):
+        """The dimension the next question should explore."""
+        return min(DIMENSIONS, key=lambda dimension: (self.resolved(dimension), self.certainty(dimension)))
+
+    def result(self):
+        """The four-letter type from the evidence so far; ties go to the second letter."""
+        result = ""
+        for dimension in DIMENSIONS:
+            first, second = dimension.split('-')
+            result += first if self.evidence[first] > self.evidence[second] else second
+        return result
+
+    def summary(self):
+        """Certainty per dimension, rounded for prompts and logs."""
+        return {dimension: round(self.certainty(dimension), 2) for dimension in DIMENSIONS}
+
+    def to_state(self):
+        """Return the evidence as a JSON-serializable dict."""
+        return dict(self.evidence)
+
+    def load_state(self, state):
+        """Restore the evidence from a dict produced by to_state."""
+        self.evidence.update(state)
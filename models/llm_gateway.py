@@ -0,0 +1,755 @@
+import os
+import random
+import asyncio
+import threading
+import time
+import weakref
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError, wait
+from contextlib import contextmanager, asynccontextmanager
+import aiohttp
+import openai
+import requests
+from requests.adapters import HTTPAdapter
+from langchain.chat_models import ChatOpenAI
+from .response_cache import make_response_cache
+from .single_flight import SingleFlight, AsyncSingleFlight
+from .model_router import ModelRouter
+from .streaming import GatedStreamHandler
+from .prompts import PrefixCacheEstimator
+from . import metrics
+from .tracing import annotate, span
+
+# Session the current LLM call is made for; set per turn by the session manager
+current_session = contextvars.ContextVar("current_session", default=None)
+
+# time.monotonic() by which the current turn must be answered; set with deadline()
+current_deadline = contextvars.ContextVar("current_deadline", default=None)
+
+# Errors worth retrying: the request never produced an answer and may succeed later
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+    openai.error.APIConnectionError,
+    openai.error.Timeout,
+    openai.error.TryAgain,
+)
+
+class GatewayBusy(Exception):
+    """Raised when the gateway is saturated and cannot admit a request in time."""
+
+class DeadlineExceeded(Exception):
+    """Raised when an LLM call cannot be answered before the deadline of its turn."""
+
+class CallerFailure:
+    def __init__(self, error):
+        """
+        Result of a coalesced call that failed for reasons of its leading caller only.
+
+        Running out of the leader's deadline or queue wait says nothing about the
+        callers waiting on it, so they make their own call instead of inheriting it.
+        """
+        self.error = error
+
+# Call sites whose prompts carry one session's answers. A stored reply would stand in
+# for reading the live session, so they skip the response cache by default.
+SESSION_SITES = ("analysis", "turn", "question", "repair", "summary", "insights")
+
+# Errors that belong to the caller that made a request rather than to the request
+CALLER_ERRORS = (DeadlineExceeded, GatewayBusy)
+
+@contextmanager
+def deadline(seconds):
+    """
+    Give the LLM calls made within the block an end-to-end deadline.
+
+    Nested deadlines never extend an outer one. A falsy number of seconds leaves the
+    calls unbounded.
+    """
+    if not seconds:
+        yield
+        return
+    due = time.monotonic() + seconds
+    outer = current_deadline.get()
+    token = current_deadline.set(due if outer is None else min(due, outer))
+    try:
+        yield
+    finally:
+        current_deadline.reset(token)
+
+def time_left():
+    """Seconds until the current deadline, or None when there is none."""
+    due = current_deadline.get()
+    return None if due is None else due - time.monotonic()
+
+def submit(executor, fn, *args, **kwargs):
+    """Submit work to an executor, carrying over the caller's context variables."""
+    context = contextvars.copy_context()
+    return executor.submit(context.run, fn, *args, **kwargs)
+
+def submit_background(executor, fn, *args, **kwargs):
+    """Submit work that outlives the current turn: the caller's context, without its deadline."""
+    context = contextvars.copy_context()
+    context.run(current_deadline.set, None)
+    return executor.submit(context.run, fn, *args, **kwargs)
+
+class LLMGateway:
+    def __init__(self, max_concurrency=None, per_session=None, max_queue=None,
+                 queue_timeout=None, max_retries=None, client_factory=None, response_cache=None,
+                 router=None, hedge=None, hedge_min=None):
+        """
+        Single entry point for every LLM call made from models/.
+
+        Chat clients are shared per model configuration and reuse one pooled HTTP
+        session with keep-alive connections. Calls are capped globally and per session.
+        Callers over the cap wait in a bounded queue. When the queue is full, or a slot
+        does not free up within queue_timeout, GatewayBusy is raised at once instead of
+        piling up blocked workers. Rate-limit and transient errors are retried with
+        jittered exponential backoff. Replies are kept in a persistent response cache,
+        except for call sites listed in MBTI_LLM_CACHE_BYPASS, by default the per-turn
+        SESSION_SITES. Identical cacheable calls
+        in flight at the same time share one request. A caller waiting on a shared
+        request that hit the leader's DeadlineExceeded or GatewayBusy makes its own call
+        instead, and stops waiting with DeadlineExceeded when its own deadline runs out. The model, reply length and timeout of each call come from the route
+        of its call site. Latency, tokens, cache use, retries and errors are recorded
+        per call site in models.metrics.
+        apredict is the asyncio twin of predict, for code running on an event loop.
+        Async calls are limited by the same settings, with slots of their own per loop.
+
+        Calls made under a deadline (see deadline()) give up with DeadlineExceeded when
+        it runs out. If such a call has not started answering by the p95 latency of its
+        call site, a duplicate request is sent and whichever answers first is used.
+        Hedges are only sent with spare capacity and never queue for a slot.
+
+        Calls built from a registered prompt (models.prompts) pass it as template. Its
+        version keys the response cache, and the tokens the provider likely served from
+        its prefix cache are recorded per call site as the cached_prefix token kind,
+        next to shared_prefix: the tokens shared with recent prompts, whatever the
+        provider's minimum.
+
+        Args:
+            max_concurrency (int, optional): Calls in flight across the process.
+                Defaults to MBTI_LLM_MAX_CONCURRENCY or 32.
+            per_session (int, optional): Calls in flight per session. Defaults to MBTI_LLM_PER_SESSION or 6.
+            max_queue (int, optional): Calls allowed to wait for a slot. Defaults to MBTI_LLM_MAX_QUEUE or 64.
+            queue_timeout (float, optional): Seconds a call may wait for a slot.
+                Defaults to MBTI_LLM_QUEUE_TIMEOUT or 10.
+            max_retries (int, optional): Retries of rate-limited or failed calls.
+                Defaults to MBTI_LLM_MAX_RETRIES or 3.
+            client_factory (callable, optional): Builds a chat model from
+                (model_name, temperature, max_tokens, timeout). Defaults to streaming ChatOpenAI clients.
+            response_cache (ResponseCache, optional): Cache of replies. Defaults to the one
+                configured by MBTI_LLM_CACHE.
+            router (ModelRouter, optional): Model settings per call site. Defaults to the
+                routes configured by MBTI_ROUTE_* variables.
+            hedge (bool, optional): Whether slow calls under a deadline are hedged.
+                Defaults to MBTI_LLM_HEDGE or on.
+            hedge_min (float, optional): Seconds a call runs at least before it is hedged.
+                Defaults to MBTI_LLM_HEDGE_MIN or 0.5.
+        """
+        self.max_concurrency = max_concurrency or int(os.environ.get("MBTI_LLM_MAX_CONCURRENCY", 32))
+        self.per_session = per_session or int(os.environ.get("MBTI_LLM_PER_SESSION", 6))
+        self.max_queue = max_queue or int(os.environ.get("MBTI_LLM_MAX_QUEUE", 64))
+        self.queue_timeout = queue_timeout or float(os.environ.get("MBTI_LLM_QUEUE_TIMEOUT", 10))
+        self.max_retries = max_retries if max_retries is not None else int(os.environ.get("MBTI_LLM_MAX_RETRIES", 3))
+        self.client_factory = client_factory or self._openai_client
+        self.response_cache = response_cache or make_response_cache()
+        self.router = router or ModelRouter()
+        self.hedge = hedge if hedge is not None else os.environ.get("MBTI_LLM_HEDGE", "1") == "1"
+        self.hedge_min = hedge_min or float(os.environ.get("MBTI_LLM_HEDGE_MIN", 0.5))
+        bypass = os.environ.get("MBTI_LLM_CACHE_BYPASS", ",".join(SESSION_SITES))
+        self.cache_bypass = {site.strip() for site in bypass.split(",") if site.strip()}
+        self.prefix_cache = PrefixCacheEstimator()
+
+        self._aiohttp = client_factory is None
+        if client_factory is None:
+            # One keep-alive connection pool for every OpenAI request in the process
+            http = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_concurrency)
+            http.mount("https://", adapter)
+            http.mount("http://", adapter)
+            openai.requestssession = http
+
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._session_slots = {}
+        self._inflight = SingleFlight()
+        self._ainflight = AsyncSingleFlight()
+        # Blocking calls under a deadline run here, so the caller can stop waiting for them
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency + self.max_queue, thread_name_prefix="llm")
+        # Event loop -> its async slots, per-session slots and aiohttp session
+        self._loops = weakref.WeakKeyDictionary()
+        self.waiting = 0
+        self.in_flight = 0
+
+    def chat_model(self, model_name="gpt-3.5-turbo", temperature=0.7, max_tokens=None, timeout=None):
+        """Return the shared chat client for a model configuration."""
+        key = (model_name, temperature, max_tokens, timeout)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self.client_factory(model_name, temperature, max_tokens, timeout)
+                self._clients[key] = client
+            return client
+
+    def predict(self, prompt, model_name=None, temperature=None, callbacks=None, session_id=None,
+                site=None, cache=True, version=None, template=None):
+        """
+        Send a prompt to a chat model under the gateway's limits.
+
+        Args:
+            prompt (str): The prompt text
+            model_name (str, optional): Model to call. Defaults to the call site's route.
+            temperature (float, optional): Sampling temperature. Defaults to the call site's route.
+            callbacks (list, optional): LangChain callbacks, e.g. for token streaming
+            session_id (str, optional): Session to account the call to. Defaults to the current session.
+            site (str, optional): Name of the call site, e.g. "analysis" or "career".
+                Selects the route the call takes.
+            cache (bool): Whether the reply may come from, and go into, the response cache
+            version (str, optional): Version of the prompt template, part of the cache key.
+                Defaults to the version of template.
+            template (Prompt, optional): Registered prompt the text was built from
+
+        Returns:
+            str: The model's reply
+
+        Raises:
+            GatewayBusy: If the call could not be admitted in time
+            DeadlineExceeded: If the current deadline ran out before the reply arrived
+        """
+        with span("llm", site=site or "other"):
+            return self._predict(prompt, model_name, temperature, callbacks, session_id, site, cache, version, template)
+
+    def _predict(self, prompt, model_name, temperature, callbacks, session_id, site, cache, version, template):
+        """Route, cache and send one call; see predict."""
+        route = self.router.select(site)
+        model_name = model_name or route.model
+        temperature = route.temperature if temperature is None else temperature
+        if version is None and template is not None:
+            version = template.version
+
+        cache_key = None
+        if cache and self.response_cache is not None and site not in self.cache_bypass:
+            cache_key = self.response_cache.key(prompt, model_name, temperature, version)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return self._cache_hit(cached, callbacks, site, model_name)
+
+        client = self.chat_model(model_name, temperature, route.max_tokens, route.timeout)
+        session_id = session_id or current_session.get()
+        if cache_key is None:
+            metrics.LLM_CACHE.inc(site=site, result="bypass")
+            annotate(model=model_name, cache="bypass")
+            reply = self._call(client, prompt, callbacks, session_id, site, model_name, route.timeout)
+            self._sent(prompt, template, session_id, site, model_name)
+            return reply
+
+        def lead():
+            try:
+                return self._call(client, prompt, callbacks, session_id, site, model_name, route.timeout, cache_key)
+            except CALLER_ERRORS as e:
+                return CallerFailure(e)
+
+        try:
+            # Waiting on another caller's request must not outlast this caller's deadline
+            remaining = time_left()
+            reply, shared = self._inflight.do(cache_key, lead, timeout=None if remaining is None else max(0.0, remaining))
+        except TimeoutError:
+            raise DeadlineExceeded(f"The shared {site} call missed this caller's deadline")
+        if isinstance(reply, CallerFailure):
+            if not shared:
+                raise reply.error
+            # The leader ran out of its own time or queue; this caller may not have
+            reply, shared = self._call(client, prompt, callbacks, session_id, site, model_name, route.timeout, cache_key), False
+        metrics.LLM_CACHE.inc(site=site, result="shared" if shared else "miss")
+        annotate(model=model_name, cache="shared" if shared else "miss")
+        if shared:
+            for handler in callbacks or []:
+                handler.on_llm_new_token(reply)
+        else:
+            self._sent(prompt, template, session_id, site, model_name)
+        return reply
+
+    async def apredict(self, prompt, model_name=None, temperature=None, callbacks=None, session_id=None,
+                       site=None, cache=True, version=None, template=None):
+        """
+        Send a prompt to a chat model under the gateway's limits, without blocking the event loop.
+
+        Takes the same arguments, and raises the same errors, as predict.
+        """
+        with span("llm", site=site or "other"):
+            return await self._apredict(prompt, model_name, temperature, callbacks, session_id, site, cache, version, template)
+
+    async def _apredict(self, prompt, model_name, temperature, callbacks, session_id, site, cache, version, template):
+        """Route, cache and send one call; see apredict."""
+        route = self.router.select(site)
+        model_name = model_name or route.model
+        temperature = route.temperature if temperature is None else temperature
+        if version is None and template is not None:
+            version = template.version
+
+        cache_key = None
+        if cache and self.response_cache is not None and site not in self.cache_bypass:
+            cache_key = self.response_cache.key(prompt, model_name, temperature, version)
+            # The cache is a local database; keep its reads off the event loop
+            cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+            if cached is not None:
+                return self._cache_hit(cached, callbacks, site, model_name)
+
+        client = self.chat_model(model_name, temperature, route.max_tokens, route.timeout)
+        session_id = session_id or current_session.get()
+        if cache_key is None:
+            metrics.LLM_CACHE.inc(site=site, result="bypass")
+            annotate(model=model_name, cache="bypass")
+            reply = await self._acall(client, prompt, callbacks, session_id, site, model_name, route.timeout)
+            self._sent(prompt, template, session_id, site, model_name)
+            return reply
+
+        async def lead():
+            try:
+                return await self._acall(client, prompt, callbacks, session_id, site, model_name, route.timeout, cache_key)
+            except CALLER_ERRORS as e:
+                return CallerFailure(e)
+
+        try:
+            remaining = time_left()
+            reply, shared = await self._ainflight.do(cache_key, lead, timeout=None if remaining is None else max(0.0, remaining))
+        except (TimeoutError, asyncio.TimeoutError):
+            raise DeadlineExceeded(f"The shared {site} call missed this caller's deadline")
+        if isinstance(reply, CallerFailure):
+            if not shared:
+                raise reply.error
+            reply, shared = await self._acall(client, prompt, callbacks, session_id, site, model_name, route.timeout, cache_key), False
+        metrics.LLM_CACHE.inc(site=site, result="shared" if shared else "miss")
+        annotate(model=model_name, cache="shared" if shared else "miss")
+        if shared:
+            for handler in callbacks or []:
+                handler.on_llm_new_token(reply)
+        else:
+            self._sent(prompt, template, session_id, site, model_name)
+        return reply
+
+    def _sent(self, prompt, template, session_id, site, model_name):
+        """Record the tokens of a sent prompt shared with recent ones, and those the provider likely cached."""
+        prefix = template.prefix if template is not None else None
+        shared, cached = self.prefix_cache.observe(prompt, prefix, session_id, site, model_name)
+        metrics.LLM_TOKENS.inc(shared, site=site, kind="shared_prefix")
+        metrics.LLM_TOKENS.inc(cached, site=site, kind="cached_prefix")
+        annotate(shared_prefix_tokens=shared, cached_prefix_tokens=cached)
+
+    def _cache_hit(self, cached, callbacks, site, model_name):
+        """Record a reply served from the response cache and hand it to the listeners."""
+        metrics.LLM_CACHE.inc(site=site, result="hit")
+        annotate(model=model_name, cache="hit")
+        # Listeners still get the text, in one piece
+        for handler in callbacks or []:
+            handler.on_llm_new_token(cached)
+        return cached
+
+    def _call(self, client, prompt, callbacks, session_id, site, model_name, timeout, cache_key=None):
+        """Call the model within a slot, retrying transient errors and caching the reply."""
+        try:
+            reply = self._run(client, prompt, callbacks, session_id, site, model_name, timeout)
+        except Exception as e:
+            metrics.LLM_ERRORS.inc(site=site, error=type(e).__name__)
+            raise
+        if cache_key is not None:
+            self.response_cache.put(cache_key, reply)
+        return reply
+
+    def _run(self, client, prompt, callbacks, session_id, site, model_name, timeout):
+        """Send the request within the current deadline, hedging it when it is slow to answer."""
+        remaining = time_left()
+        if remaining is None:
+            return self._attempt(client, prompt, callbacks, session_id, site, model_name, timeout)
+        if remaining <= 0:
+            raise DeadlineExceeded(f"No time left for the {site} call")
+
+        due = time.monotonic() + remaining
+        # Closing the gates stops whichever request is still streaming once the call is over
+        gate = GatedStreamHandler(callbacks, abandon=True)
+        hedge_gate = GatedStreamHandler(abandon=True)
+        calls = [submit(self._executor, self._attempt, client, prompt, [gate], session_id, site, model_name, timeout)]
+        try:
+            hedge_after = self._hedge_after(site, remaining)
+            if (hedge_after is not None and not wait(calls, timeout=hedge_after).done
+                    and not gate.streamed and self._can_hedge()):
+                # The primary keeps its listeners; the duplicate's reply is handed over whole if it wins
+                calls.append(submit(self._executor, self._attempt, client, prompt, [hedge_gate],
+                                    session_id, site, model_name, timeout, False))
+            pending = set(calls)
+            while True:
+                done, pending = wait(pending, timeout=max(0, due - time.monotonic()), return_when=FIRST_COMPLETED)
+                winner = self._settle(calls, done, pending, site)
+                if winner is not None:
+                    break
+        finally:
+            gate.close()
+            hedge_gate.close()
+            for call in calls:
+                call.cancel()
+        return self._hedge_result(winner is calls[0], winner.result(), gate, callbacks)
+
+    async def _arun(self, client, prompt, callbacks, session_id, site, model_name, timeout):
+        """Async twin of _run; the losing request is cancelled."""
+        remaining = time_left()
+        if remaining is None:
+            return await self._aattempt(client, prompt, callbacks, session_id, site, model_name, timeout)
+        if remaining <= 0:
+            raise DeadlineExceeded(f"No time left for the {site} call")
+
+        due = time.monotonic() + remaining
+        gate = GatedStreamHandler(callbacks)
+        calls = [asyncio.ensure_future(self._aattempt(client, prompt, [gate], session_id, site, model_name, timeout))]
+        try:
+            hedge_after = self._hedge_after(site, remaining)
+            if hedge_after is not None:
+                done, _ = await asyncio.wait(calls, timeout=hedge_after)
+                if not done and not gate.streamed and self._can_hedge():
+                    calls.append(asyncio.ensure_future(
+                        self._aattempt(client, prompt, None, session_id, site, model_name, timeout, False)))
+            pending = set(calls)
+            while True:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0, due - time.monotonic()), return_when=asyncio.FIRST_COMPLETED)
+                winner = self._settle(calls, done, pending, site)
+                if winner is not None:
+                    break
+        finally:
+            gate.close()
+            for call in calls:
+                call.cancel()
+        return self._hedge_result(winner is calls[0], winner.result(), gate, callbacks)
+
+    def _hedge_after(self, site, remaining):
+        """Seconds to wait for a call before hedging it, or None when it is not hedged."""
+        if not self.hedge or not self._can_hedge():
+            return None
+        budget = self.router.percentile(site, 0.95)
+        if budget is None:
+            return None
+        budget = max(budget, self.hedge_min)
+        return budget if budget < remaining else None
+
+    def _can_hedge(self):
+        """Whether there is spare capacity for a duplicate request: nobody waits and a quarter of the slots are free."""
+        with self._lock:
+            return self.waiting == 0 and self.in_flight <= self.max_concurrency * 3 // 4
+
+    def _settle(self, calls, done, pending, site):
+        """
+        Pick the answer of a hedged pair from the requests that finished.
+
+        Returns:
+            Future or None: The winning request, or None to keep waiting for the rest
+
+        Raises:
+            DeadlineExceeded: If nothing finished before the deadline
+        """
+        if not done:
+            if len(calls) > 1:
+                metrics.LLM_HEDGES.inc(site=site, winner="none")
+            raise DeadlineExceeded(f"The {site} call missed its deadline")
+        failed = None
+        for call in done:
+            if call.exception() is None:
+                if len(calls) > 1:
+                    metrics.LLM_HEDGES.inc(site=site, winner="primary" if call is calls[0] else "hedge")
+                    annotate(hedge="primary" if call is calls[0] else "hedge")
+                return call
+            failed = call
+        if pending:
+            return None
+        # Every request failed: report the error of the last one
+        raise failed.exception()
+
+    def _hedge_result(self, primary_won, reply, gate, callbacks):
+        """Hand the listeners a hedge's reply in one piece unless the primary already streamed to them."""
+        if not primary_won and not gate.streamed:
+            for handler in callbacks or []:
+                handler.on_llm_new_token(reply)
+        return reply
+
+    def _attempt(self, client, prompt, callbacks, session_id, site, model_name, timeout, queue=True):
+        """
+        Send the request, retrying rate-limit and transient errors with backoff.
+
+        A hedge passes queue=False: it only runs on a slot that is free at once.
+        """
+        attempt = 0
+        while True:
+            queued = time.monotonic()
+            with self.slot(session_id, queue):
+                start = time.monotonic()
+                annotate(queue_ms=round((start - queued) * 1000, 1))
+                try:
+                    reply = client.predict(prompt, callbacks=callbacks)
+                except RETRYABLE_ERRORS as e:
+                    self._failed(e, site, model_name, timeout, start, attempt)
+                else:
+                    return self._answered(prompt, reply, site, model_name, start, attempt)
+            # Back off outside the slot so waiting retries do not hold capacity
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    async def _acall(self, client, prompt, callbacks, session_id, site, model_name, timeout, cache_key=None):
+        """Async twin of _call."""
+        try:
+            reply = await self._arun(client, prompt, callbacks, session_id, site, model_name, timeout)
+        except Exception as e:
+            metrics.LLM_ERRORS.inc(site=site, error=type(e).__name__)
+            raise
+        if cache_key is not None:
+            await asyncio.to_thread(self.response_cache.put, cache_key, reply)
+        return reply
+
+    async def _aattempt(self, client, prompt, callbacks, session_id, site, model_name, timeout, queue=True):
+        """Async twin of _attempt."""
+        attempt = 0
+        while True:
+            queued = time.monotonic()
+            async with self.aslot(session_id, queue):
+                start = time.monotonic()
+                annotate(queue_ms=round((start - queued) * 1000, 1))
+                if self._aiohttp:
+                    openai.aiosession.set(self._http_session())
+                try:
+                    reply = await client.apredict(prompt, callbacks=callbacks)
+                except RETRYABLE_ERRORS as e:
+                    self._failed(e, site, model_name, timeout, start, attempt)
+                else:
+                    return self._answered(prompt, reply, site, model_name, start, attempt)
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def _answered(self, prompt, reply, site, model_name, start, attempt):
+        """Record a successful request and return its reply."""
+        seconds = time.monotonic() - start
+        self.router.observe(site, model_name, seconds)
+        metrics.LLM_CALL_SECONDS.observe(seconds, site=site, model=model_name)
+        metrics.LLM_TOKENS.inc(metrics.estimate_tokens(prompt), site=site, kind="prompt")
+        metrics.LLM_TOKENS.inc(metrics.estimate_tokens(reply), site=site, kind="completion")
+        annotate(attempts=attempt + 1)
+        return reply
+
+    def _failed(self, error, site, model_name, timeout, start, attempt):
+        """Record a transient failure, re-raising it once the retries are used up."""
+        if isinstance(error, openai.error.Timeout):
+            self.router.observe(site, model_name, timeout or time.monotonic() - start)
+        if attempt >= self.max_retries:
+            raise error
+        print(f"LLM call failed ({type(error).__name__}), retrying")
+        metrics.LLM_RETRIES.inc(site=site)
+
+    def _backoff(self, attempt):
+        """Seconds to wait before retrying, with full jitter; raises DeadlineExceeded if there is no time for it."""
+        delay = random.uniform(0, min(8.0, 0.5 * 2 ** attempt))
+        remaining = time_left()
+        if remaining is not None and delay >= remaining:
+            raise DeadlineExceeded("No time left to retry")
+        return delay
+
+    @contextmanager
+    def slot(self, session_id=None, queue=True):
+        """
+        Hold one global and one per-session concurrency slot, or raise GatewayBusy.
+
+        With queue=False, GatewayBusy is raised unless both slots are free at once.
+        """
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                raise GatewayBusy("Too many LLM calls waiting")
+            self.waiting += 1
+
+        session_slots = self._acquire_session(session_id)
+        acquired_session = acquired_global = False
+        try:
+            queue_timeout = self._queue_timeout() if queue else 0
+            due = time.monotonic() + queue_timeout
+            if session_slots is not None:
+                acquired_session = session_slots.acquire(timeout=queue_timeout)
+                if not acquired_session:
+                    raise GatewayBusy("Too many LLM calls for this session")
+            acquired_global = self._slots.acquire(timeout=max(0, due - time.monotonic()))
+            if not acquired_global:
+                raise GatewayBusy("No LLM capacity available")
+        except BaseException:
+            if acquired_session:
+                session_slots.release()
+            self._release_session(session_id)
+            raise
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+            if session_slots is not None:
+                session_slots.release()
+            self._release_session(session_id)
+
+    @asynccontextmanager
+    async def aslot(self, session_id=None, queue=True):
+        """Async twin of slot, waiting on the event loop instead of blocking a thread."""
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                raise GatewayBusy("Too many LLM calls waiting")
+            self.waiting += 1
+
+        state = self._loop_state()
+        session_slots = self._aacquire_session(state, session_id)
+        acquired_session = acquired_global = False
+        try:
+            queue_timeout = self._queue_timeout() if queue else 0
+            due = time.monotonic() + queue_timeout
+            if session_slots is not None:
+                acquired_session = await self._aacquire(session_slots, queue_timeout)
+                if not acquired_session:
+                    raise GatewayBusy("Too many LLM calls for this session")
+            acquired_global = await self._aacquire(state['slots'], max(0, due - time.monotonic()))
+            if not acquired_global:
+                raise GatewayBusy("No LLM capacity available")
+        except BaseException:
+            if acquired_session:
+                session_slots.release()
+            self._arelease_session(state, session_id)
+            raise
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            state['slots'].release()
+            if session_slots is not None:
+                session_slots.release()
+            self._arelease_session(state, session_id)
+
+    def _queue_timeout(self):
+        """Seconds a call may wait for a slot: queue_timeout, or less when the deadline is closer."""
+        remaining = time_left()
+        if remaining is None:
+            return self.queue_timeout
+        return max(0, min(self.queue_timeout, remaining))
+
+    @staticmethod
+    async def _aacquire(semaphore, timeout):
+        """Acquire an asyncio semaphore within timeout seconds; return whether it was acquired."""
+        if not semaphore.locked():
+            # Free now: wait_for could cancel the acquire before it runs when the timeout is 0
+            await semaphore.acquire()
+            return True
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def _loop_state(self):
+        """Return the async slots and HTTP session of the running event loop, creating them on first use."""
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            state = {'slots': asyncio.BoundedSemaphore(self.max_concurrency), 'sessions': {}, 'http': None}
+            self._loops[loop] = state
+        return state
+
+    def _aacquire_session(self, state, session_id):
+        """Return the asyncio semaphore limiting a session's calls on this loop."""
+        if session_id is None:
+            return None
+        entry = state['sessions'].get(session_id)
+        if entry is None:
+            entry = [asyncio.BoundedSemaphore(self.per_session), 0]
+            state['sessions'][session_id] = entry
+        entry[1] += 1
+        return entry[0]
+
+    def _arelease_session(self, state, session_id):
+        """Drop a session's asyncio semaphore once no call uses it."""
+        if session_id is None:
+            return
+        entry = state['sessions'].get(session_id)
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del state['sessions'][session_id]
+
+    def _http_session(self):
+        """Return the keep-alive aiohttp session of the running loop, the async counterpart of the requests pool."""
+        state = self._loop_state()
+        if state['http'] is None or state['http'].closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=30)
+            state['http'] = aiohttp.ClientSession(connector=connector)
+        return state['http']
+
+    async def aclose(self):
+        """Close the aiohttp session of the running loop, e.g. when an ASGI server shuts down."""
+        state = self._loops.get(asyncio.get_running_loop())
+        if state is not None and state['http'] is not None:
+            await state['http'].close()
+            state['http'] = None
+
+    def _acquire_session(self, session_id):
+        """Return the semaphore limiting a session's calls, creating it on first use."""
+        if session_id is None:
+            return None
+        with self._lock:
+            entry = self._session_slots.get(session_id)
+            if entry is None:
+                entry = [threading.BoundedSemaphore(self.per_session), 0]
+                self._session_slots[session_id] = entry
+            entry[1] += 1
+            return entry[0]
+
+    def _release_session(self, session_id):
+        """Drop a session's semaphore once no call uses it."""
+        if session_id is None:
+            return
+        with self._lock:
+            entry = self._session_slots.get(session_id)
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self._session_slots[session_id]
+
+    def _openai_client(self, model_name, temperature, max_tokens=None, timeout=None):
+        """Build a streaming OpenAI chat client; retries are handled by the gateway."""
+        return ChatOpenAI(
+            model_name=model_name,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            request_timeout=timeout,
+            streaming=True,
+            max_retries=0,
+        )
+
+_default_gateway = None
+_default_lock = threading.Lock()
+
+def get_gateway():
+    """Return the process-wide gateway, creating it on first use."""
+    global _default_gateway
+    with _default_lock:
+        if _default_gateway is None:
+            _default_gateway = LLMGateway()
+        return _default_gateway
+
+def set_gateway(gateway):
+    """Replace the process-wide gateway, e.g. with one using fake clients."""
+    global _default_gateway
+    with _default_lock:
+        _default_gateway = gateway
@@ -1,66 +1,235 @@
 import os
+import copy
 import json
 import sys
+import asyncio
 import time
-from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferMemory
-from langchain.llms import OpenAI
-from langchain.chat_models import ChatOpenAI
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from .recommendation import RecommendationGenerator
 from .celebrity import CelebrityDoppelgangerGenerator
 from .conversation_roaster import PersonalityRoastGenerator
 
 from .relationship import RelationshipInsightsGenerator
 from .career import CareerInsightsGenerator
+from .content_cache import TypeContentCache
+from .streaming import DelimitedStreamHandler, stream_callbacks
+from .memory import BoundedConversationMemory
+from .analysis_parser import AnalysisParseError, parse_analysis
+from .prompts import (ANALYSIS_PROMPT, INSIGHTS_PROMPT, QUESTION_MARKER, QUESTION_PROMPT,
+                      REPAIR_PROMPT, TURN_PROMPT)
+from .dimension_scorer import DimensionScorer
+from .answer_classifier import AnswerClassifier, ExampleLog
+from .llm_gateway import DeadlineExceeded, GatewayBusy, deadline, get_gateway, submit, time_left
+from .tracing import annotate, traced
+from . import metrics
 
-class MBTIAnalyzer:
-    def __init__(self):
-        """Initialize the MBTI analyzer with dynamic conversation handling."""
+class AnalyzerResources:
+    def __init__(self, gateway=None, content_cache=None):
+        """
+        Build the LLM gateway and report generators shared by every session.
+        
+        Args:
+            gateway (LLMGateway, optional): Gateway all LLM calls go through. Defaults to the shared one.
+            content_cache (TypeContentCache, optional): Cache of per-type report content.
+                Defaults to the one configured by MBTI_CONTENT_CACHE_DIR.
+        """
         # Check for OpenAI API key
         if not os.environ.get("OPENAI_API_KEY"):
             print("ERROR: OPENAI_API_KEY environment variable is not set.")
             print("Please set it in the .env file or as an environment variable.")
             sys.exit(1)
             
-        # Setup OpenAI model
-        self.llm = ChatOpenAI(
-            temperature=0.7,
-            model_name="gpt-3.5-turbo",
-        )
-        
-        # Setup conversation memory
-        self.memory = ConversationBufferMemory()
+        # Shared LLM gateway with pooled connections and concurrency limits
+        self.gateway = gateway or get_gateway()
         
-        # Setup conversation chain
-        self.conversation = ConversationChain(
-            llm=self.llm,
-            memory=self.memory,
-            verbose=True
-        )
+        # Persistent cache for the report sections that only depend on the type
+        self.content_cache = content_cache or TypeContentCache()
         
         # Initialize recommendation generator
-        self.recommendation_generator = RecommendationGenerator()
+        self.recommendation_generator = RecommendationGenerator(self.content_cache, self.gateway)
 
         # Initialize  doppelganger recommendations
-        self.celebrity = CelebrityDoppelgangerGenerator()
+        self.celebrity = CelebrityDoppelgangerGenerator(self.content_cache, self.gateway)
 
         #Initialize conversation roast
-        self.conversation_roaster = PersonalityRoastGenerator()
-
-     
+        self.conversation_roaster = PersonalityRoastGenerator(self.gateway)
 
         #relationship
-        self.relationship = RelationshipInsightsGenerator()
+        self.relationship = RelationshipInsightsGenerator(self.content_cache, self.gateway)
 
         #Career insights
-        self.career = CareerInsightsGenerator()
+        self.career = CareerInsightsGenerator(self.content_cache, self.gateway)
+
+        # Worker pool for the independent report sections
+        self.report_executor = ThreadPoolExecutor(
+            max_workers=int(os.environ.get("MBTI_REPORT_WORKERS", 32)),
+            thread_name_prefix="report"
+        )
+        self.report_section_timeout = float(os.environ.get("MBTI_REPORT_SECTION_TIMEOUT", 45))
+        
+        # Local scorer that answers low-information replies without an LLM call
+        self.classifier = AnswerClassifier.load()
+        
+        # Optional log of LLM analyses to train the classifier on
+        log_path = os.environ.get("MBTI_CLASSIFIER_LOG")
+        self.example_log = ExampleLog(log_path) if log_path else None
+    
+    @property
+    def type_generators(self):
+        """Generators whose output depends only on the MBTI type."""
+        return [self.recommendation_generator, self.celebrity, self.relationship, self.career]
+
 
+class MBTIAnalyzer:
+    # Initial open-ended questions
+    initial_questions = [
+        "Tell me about what energizes you the most in life.",
+        "How do you typically approach new situations or challenges?",
+        "What's your ideal way to spend a free day?",
+        "How do you usually make important decisions?"
+    ]
+    
+    # MBTI dimension descriptions for context
+    dimension_descriptions = {
+        'E-I': {
+            'E': "Extraversion - Energy from external world and people",
+            'I': "Introversion - Energy from internal reflection and solitude"
+        },
+        'S-N': {
+            'S': "Sensing - Focus on concrete facts and present reality",
+            'N': "Intuition - Focus on patterns and future possibilities"
+        },
+        'T-F': {
+            'T': "Thinking - Decisions based on logic and analysis",
+            'F': "Feeling - Decisions based on values and harmony"
+        },
+        'J-P': {
+            'J': "Judging - Preference for structure and planning",
+            'P': "Perceiving - Preference for flexibility and spontaneity"
+        }
+    }
+    
+    # Welcome message
+    welcome_message = (
+        "Hi there! 👋 I'm your MBTI personality test assistant. "
+        "Let's have a conversation to understand your personality better. "
+        "I'll ask you questions about your preferences and tendencies, "
+        "and at the end, I'll provide insights about your personality type "
+        "along with personalized recommendations for music, books, and movies! "
+        "Are you ready to begin?"
+    )
+    
+    mbti_descriptions = {
+        "ISTJ": "The Inspector: Practical, fact-minded, and reliable. You value loyalty, hard work, and tradition.",
+        "ISFJ": "The Protector: Quiet, caring, and dependable. You're committed to fulfilling your duties and responsibilities.",
+        "INFJ": "The Counselor: Insightful, principled, and idealistic. You seek meaning and connection in relationships and work.",
+        "INTJ": "The Mastermind: Strategic, innovative, and independent. You have a clear vision and drive for improvement.",
+        "ISTP": "The Craftsman: Practical, analytical, and adaptable. You're skilled at understanding how things work.",
+        "ISFP": "The Composer: Gentle, sensitive, and artistic. You value personal freedom and expressing yourself authentically.",
+        "INFP": "The Healer: Idealistic, empathetic, and creative. You're driven by your personal values and desire to help others.",
+        "INTP": "The Architect: Logical, curious, and theoretical. You enjoy abstract thinking and solving complex problems.",
+        "ESTP": "The Dynamo: Energetic, pragmatic, and spontaneous. You thrive in dynamic situations and enjoy taking risks.",
+        "ESFP": "The Performer: Outgoing, friendly, and enthusiastic. You live in the moment and bring fun to any situation.",
+        "ENFP": "The Champion: Imaginative, enthusiastic, and compassionate. You're inspired by possibilities and what could be.",
+        "ENTP": "The Visionary: Innovative, resourceful, and intellectually curious. You enjoy theoretical discussions and debates.",
+        "ESTJ": "The Supervisor: Organized, practical, and decisive. You value structure, clarity, and following procedures.",
+        "ESFJ": "The Provider: Warm, cooperative, and reliable. You're attuned to others' needs and seek to create harmony.",
+        "ENFJ": "The Teacher: Charismatic, empathetic, and inspiring. You help others develop and grow to their full potential.",
+        "ENTJ": "The Commander: Strategic, ambitious, and assertive. You're driven to lead and implement your vision."
+    }
+
+    # Report sections a completed session can request, in display order
+    report_section_names = ['insights', 'roast', 'recommendations', 'celebrities', 'relationship', 'career']
+
+    # Shown in place of a report section that failed or timed out
+    report_fallbacks = {
+        'insights': "We couldn't put together your personal insights this time.",
+        'roast': "Even our roast generator needed a break. Consider yourself spared! 😉",
+        'recommendations': "Recommendations are unavailable right now. Please try again later.",
+        'celebrities': "Your celebrity doppelgangers are camera-shy today.",
+        'relationship': "Relationship insights are unavailable right now.",
+        'career': "Career insights are unavailable right now.",
+    }
+
+    # Separates the analysis JSON from the question in combined turns
+    question_marker = QUESTION_MARKER
+    
+    busy_message = "I'm talking with a lot of people right now. Please send your answer again in a moment."
+    
+    # Asked when the next question cannot be generated before the turn's deadline
+    fallback_questions = {
+        'E-I': [
+            "After a busy week, what helps you feel like yourself again?",
+            "Think of a recent gathering you went to. What was the best part of it for you?",
+            "When you have a problem on your mind, do you tend to talk it through or think it over first?",
+        ],
+        'S-N': [
+            "When you learn something new, what helps it click for you?",
+            "Tell me about a project you enjoyed. What did you like about how it came together?",
+            "When you picture the next few years, what do you find yourself thinking about?",
+        ],
+        'T-F': [
+            "Think of a tough decision you made recently. What tipped the balance?",
+            "When a friend comes to you with a problem, how do you usually help?",
+            "What does a fair outcome look like to you when people disagree?",
+        ],
+        'J-P': [
+            "How do you usually plan a trip or a free weekend?",
+            "What happens when a deadline is coming up? Walk me through how you handle it.",
+            "How do you feel when plans change at the last minute?",
+        ],
+    }
+
+    def __init__(self, resources=None, turn_mode=None):
+        """
+        Initialize the MBTI analyzer with dynamic conversation handling.
+        
+        Args:
+            resources (AnalyzerResources, optional): Shared LLM client and generators.
+                A private set is built when omitted.
+            turn_mode (str, optional): "split" for separate analysis and question calls, or
+                "combined" for one call per turn. Defaults to MBTI_TURN_MODE or "split".
+        """
+        self.resources = resources or AnalyzerResources()
+        self.turn_mode = turn_mode or os.environ.get("MBTI_TURN_MODE", "split")
+        if self.turn_mode not in ('split', 'combined'):
+            raise ValueError(f"Invalid turn mode: {self.turn_mode}")
+        self.gateway = self.resources.gateway
+        self.recommendation_generator = self.resources.recommendation_generator
+        self.celebrity = self.resources.celebrity
+        self.conversation_roaster = self.resources.conversation_roaster
+        self.relationship = self.resources.relationship
+        self.career = self.resources.career
+        
+        # Token-budgeted memory of the user's answers; analysis prompts never enter it
+        self.memory = BoundedConversationMemory(self.gateway, self.resources.report_executor)
+        
         # Conversation state
         self.conversation_started = False
         self.test_complete = False
         self.mbti_result = None
         self.conversation_context = []
         self.current_question = None
+        self.result_message = None
+        
+        # Report sections generated so far, by name
+        self.report_sections = {}
+        
+        # Running evidence per preference letter, used to stop as soon as the type is clear
+        self.scorer = DimensionScorer()
+        self.min_responses = int(os.environ.get("MBTI_MIN_RESPONSES", 4))
+        
+        # Background draft of the next question; never part of the saved state
+        self.speculative_questions = os.environ.get("MBTI_SPECULATIVE_QUESTIONS", "1") == "1"
+        self._speculation = None
+        self._speculation_lock = threading.Lock()
+        
+        # Bumped on every save so stale copies of a session can be detected
+        self.state_version = 0
+        
+        # End-to-end budget for the LLM calls of one turn
+        self.turn_deadline = float(os.environ.get("MBTI_TURN_DEADLINE", 12))
         
         # Track dimension coverage
         self.dimension_coverage = {
@@ -69,51 +238,189 @@ class MBTIAnalyzer:
             'T-F': 0.0,  # Coverage score for T/F dimension
             'J-P': 0.0   # Coverage score for J/P dimension
         }
+    
+    def to_state(self):
+        """Return a copy of the session state as a JSON-serializable dict."""
+        return copy.deepcopy({
+            'version': self.state_version,
+            'turn_mode': self.turn_mode,
+            'conversation_started': self.conversation_started,
+            'test_complete': self.test_complete,
+            'mbti_result': self.mbti_result,
+            'result_message': self.result_message,
+            'report_sections': self.report_sections,
+            'conversation_context': self.conversation_context,
+            'current_question': self.current_question,
+            'dimension_coverage': self.dimension_coverage,
+            'scorer': self.scorer.to_state(),
+            'memory': self.memory.to_state(),
+        })
+    
+    @classmethod
+    def from_state(cls, state, resources=None):
+        """
+        Rebuild an analyzer from a dict produced by to_state.
         
-        # Initial open-ended questions
-        self.initial_questions = [
-            "Tell me about what energizes you the most in life.",
-            "How do you typically approach new situations or challenges?",
-            "What's your ideal way to spend a free day?",
-            "How do you usually make important decisions?"
-        ]
-        
-        # MBTI dimension descriptions for context
-        self.dimension_descriptions = {
-            'E-I': {
-                'E': "Extraversion - Energy from external world and people",
-                'I': "Introversion - Energy from internal reflection and solitude"
-            },
-            'S-N': {
-                'S': "Sensing - Focus on concrete facts and present reality",
-                'N': "Intuition - Focus on patterns and future possibilities"
-            },
-            'T-F': {
-                'T': "Thinking - Decisions based on logic and analysis",
-                'F': "Feeling - Decisions based on values and harmony"
-            },
-            'J-P': {
-                'J': "Judging - Preference for structure and planning",
-                'P': "Perceiving - Preference for flexibility and spontaneity"
-            }
-        }
+        Args:
+            state (dict): Serialized session state
+            resources (AnalyzerResources, optional): Shared LLM client and generators
         
-        # Welcome message
-        self.welcome_message = (
-            "Hi there! 👋 I'm your MBTI personality test assistant. "
-            "Let's have a conversation to understand your personality better. "
-            "I'll ask you questions about your preferences and tendencies, "
-            "and at the end, I'll provide insights about your personality type "
-            "along with personalized recommendations for music, books, and movies! "
-            "Are you ready to begin?"
-        )
+        Returns:
+            MBTIAnalyzer: The restored analyzer
+        """
+        analyzer = cls(resources, turn_mode=state.get('turn_mode'))
+        analyzer.load_state(state)
+        return analyzer
+    
+    def load_state(self, state):
+        """Restore this analyzer's session state from a dict produced by to_state."""
+        # The caller may keep the dict, e.g. as a rollback snapshot, so nothing of it is shared
+        state = copy.deepcopy(state)
+        self.state_version = state.get('version', 0)
+        self.conversation_started = state.get('conversation_started', False)
+        self.test_complete = state.get('test_complete', False)
+        self.mbti_result = state.get('mbti_result')
+        self.result_message = state.get('result_message')
+        self.report_sections = state.get('report_sections', {})
+        self.conversation_context = state.get('conversation_context', [])
+        self.current_question = state.get('current_question')
+        self.dimension_coverage = {dim: 0.0 for dim in self.dimension_coverage}
+        self.dimension_coverage.update(state.get('dimension_coverage', {}))
+        self.scorer = DimensionScorer()
+        if 'scorer' in state:
+            self.scorer.load_state(state['scorer'])
+        else:
+            # Sessions saved before the scorer existed: replay their analyses
+            for entry in self.conversation_context:
+                self.scorer.update(entry.get('analysis'))
+        self.memory.load_state(state.get('memory', {}))
     
-    def process_message(self, message):
-        """Process user message and return appropriate response."""
+    @traced()
+    def process_message(self, message, on_token=None):
+        """
+        Process user message and return appropriate response.
+        
+        The LLM calls of a turn share a deadline of turn_deadline seconds. Steps still
+        waiting when it runs out are answered locally: the answer by the local
+        classifier and the next question from fallback_questions.
+        
+        Args:
+            message (str): The user's message
+            on_token (callable, optional): Called as on_token(section, token) while the next
+                question or a report section is being generated
+        
+        Returns:
+            tuple: (response text, whether the test is complete, MBTI type or None)
+        """
+        snapshot = self.to_state()
+        try:
+            with deadline(self.turn_deadline):
+                return self._process_message(message, on_token)
+        except (GatewayBusy, DeadlineExceeded) as e:
+            # Roll back the half-finished turn so the user can simply resend the answer
+            print(f"LLM gateway busy: {e!r}")
+            self.load_state(snapshot)
+            return self.busy_message, False, None
+    
+    def _process_message(self, message, on_token=None):
+        """Handle one message; see process_message."""
+        reply = self._immediate_reply(message)
+        if reply is not None:
+            return reply
+        
+        # Draft the follow-up question while the answer is being analyzed
+        speculation = self._take_speculation(message)
+        provisional, local_only = self._classify(message)
+        # Once the fixed opening questions run out, one combined call can both
+        # analyze the answer and write the next question
+        next_question = None
+        if local_only:
+            # Low-information or clear-cut answer: the local scorer is enough
+            analysis = provisional
+            self._update_dimension_coverage(analysis)
+        elif self._combined_turn():
+            analysis, next_question = self._process_turn_combined(message, on_token, fallback=provisional)
+        else:
+            # Analyze the response, falling back to the local estimate if the LLM is saturated or late
+            analysis = self._analyze_response(message, fallback=provisional)
+        self._record_answer(message, analysis)
+        
+        # Check if we have enough information
+        if self._should_complete_test():
+            return self._finish_test(speculation)
+        
+        # Generate next question unless the combined call already did
+        if not next_question:
+            next_question = self._use_speculation(speculation, on_token)
+        if not next_question:
+            next_question = self._generate_next_question(on_token)
+        self.current_question = next_question
+        return next_question, False, None
+    
+    @traced()
+    async def aprocess_message(self, message, on_token=None):
+        """
+        Async twin of process_message for code running on an event loop.
+        
+        LLM calls are awaited instead of blocking a thread; on_token is called on the loop.
+        """
+        snapshot = self.to_state()
+        try:
+            with deadline(self.turn_deadline):
+                return await self._aprocess_message(message, on_token)
+        except (GatewayBusy, DeadlineExceeded) as e:
+            print(f"LLM gateway busy: {e!r}")
+            self.load_state(snapshot)
+            return self.busy_message, False, None
+    
+    async def _aprocess_message(self, message, on_token=None):
+        """Handle one message; see aprocess_message."""
+        reply = self._immediate_reply(message)
+        if reply is not None:
+            return reply
+        
+        speculation = self._take_speculation(message, asynchronous=True)
+        provisional, local_only = self._classify(message)
+        next_question = None
+        if local_only:
+            analysis = provisional
+            self._update_dimension_coverage(analysis)
+        elif self._combined_turn():
+            analysis, next_question = await self._aprocess_turn_combined(message, on_token, fallback=provisional)
+        else:
+            analysis = await self._aanalyze_response(message, fallback=provisional)
+        await self._arecord_answer(message, analysis)
+        
+        if self._should_complete_test():
+            return self._finish_test(speculation)
+        
+        if not next_question:
+            next_question = await self._ause_speculation(speculation, on_token)
+        if not next_question:
+            next_question = await self._agenerate_next_question(on_token)
+        self.current_question = next_question
+        return next_question, False, None
+    
+    def _immediate_reply(self, message):
+        """
+        Answer messages that are not an answer to the current question.
+        
+        Returns:
+            tuple or None: The reply as returned by process_message, or None when the
+                message answers the current question
+        """
         if not message and not self.conversation_started:
             # First interaction, send welcome message
             return self.welcome_message, False, None
         
+        if not message and self.conversation_started and not self.test_complete:
+            # Resumed session, repeat the pending question
+            return self.current_question, False, None
+        
+        if not message and self.test_complete and self.result_message:
+            # Resumed session, show the results again
+            return self.result_message, True, self.mbti_result
+        
         if self.test_complete:
             # Test is already complete
             return "Your personality test is already complete! Your MBTI type is " + self.mbti_result, True, self.mbti_result
@@ -124,129 +431,459 @@ class MBTIAnalyzer:
             self.current_question = self.initial_questions[0]
             return self.current_question, False, None
         
-        if self.conversation_started:
-            # Analyze the response
-            analysis = self._analyze_response(message)
-            self._update_conversation_context(message, analysis)
-            
-            # Check if we have enough information
-            if self._should_complete_test():
-                # Calculate MBTI result
-                self._calculate_mbti_result()
-                self.test_complete = True
-                
-                # Generate the result message
-                result_message = self._generate_result_message()
-                return result_message, True, self.mbti_result
-            else:
-                # Generate next question
-                next_question = self._generate_next_question()
-                self.current_question = next_question
-                return next_question, False, None
-        
-        # Default response
-        return "I'm not sure how to respond to that. Are you ready to continue our conversation?", False, None
-    
-    def _analyze_response(self, response):
-        """Analyze response for MBTI indicators and update dimension coverage."""
-        analysis_prompt = f"""
-        Analyze this response in the context of MBTI dimensions:
-        
-        Previous context: {self._format_conversation_history()}
-        Current response: "{response}"
-        Current question: "{self.current_question}"
-        
-        For each MBTI dimension pair (E-I, S-N, T-F, J-P):
-        1. Identify relevant indicators
-        2. Assess confidence level (0-1)
-        3. Extract key themes or patterns
-        4. Determine which preference is stronger
-        
-        Format the response as JSON with the following structure:
-        {{
-            "dimension_analysis": {{
-                "E-I": {{"confidence": float, "preference": "E" or "I", "indicators": []}},
-                "S-N": {{"confidence": float, "preference": "S" or "N", "indicators": []}},
-                "T-F": {{"confidence": float, "preference": "T" or "F", "indicators": []}},
-                "J-P": {{"confidence": float, "preference": "J" or "P", "indicators": []}}
-            }},
-            "themes": [list of key themes],
-            "context_relevance": float
-        }}
+        if not self.conversation_started:
+            # Default response
+            return "I'm not sure how to respond to that. Are you ready to continue our conversation?", False, None
+        return None
+    
+    def _classify(self, message):
+        """Score an answer locally; returns (provisional analysis, whether it is enough on its own)."""
+        provisional, local_only = self.resources.classifier.classify(message)
+        annotate(answer=len(self.conversation_context) + 1, local_only=local_only)
+        return provisional, local_only
+    
+    def _combined_turn(self):
+        """Whether this turn's analysis and next question come from one LLM call."""
+        return self.turn_mode == 'combined' and len(self.conversation_context) + 1 >= len(self.initial_questions)
+    
+    def _record_answer(self, message, analysis):
+        """Add an analysed answer to the conversation and the classifier's training log."""
+        if self.resources.example_log is not None and analysis and analysis.get('source') != 'local':
+            self.resources.example_log.append(message, analysis)
+        self._update_conversation_context(message, analysis)
+    
+    async def _arecord_answer(self, message, analysis):
+        """Async twin of _record_answer; the training log is written off the event loop."""
+        if self.resources.example_log is not None and analysis and analysis.get('source') != 'local':
+            await asyncio.to_thread(self.resources.example_log.append, message, analysis)
+        self._update_conversation_context(message, analysis)
+    
+    def _finish_test(self, speculation):
+        """Complete the test and return the result message reply."""
+        if speculation is not None:
+            speculation['future'].cancel()
+        
+        # Calculate MBTI result
+        self._calculate_mbti_result()
+        self.test_complete = True
+        
+        # Only the type and its description; the report sections load on demand
+        result_message = self._generate_result_message()
+        self.result_message = result_message
+        annotate(complete=True)
+        return result_message, True, self.mbti_result
+    
+    @traced()
+    def _analyze_response(self, response, fallback=None):
         """
+        Analyze response for MBTI indicators and update dimension coverage.
+        
+        Args:
+            response (str): The user's answer
+            fallback (dict, optional): Provisional local analysis used if the LLM gateway is busy
+                or the turn's deadline runs out
         
+        Returns:
+            dict or None: The parsed analysis
+        """
         # Get analysis from LLM
-        result = self.conversation.predict(input=analysis_prompt)
         try:
-            analysis = json.loads(result)
-            self._update_dimension_coverage(analysis)
-            return analysis
-        except json.JSONDecodeError:
-            print("Error parsing analysis result")
+            result = self._predict(self._analysis_prompt(response), site='analysis', template=ANALYSIS_PROMPT)
+        except (GatewayBusy, DeadlineExceeded) as e:
+            return self._local_analysis(e, fallback)
+        return self._parse_analysis(result)
+    
+    @traced()
+    async def _aanalyze_response(self, response, fallback=None):
+        """Async twin of _analyze_response."""
+        try:
+            result = await self._apredict(self._analysis_prompt(response), site='analysis', template=ANALYSIS_PROMPT)
+        except (GatewayBusy, DeadlineExceeded) as e:
+            return self._local_analysis(e, fallback)
+        return await self._aparse_analysis(result)
+    
+    def _analysis_prompt(self, response):
+        """Build the prompt analyzing one answer."""
+        return ANALYSIS_PROMPT.format(
+            history=self._format_conversation_history(),
+            question=self.current_question,
+            response=response
+        )
+    
+    def _local_analysis(self, error, fallback):
+        """Use the local analysis when the gateway is busy or late, or re-raise if there is none."""
+        if fallback is None:
+            raise error
+        print(f"LLM analysis unavailable, using the local analysis: {error!r}")
+        if isinstance(error, DeadlineExceeded):
+            metrics.TURN_FALLBACKS.inc(step="analysis")
+            annotate(fallback="analysis")
+        self._update_dimension_coverage(fallback)
+        return fallback
+    
+    def _parse_analysis(self, result):
+        """Parse the JSON analysis returned by the LLM and update dimension coverage."""
+        try:
+            analysis = parse_analysis(result)
+        except AnalysisParseError as e:
+            print(f"Error parsing analysis result: {e}")
+            analysis = self._repair_analysis(result)
+        
+        self._update_dimension_coverage(analysis)
+        return analysis
+    
+    async def _aparse_analysis(self, result):
+        """Async twin of _parse_analysis."""
+        try:
+            analysis = parse_analysis(result)
+        except AnalysisParseError as e:
+            print(f"Error parsing analysis result: {e}")
+            analysis = await self._arepair_analysis(result)
+        
+        self._update_dimension_coverage(analysis)
+        return analysis
+    
+    def _repair_analysis(self, result):
+        """
+        Ask the LLM once to turn a malformed analysis reply into valid JSON.
+        
+        Args:
+            result (str): The reply that could not be parsed
+        
+        Returns:
+            dict or None: The repaired analysis, or None if the repair failed too
+        """
+        try:
+            repaired = self.gateway.predict(self._repair_prompt(result), site='repair', template=REPAIR_PROMPT)
+        except DeadlineExceeded as e:
+            print(f"No time left to repair the analysis: {e!r}")
+            return None
+        try:
+            return parse_analysis(repaired)
+        except AnalysisParseError as e:
+            print(f"Error repairing analysis result: {e}")
             return None
     
-    def _generate_next_question(self):
-        """Generate a contextual follow-up question based on conversation history."""
-        # Determine which dimensions need more coverage
-        weak_dimensions = [dim for dim, score in self.dimension_coverage.items() if score < 0.6]
-        
-        question_prompt = f"""
-        Based on the following conversation history:
-        {self._format_conversation_history()}
-        
-        Current dimension coverage:
-        {json.dumps(self.dimension_coverage, indent=2)}
-        
-        Generate a natural follow-up question that:
-        1. Feels like a natural continuation of the conversation
-        2. Helps gather information about these dimensions: {', '.join(weak_dimensions)}
-        3. References previous answers when relevant
-        4. Maintains a conversational, friendly tone
-        
-        The question should:
-        - Not feel like a test question
-        - Be open-ended
-        - Encourage detailed responses
-        - Flow naturally from the previous response
-        - Not directly ask about personality preferences
-        
-        Return only the question text, without any additional context or explanation.
+    async def _arepair_analysis(self, result):
+        """Async twin of _repair_analysis."""
+        try:
+            repaired = await self.gateway.apredict(self._repair_prompt(result), site='repair', template=REPAIR_PROMPT)
+        except DeadlineExceeded as e:
+            print(f"No time left to repair the analysis: {e!r}")
+            return None
+        try:
+            return parse_analysis(repaired)
+        except AnalysisParseError as e:
+            print(f"Error repairing analysis result: {e}")
+            return None
+    
+    def _repair_prompt(self, result):
+        """Build the prompt asking for a malformed analysis to be rewritten as JSON."""
+        return REPAIR_PROMPT.format(text=(result or "")[:2000])
+    
+    @traced()
+    def _process_turn_combined(self, response, on_token=None, fallback=None):
         """
+        Analyze a response and generate the follow-up question in a single LLM call.
+        
+        The reply carries the JSON analysis first and the question after a marker line,
+        so the question can be streamed as soon as the marker arrives. The evidence from
+        before this answer decides which dimension the question targets.
+        
+        Args:
+            response (str): The user's answer to the current question
+            on_token (callable, optional): Receives the question's tokens as they stream
+            fallback (dict, optional): Local analysis used if the turn's deadline runs out
+        
+        Returns:
+            tuple: (analysis dict or None, next question or None when it is missing)
+        """
+        try:
+            result = self._predict(self._turn_prompt(response), self._turn_callbacks(on_token), site='turn', template=TURN_PROMPT)
+        except DeadlineExceeded as e:
+            return self._local_analysis(e, fallback), None
         
-        # If we have remaining initial questions and low coverage, use them
+        analysis_text, _, question = result.partition(self.question_marker)
+        return self._parse_analysis(analysis_text.strip()), question.strip() or None
+    
+    @traced()
+    async def _aprocess_turn_combined(self, response, on_token=None, fallback=None):
+        """Async twin of _process_turn_combined."""
+        try:
+            result = await self._apredict(self._turn_prompt(response), self._turn_callbacks(on_token), site='turn', template=TURN_PROMPT)
+        except DeadlineExceeded as e:
+            return self._local_analysis(e, fallback), None
+        
+        analysis_text, _, question = result.partition(self.question_marker)
+        return await self._aparse_analysis(analysis_text.strip()), question.strip() or None
+    
+    def _turn_prompt(self, response):
+        """Build the prompt of a combined turn: the analysis, then the next question."""
+        return TURN_PROMPT.format(
+            history=self._format_conversation_history(),
+            question=self.current_question,
+            response=response,
+            coverage=json.dumps(self.dimension_coverage, indent=2),
+            focus=self._question_focus()
+        )
+    
+    def _turn_callbacks(self, on_token):
+        """Stream only the question part of a combined turn."""
+        if on_token is None:
+            return None
+        return [DelimitedStreamHandler(on_token, 'question', self.question_marker, gate=self._continues_after)]
+    
+    def _continues_after(self, analysis_text):
+        """Whether the test goes on after the pending answer, judged from its analysis text."""
+        try:
+            analysis = parse_analysis(analysis_text.strip())
+        except AnalysisParseError:
+            # Unparseable analyses add no evidence, so they do not complete the test
+            analysis = None
+        scorer = DimensionScorer(self.scorer.stop_confidence, self.scorer.min_evidence, self.scorer.prior)
+        scorer.load_state(self.scorer.to_state())
+        scorer.update(analysis)
+        coverage = dict(self.dimension_coverage)
+        self._add_coverage(coverage, analysis)
+        return not self._completes(len(self.conversation_context) + 1, scorer, coverage)
+    
+    @traced()
+    def _generate_next_question(self, on_token=None):
+        """Generate a contextual follow-up question based on conversation history."""
+        # If we have remaining initial questions, use them
         if len(self.conversation_context) < len(self.initial_questions):
             return self.initial_questions[len(self.conversation_context)]
         
         # Generate dynamic question
-        return self.conversation.predict(input=question_prompt)
+        question_prompt = self._question_prompt(self._format_conversation_history(), self.scorer.most_uncertain())
+        try:
+            return self._predict(question_prompt, stream_callbacks(on_token, 'question'), site='question', template=QUESTION_PROMPT)
+        except DeadlineExceeded as e:
+            return self._fallback_question(e, on_token)
+    
+    @traced()
+    async def _agenerate_next_question(self, on_token=None):
+        """Async twin of _generate_next_question."""
+        if len(self.conversation_context) < len(self.initial_questions):
+            return self.initial_questions[len(self.conversation_context)]
+        
+        question_prompt = self._question_prompt(self._format_conversation_history(), self.scorer.most_uncertain())
+        try:
+            return await self._apredict(question_prompt, stream_callbacks(on_token, 'question'), site='question', template=QUESTION_PROMPT)
+        except DeadlineExceeded as e:
+            return self._fallback_question(e, on_token)
+    
+    def _fallback_question(self, error, on_token=None):
+        """Pick a question from the local bank for the least certain dimension, preferring unasked ones."""
+        print(f"No time left to generate the next question, using a fallback: {error!r}")
+        metrics.TURN_FALLBACKS.inc(step="question")
+        annotate(fallback="question")
+        dimension = self.scorer.most_uncertain()
+        asked = {entry.get('question') for entry in self.conversation_context}
+        candidates = self.fallback_questions[dimension]
+        question = next((q for q in candidates if q not in asked), candidates[len(self.conversation_context) % len(candidates)])
+        if on_token is not None:
+            on_token('question', question)
+        return question
+    
+    def _question_prompt(self, history, dimension):
+        """Build the prompt for a follow-up question exploring one dimension."""
+        return QUESTION_PROMPT.format(
+            history=history,
+            coverage=json.dumps(self.dimension_coverage, indent=2),
+            focus=self._question_focus(dimension)
+        )
+    
+    def prefetch_question(self, asynchronous=False):
+        """
+        Start drafting the next question in the background, e.g. while the user is typing.
+        
+        The draft targets the dimension that is least certain right now. It is used for
+        the next turn only if that dimension is still the least certain once the answer
+        has been analyzed.
+        
+        Args:
+            asynchronous (bool): Draft as a task on the running event loop instead of on
+                the report pool, for sessions driven by aprocess_message
+        """
+        if not self._will_generate_question():
+            return
+        with self._speculation_lock:
+            speculation = self._speculation
+            if speculation is not None and speculation['turn'] == len(self.conversation_context):
+                return
+            self._speculation = self._speculate(asynchronous=asynchronous)
+    
+    def _will_generate_question(self):
+        """Whether the question after the pending answer will come from a split-mode LLM call."""
+        return (self.speculative_questions and self.turn_mode == 'split'
+                and self.conversation_started and not self.test_complete
+                and len(self.conversation_context) + 1 >= len(self.initial_questions))
+    
+    def _speculate(self, question=None, answer=None, asynchronous=False):
+        """Submit a candidate next question for generation and return its bookkeeping."""
+        history = self._format_conversation_history()
+        if answer is not None:
+            history += f"\nQ: {question}\nA: {answer}"
+        dimension = self.scorer.most_uncertain()
+        prompt = self._question_prompt(history, dimension)
+        if asynchronous:
+            future = asyncio.ensure_future(self._apredict(prompt, None, 'question', QUESTION_PROMPT))
+            # Drafts are often dropped unread; retrieve their errors so asyncio does not log them
+            future.add_done_callback(lambda task: task.cancelled() or task.exception())
+        else:
+            future = submit(self.resources.report_executor, self._predict, prompt, None, 'question', QUESTION_PROMPT)
+        return {
+            'turn': len(self.conversation_context),
+            'dimension': dimension,
+            'future': future,
+        }
+    
+    def _take_speculation(self, message, asynchronous=False):
+        """
+        Claim the draft for this turn, starting one alongside the analysis when none is pending.
+        
+        Returns:
+            dict or None: The speculation, or None when the next question will not be generated
+        """
+        with self._speculation_lock:
+            speculation, self._speculation = self._speculation, None
+        if speculation is not None and speculation['turn'] == len(self.conversation_context):
+            return speculation
+        if speculation is not None:
+            speculation['future'].cancel()
+        if not self._will_generate_question():
+            return None
+        return self._speculate(self.current_question, message, asynchronous)
+    
+    @traced()
+    def _use_speculation(self, speculation, on_token=None):
+        """
+        Return the drafted question if it still targets the least certain dimension.
+        
+        Args:
+            speculation (dict or None): Draft claimed for this turn
+            on_token (callable, optional): Receives the question at once when the draft is used
+        
+        Returns:
+            str or None: The question, or None if it has to be generated afresh
+        """
+        if not self._speculation_matches(speculation):
+            return None
+        try:
+            question = speculation['future'].result(timeout=self._draft_timeout()).strip()
+        except GatewayBusy:
+            raise
+        except Exception as e:
+            print(f"Error drafting next question: {e!r}")
+            return None
+        return self._drafted_question(question, on_token)
+    
+    @traced()
+    async def _ause_speculation(self, speculation, on_token=None):
+        """Async twin of _use_speculation; accepts drafts from the report pool as well."""
+        if not self._speculation_matches(speculation):
+            return None
+        future = speculation['future']
+        if not asyncio.isfuture(future):
+            future = asyncio.wrap_future(future)
+        try:
+            question = (await asyncio.wait_for(future, self._draft_timeout())).strip()
+        except GatewayBusy:
+            raise
+        except Exception as e:
+            print(f"Error drafting next question: {e!r}")
+            return None
+        return self._drafted_question(question, on_token)
+    
+    def _draft_timeout(self):
+        """Seconds to wait for a drafted question, within the turn's deadline."""
+        remaining = time_left()
+        if remaining is None:
+            return self.resources.report_section_timeout
+        return max(0, min(self.resources.report_section_timeout, remaining))
     
+    def _speculation_matches(self, speculation):
+        """Whether a draft exists and still targets the least certain dimension; cancels it if not."""
+        if speculation is None:
+            return False
+        if speculation['dimension'] != self.scorer.most_uncertain():
+            speculation['future'].cancel()
+            annotate(used=False)
+            return False
+        return True
+    
+    def _drafted_question(self, question, on_token):
+        """Hand a finished draft to the listener and return it, or None if it came back empty."""
+        if question and on_token is not None:
+            on_token('question', question)
+        annotate(used=bool(question))
+        return question or None
+    
+    @traced()
     def _update_dimension_coverage(self, analysis):
         """Update dimension coverage based on response analysis."""
+        self._add_coverage(self.dimension_coverage, analysis)
+    
+    @staticmethod
+    def _add_coverage(coverage, analysis):
+        """Add the confidence of an analysis to a dimension coverage dict in place."""
         if not analysis or 'dimension_analysis' not in analysis:
             return
             
         for dimension, data in analysis['dimension_analysis'].items():
+            if dimension not in coverage:
+                continue
             confidence = data.get('confidence', 0)
             # Update coverage score with diminishing returns
-            current_coverage = self.dimension_coverage[dimension]
-            self.dimension_coverage[dimension] = min(1.0, current_coverage + (confidence * (1 - current_coverage)))
+            current_coverage = coverage[dimension]
+            coverage[dimension] = min(1.0, current_coverage + (confidence * (1 - current_coverage)))
     
     def _should_complete_test(self):
         """Determine if we have enough information to complete the test."""
-        # Check if we have at least 8 responses
-        if len(self.conversation_context) < 8:
+        return self._completes(len(self.conversation_context), self.scorer, self.dimension_coverage)
+    
+    def _completes(self, answers, scorer, coverage):
+        """Whether this many answers, with this evidence and coverage, complete the test."""
+        if answers < self.min_responses:
             return False
-            
-        # Check if we have good coverage of all dimensions
-        return all(score >= 0.8 for score in self.dimension_coverage.values())
+        
+        # Stop as soon as every preference pair is decided
+        if scorer.is_decisive():
+            return True
+        
+        # Otherwise fall back to at least 8 responses with good coverage of all dimensions
+        if answers < 8:
+            return False
+        return all(score >= 0.8 for score in coverage.values())
+    
+    def _question_focus(self, dimension=None):
+        """Describe a dimension, by default the least certain one, for the next question to explore."""
+        dimension = dimension or self.scorer.most_uncertain()
+        descriptions = self.dimension_descriptions[dimension]
+        return f"{dimension} ({' vs. '.join(descriptions.values())})"
+    
+    def _predict(self, prompt, callbacks=None, site=None, template=None):
+        """Send a standalone prompt to the LLM; conversation history travels inside the prompt."""
+        return self.gateway.predict(
+            prompt,
+            callbacks=callbacks,
+            site=site,
+            template=template
+        )
+    
+    async def _apredict(self, prompt, callbacks=None, site=None, template=None):
+        """Async twin of _predict."""
+        return await self.gateway.apredict(
+            prompt,
+            callbacks=callbacks,
+            site=site,
+            template=template
+        )
     
     def _format_conversation_history(self):
-        """Format conversation history for LLM prompts."""
-        history = []
-        for entry in self.conversation_context[-5:]:  # Last 5 interactions
-            history.append(f"Q: {entry.get('question', 'Unknown question')}")
-            history.append(f"A: {entry.get('response', 'No response')}")
-        return "\n".join(history)
+        """Format conversation history for LLM prompts, within the memory token budget."""
+        return self.memory.render()
     
     def _update_conversation_context(self, response, analysis):
         """Update conversation context with new response and analysis."""
@@ -256,128 +893,149 @@ class MBTIAnalyzer:
             'analysis': analysis,
             'timestamp': time.time()
         })
+        self.memory.add_turn(self.current_question, response)
+        self.scorer.update(analysis)
     
     def _calculate_mbti_result(self):
-        """Calculate MBTI result based on accumulated conversation analysis."""
-        preferences = {
-            'E': 0, 'I': 0,
-            'S': 0, 'N': 0,
-            'T': 0, 'F': 0,
-            'J': 0, 'P': 0
-        }
-        
-        # Analyze all responses to determine preferences
-        for entry in self.conversation_context:
-            analysis = entry.get('analysis', {})
-            if 'dimension_analysis' in analysis:
-                for dimension, data in analysis['dimension_analysis'].items():
-                    if 'preference' in data and 'confidence' in data:
-                        pref = data['preference']
-                        conf = data['confidence']
-                        preferences[pref] += conf
-        
-        # Determine final type
-        result = ""
-        result += "E" if preferences['E'] > preferences['I'] else "I"
-        result += "S" if preferences['S'] > preferences['N'] else "N"
-        result += "T" if preferences['T'] > preferences['F'] else "F"
-        result += "J" if preferences['J'] > preferences['P'] else "P"
-        
-        self.mbti_result = result
+        """Set the MBTI result from the evidence accumulated by the scorer."""
+        self.mbti_result = self.scorer.result()
     
-    def _generate_result_message(self):
-        """Generate a detailed result message with explanation and recommendations."""
-        mbti_descriptions = {
-            "ISTJ": "The Inspector: Practical, fact-minded, and reliable. You value loyalty, hard work, and tradition.",
-            "ISFJ": "The Protector: Quiet, caring, and dependable. You're committed to fulfilling your duties and responsibilities.",
-            "INFJ": "The Counselor: Insightful, principled, and idealistic. You seek meaning and connection in relationships and work.",
-            "INTJ": "The Mastermind: Strategic, innovative, and independent. You have a clear vision and drive for improvement.",
-            "ISTP": "The Craftsman: Practical, analytical, and adaptable. You're skilled at understanding how things work.",
-            "ISFP": "The Composer: Gentle, sensitive, and artistic. You value personal freedom and expressing yourself authentically.",
-            "INFP": "The Healer: Idealistic, empathetic, and creative. You're driven by your personal values and desire to help others.",
-            "INTP": "The Architect: Logical, curious, and theoretical. You enjoy abstract thinking and solving complex problems.",
-            "ESTP": "The Dynamo: Energetic, pragmatic, and spontaneous. You thrive in dynamic situations and enjoy taking risks.",
-            "ESFP": "The Performer: Outgoing, friendly, and enthusiastic. You live in the moment and bring fun to any situation.",
-            "ENFP": "The Champion: Imaginative, enthusiastic, and compassionate. You're inspired by possibilities and what could be.",
-            "ENTP": "The Visionary: Innovative, resourceful, and intellectually curious. You enjoy theoretical discussions and debates.",
-            "ESTJ": "The Supervisor: Organized, practical, and decisive. You value structure, clarity, and following procedures.",
-            "ESFJ": "The Provider: Warm, cooperative, and reliable. You're attuned to others' needs and seek to create harmony.",
-            "ENFJ": "The Teacher: Charismatic, empathetic, and inspiring. You help others develop and grow to their full potential.",
-            "ENTJ": "The Commander: Strategic, ambitious, and assertive. You're driven to lead and implement your vision."
-        }
+    def _generate_personal_insights(self, callbacks=None):
+        """Generate personalized insights based on the conversation."""
+        return self._predict(self._insights_prompt(), callbacks, site='insights', template=INSIGHTS_PROMPT)
+    
+    async def _agenerate_personal_insights(self, callbacks=None):
+        """Async twin of _generate_personal_insights."""
+        return await self._apredict(self._insights_prompt(), callbacks, site='insights', template=INSIGHTS_PROMPT)
+    
+    def _insights_prompt(self):
+        """Build the prompt for the personal insights section."""
+        return INSIGHTS_PROMPT.format(history=self._format_conversation_history(), mbti_type=self.mbti_result)
+    
+    def _section_task(self, name):
+        """Return a function generating one report section from a callbacks list."""
+        if name == 'insights':
+            return lambda callbacks: self._generate_personal_insights(callbacks=callbacks)
+        if name == 'roast':
+            return lambda callbacks: self.conversation_roaster.generate_roast(
+                self.mbti_result, self._format_conversation_history(), callbacks=callbacks)
+        if name == 'recommendations':
+            return lambda callbacks: self.recommendation_generator.generate_recommendations(
+                self.mbti_result, callbacks=callbacks)
+        if name == 'celebrities':
+            return lambda callbacks: self.celebrity.find_doppelgangers(
+                self.mbti_result, callbacks=callbacks)
+        if name == 'relationship':
+            return lambda callbacks: self.relationship.generate_relationship_insights(
+                self.mbti_result, self._format_conversation_history(), callbacks=callbacks)
+        if name == 'career':
+            return lambda callbacks: self.career.generate_career_insights(
+                self.mbti_result, self._format_conversation_history(), callbacks=callbacks)
+        raise ValueError(f"Unknown report section: {name}")
+    
+    def _asection_task(self, name):
+        """Async twin of _section_task: the function returns a coroutine."""
+        if name == 'insights':
+            return lambda callbacks: self._agenerate_personal_insights(callbacks=callbacks)
+        if name == 'roast':
+            return lambda callbacks: self.conversation_roaster.agenerate_roast(
+                self.mbti_result, self._format_conversation_history(), callbacks=callbacks)
+        if name == 'recommendations':
+            return lambda callbacks: self.recommendation_generator.agenerate_recommendations(
+                self.mbti_result, callbacks=callbacks)
+        if name == 'celebrities':
+            return lambda callbacks: self.celebrity.afind_doppelgangers(
+                self.mbti_result, callbacks=callbacks)
+        if name == 'relationship':
+            return lambda callbacks: self.relationship.agenerate_relationship_insights(
+                self.mbti_result, self._format_conversation_history(), callbacks=callbacks)
+        if name == 'career':
+            return lambda callbacks: self.career.agenerate_career_insights(
+                self.mbti_result, self._format_conversation_history(), callbacks=callbacks)
+        raise ValueError(f"Unknown report section: {name}")
+    
+    def section_producer(self, name):
+        """
+        Return a function that generates one report section of a completed test.
         
-        # Get base description
-        description = mbti_descriptions.get(self.mbti_result, "Unknown personality type")
+        The state a section depends on does not change once the test is complete, so
+        the function can run without holding the session. It runs the section on the
+        shared report pool and replaces it by its fallback text when it fails or misses
+        the timeout.
         
-        # Generate personalized recommendations
-        recommendations = self.recommendation_generator.generate_recommendations(self.mbti_result)
-
-        # Generate personalized recommendations
-        celeb_recommendations = self.celebrity.find_doppelgangers(self.mbti_result)
-
-
-
-        #Career insights
-        career_insights = self.career.generate_career_insights(
-            self.mbti_result, 
-            self.conversation
-        )
-
-        #generate personalized roast
-        user_roast = self.conversation_roaster.generate_roast(self.mbti_result, self.conversation) 
-
-        #Generate relationship overview
-        relationship_insights = self.relationship.generate_relationship_insights(
-            self.mbti_result, 
-            self.conversation
-        )
-
+        Args:
+            name (str): One of report_section_names
         
-        # Generate personalized insights based on conversation
-        insights_prompt = f"""
-        Based on this conversation history:
-        {self._format_conversation_history()}
+        Returns:
+            callable: Takes an optional on_token callback and returns (text, True if generated)
+        """
+        if not self.test_complete:
+            raise ValueError("The test is not complete yet")
+        task = self._section_task(name)
         
-        And the determined MBTI type of {self.mbti_result},
-        generate 3-4 personalized insights about the person's:
-        1. Communication style
-        2. Decision-making approach
-        3. Energy management
-        4. Personal values
+        def produce(on_token=None):
+            future = submit(self.resources.report_executor, task, stream_callbacks(on_token, name))
+            try:
+                return future.result(timeout=self.resources.report_section_timeout), True
+            except Exception as e:
+                future.cancel()
+                print(f"Error generating {name} section: {e!r}")
+                return self.report_fallbacks[name], False
         
-        Keep the insights specific to what was discussed in the conversation.
-        Format each insight as a bullet point.
+        return produce
+    
+    def generate_section(self, name, on_token=None):
         """
+        Return a report section, generating it on the first request.
         
-        personal_insights = self.conversation.predict(input=insights_prompt)
+        Generated sections are kept in the session state; fallback texts are not, so a
+        failed section is retried on the next request.
         
-        # Combine all components
-        result_message = f"""
-        🎉 Your MBTI Personality Type: {self.mbti_result}
-
-        {description}
-
-        📝 Overview
-        {personal_insights}
-
-        🔥 Roast
-        {user_roast}
-
-        🎯 I've also prepared some personalized recommendations just for you:
-
-        {recommendations}
-
-        Who are your celebrity doppelgangers?
-
-        {celeb_recommendations}
-
-        Relationship
-        {relationship_insights}
-
-        Career insights
-        {career_insights}
-
-        Remember, these insights and recommendations are suggestions based on our conversation and your personality type. Feel free to explore and discover what resonates with you personally!
+        Args:
+            name (str): One of report_section_names
+            on_token (callable, optional): Receives the section's tokens as they stream
+        
+        Returns:
+            str: The section text
         """
+        if name in self.report_sections:
+            return self.report_sections[name]
+        text, generated = self.section_producer(name)(on_token)
+        if generated:
+            self.report_sections[name] = text
+        return text
+    
+    def asection_producer(self, name):
+        """Async twin of section_producer: the function it returns is a coroutine function."""
+        if not self.test_complete:
+            raise ValueError("The test is not complete yet")
+        task = self._asection_task(name)
+        
+        async def produce(on_token=None):
+            try:
+                text = await asyncio.wait_for(task(stream_callbacks(on_token, name)), self.resources.report_section_timeout)
+                return text, True
+            except Exception as e:
+                print(f"Error generating {name} section: {e!r}")
+                return self.report_fallbacks[name], False
         
-        return result_message 
\ No newline at end of file
+        return produce
+    
+    async def agenerate_section(self, name, on_token=None):
+        """Async twin of generate_section."""
+        if name in self.report_sections:
+            return self.report_sections[name]
+        text, generated = await self.asection_producer(name)(on_token)
+        if generated:
+            self.report_sections[name] = text
+        return text
+    
+    def _generate_result_message(self):
+        """Build the completion message; the report sections are generated when the client asks for them."""
+        description = self.mbti_descriptions.get(self.mbti_result, "Unknown personality type")
+        return (
+            f"🎉 Your MBTI Personality Type: {self.mbti_result}\n\n"
+            f"{description}\n\n"
+            "Open the sections below to explore your personalized overview, roast, recommendations, "
+            "celebrity doppelgangers, relationship and career insights."
+        ) 
\ No newline at end of file
@@ -0,0 +1,112 @@
+import os
+import threading
+from .llm_gateway import submit_background
+from .metrics import estimate_tokens
+from .prompts import SUMMARY_PROMPT
+
+class BoundedConversationMemory:
+    def __init__(self, llm, executor=None, max_tokens=None, summary_tokens=None):
+        """
+        Token-budgeted memory of the user's question/answer pairs.
+
+        Only the conversation itself is remembered, never the analysis or question
+        generation prompts. When the pairs outgrow the budget, the oldest ones are folded
+        into a running summary by a short LLM call. That call runs on the executor when
+        one is given. Until it finishes, the oldest pairs are simply left out, so the
+        rendered history never exceeds the budget.
+
+        Args:
+            llm: LLM gateway used to summarize older turns
+            executor (Executor, optional): Pool for background summarization
+            max_tokens (int, optional): Budget for the rendered history. Defaults to MBTI_MEMORY_TOKENS or 600.
+            summary_tokens (int, optional): Budget for the running summary. Defaults to a third of max_tokens.
+        """
+        self.llm = llm
+        self.executor = executor
+        self.max_tokens = max_tokens or int(os.environ.get("MBTI_MEMORY_TOKENS", 600))
+        self.summary_tokens = summary_tokens or self.max_tokens // 3
+
+        self.summary = ""
+        self.turns = []
+
+        self._lock = threading.Lock()
+        self._compacting = False
+
+    def add_turn(self, question, answer):
+        """Remember a question and the user's answer, summarizing older turns when over budget."""
+        with self._lock:
+            self.turns.append((question or "Unknown question", answer or "No response"))
+            if self._compacting or self._turns_tokens() + estimate_tokens(self.summary) <= self.max_tokens:
+                return
+            self._compacting = True
+
+        if self.executor is not None:
+            submit_background(self.executor, self._compact)
+        else:
+            self._compact()
+
+    def render(self):
+        """Return the summary and as many recent turns as fit in the token budget."""
+        with self._lock:
+            budget = self.max_tokens
+            lines = []
+            if self.summary:
+                lines.append(f"Summary of earlier conversation: {self.summary}")
+                budget -= estimate_tokens(lines[0])
+
+            recent = []
+            for question, answer in reversed(self.turns):
+                pair = f"Q: {question}\nA: {answer}"
+                cost = estimate_tokens(pair)
+                if cost > budget and recent:
+                    break
+                recent.append(pair)
+                budget -= cost
+
+            lines.extend(reversed(recent))
+            return "\n".join(lines)
+
+    def to_state(self):
+        """Return the remembered conversation as a JSON-serializable dict."""
+        with self._lock:
+            return {'summary': self.summary, 'turns': [list(turn) for turn in self.turns]}
+
+    def load_state(self, state):
+        """Restore the conversation from a dict produced by to_state."""
+        with self._lock:
+            self.summary = state.get('summary', "")
+            self.turns = [tuple(turn) for turn in state.get('turns', [])]
+
+    def clear(self):
+        """Forget the whole conversation."""
+        with self._lock:
+            self.summary = ""
+            self.turns = []
+
+    def _turns_tokens(self):
+        return sum(estimate_tokens(f"Q: {q}\nA: {a}") for q, a in self.turns)
+
+    def _compact(self):
+        """Fold the older half of the remembered turns into the running summary."""
+        try:
+            with self._lock:
+                folded = self.turns[:max(1, len(self.turns) // 2)]
+                summary = self.summary
+
+            transcript = "\n".join(f"Q: {q}\nA: {a}" for q, a in folded)
+            summary_prompt = SUMMARY_PROMPT.format(
+                words=self.summary_tokens * 3 // 4,
+                summary=summary or "None",
+                transcript=transcript
+            )
+            new_summary = self.llm.predict(summary_prompt, site='summary', template=SUMMARY_PROMPT).strip()
+
+            with self._lock:
+                # Hard cap in case the model ignored the length limit
+                self.summary = new_summary[:self.summary_tokens * 4]
+                self.turns = self.turns[len(folded):]
+        except Exception as e:
+            print(f"Error summarizing conversation memory: {e!r}")
+        finally:
+            with self._lock:
+                self._compacting = False
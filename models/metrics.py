@@ -0,0 +1,163 @@
+import threading
+
+# Latency buckets in seconds, from a cached reply to a slow report section
+DEFAULT_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def estimate_tokens(text):
+    """Roughly estimate the number of tokens in a text (about four characters per token)."""
+    return len(text) // 4 + 1
+
+def escape(value):
+    """Escape a label value for the Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names, values, extra=None):
+    """Render a label set as {a="1",b="2"}."""
+    pairs = list(zip(names, values)) + list(extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Registry:
+    def __init__(self):
+        """Collection of metrics rendered together for the /metrics endpoint."""
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def register(self, metric):
+        """Add a metric, or return the one already registered under its name."""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=(), registry=REGISTRY):
+        """
+        Base of the metric types; values are kept per combination of label values.
+
+        Args:
+            name (str): Metric name, e.g. "mbti_llm_calls_total"
+            help (str): One-line description
+            labels (tuple): Label names every sample is recorded with
+            registry (Registry, optional): Where the metric is exposed
+        """
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name) or "other") for name in self.labels)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        """Add to the counter for a label set."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{format_labels(self.labels, key)} {format_value(value)}" for key, value in items]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        """Distribution of observed values in cumulative buckets, with their sum and count."""
+        super().__init__(name, help, labels, registry)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        """Record one value for a label set."""
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                labels = format_labels(self.labels, key, [("le", format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {count}")
+        return lines
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help, function, registry=REGISTRY):
+        """A value read from a function each time the metrics are rendered."""
+        super().__init__(name, help, (), registry)
+        self.function = function
+
+    def samples(self):
+        try:
+            value = self.function()
+        except Exception as e:
+            print(f"Error reading gauge {self.name}: {e!r}")
+            return []
+        return [f"{self.name} {format_value(value)}"]
+
+# Every LLM call made through the gateway, by call site
+LLM_CALL_SECONDS = Histogram(
+    "mbti_llm_call_seconds", "Latency of LLM requests that reached the model", ("site", "model"))
+LLM_TOKENS = Counter(
+    "mbti_llm_tokens_total", "Estimated prompt and completion tokens of LLM requests", ("site", "kind"))
+LLM_CACHE = Counter(
+    "mbti_llm_cache_total", "LLM calls by how the response cache served them (hit, miss, shared, bypass)",
+    ("site", "result"))
+LLM_RETRIES = Counter("mbti_llm_retries_total", "LLM requests retried after a transient error", ("site",))
+LLM_ERRORS = Counter("mbti_llm_errors_total", "LLM calls that failed, by error type", ("site", "error"))
+LLM_HEDGES = Counter(
+    "mbti_llm_hedges_total", "Duplicate requests sent for LLM calls slower than their p95, by which request won",
+    ("site", "winner"))
+
+# Turns answered without the LLM because their deadline ran out
+TURN_FALLBACKS = Counter("mbti_turn_fallbacks_total", "Turn steps served locally after the deadline ran out", ("step",))
+
+# Voice processing
+TTS_SECONDS = Histogram("mbti_tts_seconds", "Time to synthesize speech for a response")
+STT_SECONDS = Histogram("mbti_stt_seconds", "Time to transcribe an utterance", ("kind",))
@@ -0,0 +1,205 @@
+import os
+import threading
+import time
+from collections import deque
+
+# Settings per call site, on top of the "default" route. Per-turn calls are short and
+# need to be fast; report prose is longer and may take its time. The default model is
+# already the cheapest chat model, so no fallback is set: falling back on an SLO breach
+# is opt-in, e.g. MBTI_ROUTE_DEFAULT="fallback=<faster model>" for every site with an SLO.
+DEFAULT_ROUTES = {
+    'default': {'model': "gpt-3.5-turbo", 'temperature': 0.7, 'max_tokens': None, 'timeout': 30, 'slo': None, 'fallback': None},
+    'analysis': {'max_tokens': 400, 'timeout': 15, 'slo': 4},
+    'turn': {'max_tokens': 500, 'timeout': 15, 'slo': 5},
+    'question': {'max_tokens': 120, 'timeout': 10, 'slo': 3},
+    'repair': {'temperature': 0, 'max_tokens': 400, 'timeout': 15},
+    'summary': {'max_tokens': 300, 'timeout': 20},
+    'insights': {'max_tokens': 600, 'timeout': 45},
+    'roast': {'temperature': 0.8, 'max_tokens': 300, 'timeout': 45},
+    'recommendations': {'max_tokens': 700, 'timeout': 45},
+    'celebrities': {'max_tokens': 500, 'timeout': 45},
+    'relationship': {'max_tokens': 500, 'timeout': 45},
+    'career': {'max_tokens': 500, 'timeout': 45},
+}
+
+# Conversions for the settings accepted in a route spec
+ROUTE_FIELDS = {
+    'model': str,
+    'temperature': float,
+    'max_tokens': int,
+    'timeout': float,
+    'slo': float,
+    'fallback': str,
+}
+
+def parse_route(spec):
+    """
+    Parse a route spec such as "model=gpt-4,max_tokens=300,slo=2.5,fallback=gpt-3.5-turbo".
+
+    Args:
+        spec (str): Comma-separated key=value settings; "none" clears a setting
+
+    Returns:
+        dict: The settings it contains
+
+    Raises:
+        ValueError: If a key is unknown or a value has the wrong type
+    """
+    settings = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        key, _, value = item.partition("=")
+        key, value = key.strip(), value.strip()
+        if key not in ROUTE_FIELDS:
+            raise ValueError(f"Unknown route setting: {key}")
+        settings[key] = None if value.lower() in ("", "none") else ROUTE_FIELDS[key](value)
+    return settings
+
+class Route:
+    def __init__(self, site, model, temperature, max_tokens=None, timeout=None, slo=None, fallback=None):
+        """
+        Model settings for one call site.
+
+        Args:
+            site (str): Call site name, e.g. "analysis" or "career"
+            model (str): Model to call
+            temperature (float): Sampling temperature
+            max_tokens (int, optional): Longest reply to generate
+            timeout (float, optional): Seconds before a request is abandoned
+            slo (float, optional): Latency target in seconds for the slow calls (p90) of the site
+            fallback (str, optional): Model to use while the SLO is breached
+        """
+        self.site = site
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.slo = slo
+        self.fallback = fallback
+
+    def degraded(self):
+        """Return the same route on the fallback model."""
+        return Route(self.site, self.fallback, self.temperature, self.max_tokens, self.timeout)
+
+class ModelRouter:
+    def __init__(self, routes=None, window=None, min_samples=None, cooldown=None):
+        """
+        Pick the model and request settings for each LLM call site.
+
+        Every site starts from DEFAULT_ROUTES. A route can be overridden with the
+        MBTI_ROUTE_<SITE> variable, e.g. MBTI_ROUTE_ANALYSIS="model=gpt-4,slo=3". Use
+        MBTI_ROUTE_DEFAULT for settings shared by all sites. The router keeps the
+        latency of recent calls per site, which the gateway also uses to decide when to
+        hedge a slow call. For sites with an SLO and a fallback model, once the p90 of
+        recent calls goes over the SLO, the site is moved to its fallback for a
+        cooldown period, then tried on its own model again.
+
+        Args:
+            routes (dict, optional): Site -> settings, applied over the defaults and environment
+            window (int, optional): Recent calls per site the p90 is taken over.
+                Defaults to MBTI_ROUTE_WINDOW or 20.
+            min_samples (int, optional): Calls needed before the SLO is judged.
+                Defaults to MBTI_ROUTE_MIN_SAMPLES or 5.
+            cooldown (float, optional): Seconds a site stays on its fallback.
+                Defaults to MBTI_ROUTE_COOLDOWN or 60.
+        """
+        self.window = window or int(os.environ.get("MBTI_ROUTE_WINDOW", 20))
+        self.min_samples = min_samples or int(os.environ.get("MBTI_ROUTE_MIN_SAMPLES", 5))
+        self.cooldown = cooldown or float(os.environ.get("MBTI_ROUTE_COOLDOWN", 60))
+
+        default = dict(DEFAULT_ROUTES['default'])
+        default.update(parse_route(os.environ.get("MBTI_ROUTE_DEFAULT", "")))
+        default.update((routes or {}).get('default', {}))
+
+        self.routes = {}
+        self.default = Route('default', **default)
+        sites = (set(DEFAULT_ROUTES) | set(routes or {})) - {'default'}
+        for site in sites:
+            settings = dict(default)
+            settings.update(DEFAULT_ROUTES.get(site, {}))
+            settings.update(parse_route(os.environ.get(f"MBTI_ROUTE_{site.upper()}", "")))
+            settings.update((routes or {}).get(site, {}))
+            self.routes[site] = Route(site, **settings)
+
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._degraded_until = {}
+        self.fallbacks = 0
+
+    def select(self, site=None):
+        """Return the route to use for a call from a site right now."""
+        route = self.routes.get(site, self.default)
+        if not route.fallback:
+            return route
+        with self._lock:
+            until = self._degraded_until.get(route.site)
+            if until is None:
+                return route
+            if time.monotonic() < until:
+                self.fallbacks += 1
+                return route.degraded()
+            # Cooldown over: judge the primary model on fresh calls
+            del self._degraded_until[route.site]
+            self._latencies.pop(route.site, None)
+        return route
+
+    def observe(self, site, model, seconds):
+        """
+        Record how long a call took, switching the site to its fallback when it breaches its SLO.
+
+        Args:
+            site (str): Call site of the call
+            model (str): Model the call went to; calls to the fallback are not judged
+            seconds (float): Latency of the call, or its timeout if it timed out
+        """
+        route = self.routes.get(site, self.default)
+        if model != route.model:
+            return
+        with self._lock:
+            latencies = self._latencies.get(route.site)
+            if latencies is None:
+                latencies = self._latencies[route.site] = deque(maxlen=self.window)
+            latencies.append(seconds)
+            if not route.slo or not route.fallback or len(latencies) < self.min_samples:
+                return
+            p90 = self._percentile(latencies, 0.9)
+            if p90 > route.slo and route.site not in self._degraded_until:
+                print(f"{route.site} calls breach their {route.slo}s SLO (p90 {p90:.2f}s), "
+                      f"using {route.fallback} for {self.cooldown:.0f}s")
+                self._degraded_until[route.site] = time.monotonic() + self.cooldown
+
+    def percentile(self, site, q):
+        """
+        Latency of a site's recent calls at quantile q, e.g. 0.95 for the p95.
+
+        Returns:
+            float or None: None until the site has made min_samples calls
+        """
+        route = self.routes.get(site, self.default)
+        with self._lock:
+            latencies = self._latencies.get(route.site)
+            if latencies is None or len(latencies) < self.min_samples:
+                return None
+            return self._percentile(latencies, q)
+
+    @staticmethod
+    def _percentile(latencies, q):
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    def stats(self):
+        """Model in use and recent p90 latency per site."""
+        now = time.monotonic()
+        with self._lock:
+            stats = {}
+            for site, route in sorted(self.routes.items()):
+                latencies = self._latencies.get(site)
+                degraded = self._degraded_until.get(site, 0) > now
+                stats[site] = {
+                    'model': route.fallback if degraded else route.model,
+                    'degraded': degraded,
+                    'p90': self._percentile(latencies, 0.9) if latencies else None,
+                    'p95': self._percentile(latencies, 0.95) if latencies else None,
+                }
+            return stats
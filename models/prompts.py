@@ -0,0 +1,339 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from .analysis_parser import ANALYSIS_SCHEMA
+from .metrics import estimate_tokens
+
+# Line separating the analysis from the next question in a combined turn reply
+QUESTION_MARKER = "NEXT QUESTION:"
+
+class Prompt:
+    def __init__(self, name, prefix, suffix):
+        """
+        A prompt template laid out for provider-side prefix caching.
+
+        The prefix holds the instructions and output format and is the same on every
+        call, so providers that cache shared prompt prefixes can reuse it. Everything
+        that varies between calls goes into the suffix, with the parts that change
+        least often (e.g. the conversation history) first.
+
+        Args:
+            name (str): Registry name, usually the call site
+            prefix (str): Static leading text; not formatted, so it may contain braces
+            suffix (str): Trailing text with str.format placeholders, e.g. {history}
+        """
+        self.name = name
+        self.prefix = prefix
+        self.suffix = suffix
+        self.template = prefix + suffix
+        # Changes whenever the wording does, so cached replies of an old wording are not reused
+        self.version = f"{name}-{hashlib.sha1(self.template.encode()).hexdigest()[:10]}"
+
+    def format(self, **values):
+        """Return the prompt text for the given values of the suffix placeholders."""
+        return self.prefix + self.suffix.format(**values)
+
+# Every prompt the application sends, by name
+PROMPTS = {}
+
+def register(name, prefix, suffix):
+    """Add a prompt to the registry and return it."""
+    if name in PROMPTS:
+        raise ValueError(f"Prompt already registered: {name}")
+    prompt = PROMPTS[name] = Prompt(name, prefix, suffix)
+    return prompt
+
+def get_prompt(name):
+    """Return a registered prompt by name."""
+    return PROMPTS[name]
+
+ANALYSIS_STEPS = """For each MBTI dimension pair (E-I, S-N, T-F, J-P):
+1. Identify relevant indicators
+2. Assess confidence level (0-1)
+3. Extract key themes or patterns
+4. Determine which preference is stronger
+"""
+
+QUESTION_GUIDELINES = """1. Feels like a natural continuation of the conversation
+2. Helps gather information about the dimension to explore given below
+3. References previous answers when relevant
+4. Maintains a conversational, friendly tone
+
+The question should:
+- Not feel like a test question
+- Be open-ended
+- Encourage detailed responses
+- Flow naturally from the previous response
+- Not directly ask about personality preferences
+"""
+
+ANALYSIS_PROMPT = register("analysis", f"""Analyze the current response below in the context of MBTI dimensions.
+
+{ANALYSIS_STEPS}
+Format the response as JSON with the following structure:
+{ANALYSIS_SCHEMA}
+
+""", """Previous context: {history}
+Current question: "{question}"
+Current response: "{response}"
+""")
+
+TURN_PROMPT = register("turn", f"""First, analyze the current response below in the context of MBTI dimensions.
+{ANALYSIS_STEPS}
+Format the analysis as JSON with the following structure:
+{ANALYSIS_SCHEMA}
+
+Then write the line "{QUESTION_MARKER}" followed by a natural follow-up question that:
+{QUESTION_GUIDELINES}
+Output only the JSON, the marker line and the question text.
+
+""", """Previous context: {history}
+Current question: "{question}"
+Current response: "{response}"
+
+Current dimension coverage:
+{coverage}
+
+Dimension to explore: {focus}
+""")
+
+QUESTION_PROMPT = register("question", f"""Generate a natural follow-up question to the conversation below that:
+{QUESTION_GUIDELINES}
+Return only the question text, without any additional context or explanation.
+
+""", """Conversation history:
+{history}
+
+Current dimension coverage:
+{coverage}
+
+Dimension to explore: {focus}
+""")
+
+REPAIR_PROMPT = register("repair", f"""The text below was meant to be an MBTI dimension analysis but is not valid JSON.
+Rewrite it without changing its content.
+
+Format the response as JSON with the following structure:
+{ANALYSIS_SCHEMA}
+
+Output only the JSON.
+
+""", """Text:
+{text}
+""")
+
+INSIGHTS_PROMPT = register("insights", """Generate 3-4 personalized insights about the person in the conversation below, given their MBTI type:
+1. Communication style
+2. Decision-making approach
+3. Energy management
+4. Personal values
+
+Keep the insights specific to what was discussed in the conversation.
+Format each insight as a bullet point.
+
+""", """Conversation history:
+{history}
+
+MBTI type: {mbti_type}
+""")
+
+SUMMARY_PROMPT = register("summary", """Update the summary of a personality test conversation with the new turns below.
+Keep what the person said about how they gain energy, take in information,
+make decisions and organize their life. Stay within the word limit given below.
+Return only the updated summary.
+
+""", """Word limit: {words}
+
+Current summary: {summary}
+
+New turns:
+{transcript}
+""")
+
+ROAST_PROMPT = register("roast", """Create a witty, good-humored roast that playfully highlights the stereotypical quirks of the MBTI personality type given below.
+
+Use the conversation details below for personalization.
+
+Guidelines for the roast:
+- Keep it light-hearted and funny, not mean-spirited
+- Use clever wordplay and observational humor
+- Highlight the unique personality traits in a humorous way
+- Make it sound like a friendly, teasing joke a close friend might make
+- Aim for maximum comedic effect while maintaining respect
+
+Roast Format:
+A punchy, 3-4 sentence roast that captures the essence of the type with humor and warmth.
+
+""", """MBTI type: {mbti_type}
+Conversation Context: {conversation_context}
+""")
+
+RECOMMENDATIONS_PROMPT = register("recommendations", """For the MBTI personality type given below, provide 3 highly tailored recommendations in each category:
+
+Music:
+- Recommend 3 artists/songs that perfectly match the personality's traits
+- Provide a brief, compelling 1-sentence description for each recommendation
+
+Books:
+- Suggest 3 books that would deeply resonate with this personality type
+- Include a concise, intriguing description for each book recommendation
+
+Movies:
+- Select 3 films that capture the essence of this personality type
+- Write a short, vivid description highlighting why each movie would appeal to them
+
+Ensure recommendations are specific, engaging, and reflect the unique characteristics of the type.
+Use an enthusiastic and personalized tone.
+
+""", """MBTI type: {mbti_type}
+Traits: {traits}
+""")
+
+CELEBRITIES_PROMPT = register("celebrities", """For the MBTI personality type given below, identify 3 celebrity doppelgangers that embody its characteristic traits:
+
+- Select celebrities who authentically represent the core traits of the type
+- Provide a brief, insightful description that captures their personality essence
+- Highlight specific qualities that make them a quintessential match for this personality type
+
+Ensure the descriptions are nuanced, perceptive, and reveal the unique personality dimensions of each celebrity.
+Use a thoughtful and descriptive tone that goes beyond surface-level observations.
+
+""", """MBTI type: {mbti_type}
+Traits: {traits}
+""")
+
+RELATIONSHIP_PROMPT = register("relationship", """Generate brief relationship insights not more than 5 sentences for the MBTI personality type given below.
+
+Context: Provide a nuanced overview of how individuals with the given traits approach relationships,
+emotional connections, and personal interactions. Consider their core personality
+characteristics and how these manifest in romantic, professional, and personal relationships.
+
+Output Format:
+1. A brief paragraph exploring relationship dynamics
+2. A list of key relationship strengths
+3. A list of potential relationship challenges
+
+Focus on:
+- Brief overview of relationship approach
+- Top 3 relationship strengths
+- Top 3 relationship challenges
+
+Tone: Insightful, empathetic, and constructive
+
+""", """MBTI type: {mbti_type}
+Traits: {traits}
+""")
+
+CAREER_PROMPT = register("career", """Generate brief career insights for the MBTI personality type given below.
+
+Provide a shallow dive into career dynamics, work preferences, professional strengths,
+and potential growth areas for individuals with the given traits.
+
+Explore the following aspects:
+- Professional environment preferences
+- Ideal work settings and cultures
+- Motivational triggers
+- Potential career paths
+- Workplace strengths and challenges
+- Learning and development approaches
+- Decision-making in professional contexts
+- Potential areas of professional growth
+
+Consider both technical and soft skill dimensions.
+Provide actionable, inspiring career guidance.
+
+Output should be nuanced, motivational, and tailored to the specific MBTI type's
+unique cognitive and emotional landscape not more than 5 sentences.
+
+""", """MBTI type: {mbti_type}
+Traits: {traits}
+""")
+
+def parse_min_tokens(spec):
+    """
+    Parse the shortest cached prefix per model, e.g. "1024" or "gpt-4o=1024,default=0".
+
+    Returns:
+        dict: Model -> tokens, with the value for every other model under "default"
+    """
+    thresholds = {'default': 1024}
+    for item in str(spec).split(","):
+        if not item.strip():
+            continue
+        model, _, tokens = item.rpartition("=")
+        thresholds[model.strip() or 'default'] = int(tokens)
+    return thresholds
+
+class PrefixCacheEstimator:
+    def __init__(self, ttl=None, min_tokens=None, max_entries=4096):
+        """
+        Estimate how many leading tokens of each request a provider serves from its prefix cache.
+
+        Providers do not report this through the client library, so it is inferred from
+        what this process sent recently. A prompt counts as cached up to the longest of
+        its static prefix, if any request to the same model sent that prefix within the
+        TTL, and the text it shares with the previous prompt of the same session and
+        call site (e.g. the history that only grew since the last turn).
+
+        That shared length is reported as is, and as cached tokens once it reaches the
+        provider's minimum for the model. The prompts of this application are shorter
+        than the common 1024-token minimum, so the shared length is what shows the
+        effect of the prompt layout until prompts grow or a model caches shorter ones.
+
+        Args:
+            ttl (float, optional): Seconds a sent prefix is assumed to stay cached.
+                Defaults to MBTI_PREFIX_CACHE_TTL or 300.
+            min_tokens (int, str or dict, optional): Shortest prefix the provider caches,
+                for every model or per model (see parse_min_tokens).
+                Defaults to MBTI_PREFIX_CACHE_MIN_TOKENS or 1024.
+            max_entries (int): Previous prompts remembered across sessions and call sites
+        """
+        self.ttl = ttl or float(os.environ.get("MBTI_PREFIX_CACHE_TTL", 300))
+        if min_tokens is None:
+            min_tokens = os.environ.get("MBTI_PREFIX_CACHE_MIN_TOKENS", 1024)
+        self.min_tokens = min_tokens if isinstance(min_tokens, dict) else parse_min_tokens(min_tokens)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # (model, static prefix) -> when it was last sent
+        self._prefixes = {}
+        # (model, session, site) -> (previous prompt, when it was sent)
+        self._previous = OrderedDict()
+
+    def observe(self, prompt, prefix, session_id, site, model_name):
+        """
+        Record a sent prompt and estimate how much of it the provider can reuse.
+
+        Args:
+            prompt (str): The prompt text
+            prefix (str or None): Static prefix of the template the prompt was built from
+            session_id (str or None): Session the call belongs to
+            site (str or None): Call site
+            model_name (str): Model the prompt was sent to
+
+        Returns:
+            tuple: (tokens shared with recent prompts, of those the tokens the provider
+                caches: 0 when below its minimum for the model)
+        """
+        now = time.monotonic()
+        shared = 0
+        with self._lock:
+            if prefix and prompt.startswith(prefix):
+                sent = self._prefixes.get((model_name, prefix))
+                if sent is not None and now - sent < self.ttl:
+                    shared = len(prefix)
+                self._prefixes[(model_name, prefix)] = now
+
+            if session_id is not None:
+                key = (model_name, session_id, site)
+                previous = self._previous.pop(key, None)
+                if previous is not None and now - previous[1] < self.ttl:
+                    shared = max(shared, len(os.path.commonprefix([previous[0], prompt])))
+                self._previous[key] = (prompt, now)
+                while len(self._previous) > self.max_entries:
+                    self._previous.popitem(last=False)
+
+        tokens = estimate_tokens(prompt[:shared]) if shared else 0
+        minimum = self.min_tokens.get(model_name, self.min_tokens['default'])
+        return tokens, tokens if tokens >= minimum else 0
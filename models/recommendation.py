@@ -1,40 +1,15 @@
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
-from langchain.chat_models import ChatOpenAI
+from .llm_gateway import get_gateway
+from .content_cache import prompt_version
+from .prompts import RECOMMENDATIONS_PROMPT
 
 class RecommendationGenerator:
-    def __init__(self):
+    def __init__(self, content_cache=None, gateway=None):
         """Initialize the recommendation generator with LLM components."""
-        self.llm = ChatOpenAI(
-            temperature=0.7,
-            model_name="gpt-3.5-turbo",
-        )
+        # Calls go through the shared LLM gateway
+        self.gateway = gateway or get_gateway()
         
-        self.recommendation_template = """
-       For the MBTI personality type {mbti_type}, provide 3 highly tailored recommendations in each category:
-
-        Music:
-        - Recommend 3 artists/songs that perfectly match the {traits} personality
-        - Provide a brief, compelling 1-sentence description for each recommendation
-
-        Books:
-        - Suggest 3 books that would deeply resonate with this personality type
-        - Include a concise, intriguing description for each book recommendation
-
-        Movies:
-        - Select 3 films that capture the essence of this personality type
-        - Write a short, vivid description highlighting why each movie would appeal to them
-
-        Ensure recommendations are specific, engaging, and reflect the unique characteristics of {mbti_type}.
-        Use an enthusiastic and personalized tone.
-        """
-        
-        self.prompt = PromptTemplate(
-            input_variables=["mbti_type", "traits"],
-            template=self.recommendation_template
-        )
-        
-        self.chain = LLMChain(llm=self.llm, prompt=self.prompt)
+        # Registered prompt: static instructions first, the type and its traits last
+        self.prompt = RECOMMENDATIONS_PROMPT
         
         # MBTI type traits mapping
         self.mbti_traits = {
@@ -55,15 +30,61 @@ class RecommendationGenerator:
             "ENFJ": "charismatic, idealistic, and people-focused",
             "ENTJ": "strategic, logical, and efficient"
         }
+        
+        # Optional on-disk cache of generated content per type
+        self.content_cache = content_cache
+        self.cache_name = "recommendations"
+        self.prompt_version = prompt_version(self.prompt.template, self.mbti_traits)
     
-    def generate_recommendations(self, mbti_type):
-        """Generate personalized recommendations based on MBTI type."""
+    def generate_recommendations(self, mbti_type, callbacks=None):
+        """Generate personalized recommendations based on MBTI type, streaming to callbacks on a cache miss."""
         if mbti_type not in self.mbti_traits:
             raise ValueError(f"Invalid MBTI type: {mbti_type}")
             
+        # Serve recommendations from the type cache, generating them on a miss
+        if self.content_cache is None:
+            return self.generate_content(mbti_type, callbacks)
+        return self.content_cache.get(
+            self.cache_name, self.prompt_version, mbti_type,
+            lambda: self.generate_content(mbti_type, callbacks),
+            refresh=lambda: self.generate_content(mbti_type)
+        )
+
+    def generate_content(self, mbti_type, callbacks=None):
+        """Generate uncached recommendations for a type using the LLM."""
         traits = self.mbti_traits[mbti_type]
         
         # Generate recommendations using LLM
-        result = self.chain.run(mbti_type=mbti_type, traits=traits)
+        return self.gateway.predict(
+            self.prompt.format(mbti_type=mbti_type, traits=traits),
+            callbacks=callbacks,
+            site=self.cache_name,
+            # The type content cache already persists these, with several variants
+            cache=self.content_cache is None,
+            version=self.prompt_version,
+            template=self.prompt
+        )
+
+    async def agenerate_recommendations(self, mbti_type, callbacks=None):
+        """Async twin of generate_recommendations."""
+        if mbti_type not in self.mbti_traits:
+            raise ValueError(f"Invalid MBTI type: {mbti_type}")
         
-        return result 
\ No newline at end of file
+        if self.content_cache is None:
+            return await self.agenerate_content(mbti_type, callbacks)
+        return await self.content_cache.aget(
+            self.cache_name, self.prompt_version, mbti_type,
+            lambda: self.agenerate_content(mbti_type, callbacks),
+            refresh=lambda: self.generate_content(mbti_type)
+        )
+
+    async def agenerate_content(self, mbti_type, callbacks=None):
+        """Async twin of generate_content."""
+        return await self.gateway.apredict(
+            self.prompt.format(mbti_type=mbti_type, traits=self.mbti_traits[mbti_type]),
+            callbacks=callbacks,
+            site=self.cache_name,
+            cache=self.content_cache is None,
+            version=self.prompt_version,
+            template=self.prompt
+        )
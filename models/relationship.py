@@ -1,43 +1,15 @@
-import os
-import sys
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
-from langchain.chat_models import ChatOpenAI
+from .llm_gateway import get_gateway
+from .content_cache import prompt_version
+from .prompts import RELATIONSHIP_PROMPT
 
 class RelationshipInsightsGenerator:
-    def __init__(self):
+    def __init__(self, content_cache=None, gateway=None):
         """Initialize the relationship insights generator with LLM components."""
-        self.llm = ChatOpenAI(
-            temperature=0.7,
-            model_name="gpt-3.5-turbo",
-        )
+        # Calls go through the shared LLM gateway
+        self.gateway = gateway or get_gateway()
         
-        self.relationship_template = """
-        Generate brief relationship insights not more than 5 sentences for the MBTI personality type {mbti_type}:
-
-        Context: Provide a nuanced overview of how {traits} individuals approach relationships, 
-        emotional connections, and personal interactions. Consider their core personality 
-        characteristics and how these manifest in romantic, professional, and personal relationships.
-
-        Output Format:
-        1. A brief paragraph exploring relationship dynamics
-        2. A list of key relationship strengths
-        3. A list of potential relationship challenges
-
-        Focus on:
-        - Brief overview of relationship approach
-        - Top 3 relationship strengths
-        - Top 3 relationship challenges
-
-        Tone: Insightful, empathetic, and constructive
-        """
-        
-        self.prompt = PromptTemplate(
-            input_variables=["mbti_type", "traits"],
-            template=self.relationship_template
-        )
-        
-        self.chain = LLMChain(llm=self.llm, prompt=self.prompt)
+        # Registered prompt: static instructions first, the type and its traits last
+        self.prompt = RELATIONSHIP_PROMPT
         
         # MBTI type traits and relationship characteristics
         self.mbti_relationship_traits = {
@@ -58,14 +30,20 @@ class RelationshipInsightsGenerator:
             "ENFJ": "charismatic, empathetic, and nurturing",
             "ENTJ": "ambitious, direct, and leadership-driven"
         }
+        
+        # Optional on-disk cache of generated content per type
+        self.content_cache = content_cache
+        self.cache_name = "relationship"
+        self.prompt_version = prompt_version(self.prompt.template, self.mbti_relationship_traits)
     
-    def generate_relationship_insights(self, mbti_type, conversation=None):
+    def generate_relationship_insights(self, mbti_type, conversation=None, callbacks=None):
         """
         Generate personalized relationship insights based on MBTI type.
         
         Args:
             mbti_type (str): The MBTI personality type
             conversation (optional): Conversation context for additional personalization
+            callbacks (list, optional): LangChain callbacks receiving streamed tokens on a cache miss
         
         Returns:
             str: Brief relationship insights not more than 5 sentences
@@ -73,13 +51,59 @@ class RelationshipInsightsGenerator:
         if mbti_type not in self.mbti_relationship_traits:
             raise ValueError(f"Invalid MBTI type: {mbti_type}")
         
+        # Serve insights from the type cache, generating them on a miss
+        if self.content_cache is None:
+            result = self.generate_content(mbti_type, callbacks)
+        else:
+            result = self.content_cache.get(
+                self.cache_name, self.prompt_version, mbti_type,
+                lambda: self.generate_content(mbti_type, callbacks),
+                refresh=lambda: self.generate_content(mbti_type)
+            )
+        
+        # Parse and format the result for better readability
+        return self._format_relationship_insights(result, mbti_type)
+    
+    def generate_content(self, mbti_type, callbacks=None):
+        """Generate uncached relationship insights for a type using the LLM."""
         traits = self.mbti_relationship_traits[mbti_type]
         
         # Generate insights using LLM
-        result = self.chain.run(mbti_type=mbti_type, traits=traits)
+        return self.gateway.predict(
+            self.prompt.format(mbti_type=mbti_type, traits=traits),
+            callbacks=callbacks,
+            site=self.cache_name,
+            # The type content cache already persists these, with several variants
+            cache=self.content_cache is None,
+            version=self.prompt_version,
+            template=self.prompt
+        )
+
+    async def agenerate_relationship_insights(self, mbti_type, conversation=None, callbacks=None):
+        """Async twin of generate_relationship_insights."""
+        if mbti_type not in self.mbti_relationship_traits:
+            raise ValueError(f"Invalid MBTI type: {mbti_type}")
         
-        # Parse and format the result for better readability
+        if self.content_cache is None:
+            result = await self.agenerate_content(mbti_type, callbacks)
+        else:
+            result = await self.content_cache.aget(
+                self.cache_name, self.prompt_version, mbti_type,
+                lambda: self.agenerate_content(mbti_type, callbacks),
+                refresh=lambda: self.generate_content(mbti_type)
+            )
         return self._format_relationship_insights(result, mbti_type)
+
+    async def agenerate_content(self, mbti_type, callbacks=None):
+        """Async twin of generate_content."""
+        return await self.gateway.apredict(
+            self.prompt.format(mbti_type=mbti_type, traits=self.mbti_relationship_traits[mbti_type]),
+            callbacks=callbacks,
+            site=self.cache_name,
+            cache=self.content_cache is None,
+            version=self.prompt_version,
+            template=self.prompt
+        )
     
     def _format_relationship_insights(self, insights, mbti_type):
         """
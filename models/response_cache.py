@@ -0,0 +1,137 @@
+import os
+import re
+import hashlib
+import sqlite3
+import threading
+import time
+
+WHITESPACE = re.compile(r"\s+")
+
+def normalize_prompt(prompt):
+    """Collapse whitespace so indentation and line-wrapping changes do not create new keys."""
+    return WHITESPACE.sub(" ", prompt).strip()
+
+class ResponseCache:
+    def __init__(self, path, ttl=None, max_bytes=None):
+        """
+        Persistent cache of LLM replies in a SQLite file, shared by all workers on one host.
+
+        Entries are keyed by model, temperature, template version and the normalized
+        prompt. They expire after the TTL. Once the cache grows past max_bytes, the least
+        recently used entries are evicted.
+
+        Args:
+            path (str): Database file
+            ttl (float, optional): Seconds an entry stays valid. Defaults to MBTI_LLM_CACHE_TTL or one week.
+            max_bytes (int, optional): Size limit of the stored replies. Defaults to MBTI_LLM_CACHE_MB (100) megabytes.
+        """
+        self.path = path
+        self.ttl = ttl or float(os.environ.get("MBTI_LLM_CACHE_TTL", 7 * 24 * 3600))
+        self.max_bytes = max_bytes or int(float(os.environ.get("MBTI_LLM_CACHE_MB", 100)) * 1024 * 1024)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes_since_trim = 0
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, used REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses (used)")
+
+    @staticmethod
+    def key(prompt, model_name, temperature, version=None):
+        """Return the cache key for a call."""
+        source = "\0".join([model_name, repr(float(temperature)), version or "", normalize_prompt(prompt)])
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached reply for a key, or None on a miss or when it has expired."""
+        now = time.time()
+        db = self._connection()
+        row = db.execute(
+            "SELECT response FROM responses WHERE key = ? AND created > ?", (key, now - self.ttl)
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if row is None:
+            return None
+        with db:
+            db.execute("UPDATE responses SET used = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, key, response):
+        """Store a reply, evicting expired and least recently used entries when over the size limit."""
+        now = time.time()
+        with self._connection() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, used) VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response.encode("utf-8")), now, now)
+            )
+        with self._lock:
+            self.writes += 1
+            self._writes_since_trim += 1
+            if self._writes_since_trim < 50:
+                return
+            self._writes_since_trim = 0
+        self.trim()
+
+    def trim(self):
+        """Delete expired entries, then the least recently used ones past the size limit."""
+        now = time.time()
+        with self._connection() as db:
+            evicted = db.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl,)).rowcount
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                freed = 0
+                oldest = db.execute("SELECT key, size FROM responses ORDER BY used").fetchall()
+                doomed = []
+                for key, size in oldest:
+                    if freed >= excess:
+                        break
+                    doomed.append((key,))
+                    freed += size
+                db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+                evicted += len(doomed)
+        with self._lock:
+            self.evictions += evicted
+
+    def stats(self):
+        """Hit, miss, write and eviction counts of this process."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'writes': self.writes, 'evictions': self.evictions}
+
+    def _connection(self):
+        """One connection per thread, since SQLite connections cannot be shared."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            self._local.db = db
+        return db
+
+def make_response_cache(setting=None):
+    """
+    Build the LLM response cache configured by MBTI_LLM_CACHE.
+
+    Args:
+        setting (str, optional): Path of the SQLite file, or "off". Defaults to cache/llm_responses.db.
+
+    Returns:
+        ResponseCache or None
+    """
+    setting = setting or os.environ.get("MBTI_LLM_CACHE", os.path.join("cache", "llm_responses.db"))
+    if setting == "off":
+        return None
+    return ResponseCache(setting)
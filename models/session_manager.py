@@ -0,0 +1,259 @@
+import os
+import asyncio
+import secrets
+import threading
+import time
+import weakref
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager, asynccontextmanager
+from .mbti_analyzer import AnalyzerResources, MBTIAnalyzer
+from .session_store import make_store
+from .llm_gateway import current_session
+from .tracing import annotate
+
+class SessionManager:
+    def __init__(self, resources=None, store=None, max_sessions=None, idle_ttl=None):
+        """
+        Keep one MBTIAnalyzer per client session on top of shared resources.
+
+        Session state lives in a pluggable store, so any worker or node can serve a
+        session. Each process also keeps recently used analyzers in a bounded local
+        cache. A cached analyzer is reused only while its state version still matches
+        the store.
+
+        Args:
+            resources (AnalyzerResources, optional): LLM client and generators shared by all sessions
+            store (optional): Session store. Defaults to the one configured by MBTI_SESSION_STORE.
+            max_sessions (int, optional): Upper bound on locally cached analyzers.
+                Defaults to MBTI_MAX_SESSIONS or 500.
+            idle_ttl (float, optional): Seconds of inactivity before a cached analyzer is dropped.
+                Defaults to MBTI_SESSION_TTL or 1800.
+        """
+        self.resources = resources or AnalyzerResources()
+        self.store = store or make_store()
+        self.max_sessions = max_sessions or int(os.environ.get("MBTI_MAX_SESSIONS", 500))
+        self.idle_ttl = idle_ttl or float(os.environ.get("MBTI_SESSION_TTL", 1800))
+
+        # Session token -> [analyzer, last access time], least recently used first
+        self._sessions = OrderedDict()
+
+        # Socket.IO sid -> session token for connected clients
+        self._sids = {}
+
+        self._lock = threading.Lock()
+
+        # Serialize turns of the same session within this process
+        self._token_locks = [threading.Lock() for _ in range(64)]
+
+        # The same for async turns, per event loop
+        self._async_locks = weakref.WeakKeyDictionary()
+
+    def new_token(self):
+        """Create a fresh, unguessable session token."""
+        return secrets.token_urlsafe(16)
+
+    def bind(self, sid, token=None):
+        """
+        Attach a Socket.IO connection to a session, resuming it when the token is known.
+
+        Args:
+            sid (str): Socket.IO session id of the connection
+            token (str, optional): Token previously handed to the client
+
+        Returns:
+            str: The session token the connection is bound to
+        """
+        if not token or self.store.load(token) is None:
+            token = self.new_token()
+        with self._lock:
+            self._sids[sid] = token
+        return token
+
+    def unbind(self, sid):
+        """Detach a connection; the session itself lives on until it expires."""
+        with self._lock:
+            return self._sids.pop(sid, None)
+
+    def connections(self):
+        """Number of connections currently bound to a session."""
+        with self._lock:
+            return len(self._sids)
+
+    def token_for(self, sid):
+        """Return the session token bound to a connection, binding a new one if needed."""
+        with self._lock:
+            token = self._sids.get(sid)
+        return token or self.bind(sid)
+
+    @contextmanager
+    def session(self, token, save=True):
+        """
+        Load a session's analyzer for one turn and save its state afterwards.
+
+        Args:
+            token (str): Session token
+            save (bool): Save the state when the block exits. Pass False for read-only access.
+
+        Usage:
+            with sessions.session(token) as analyzer:
+                analyzer.process_message(message)
+        """
+        waiting = time.monotonic()
+        with self._token_locks[zlib.crc32(token.encode()) % len(self._token_locks)]:
+            annotate(session_wait_ms=round((time.monotonic() - waiting) * 1000, 1))
+            analyzer = self._load(token)
+            # Account every LLM call made during the turn to this session
+            context_token = current_session.set(token)
+            try:
+                yield analyzer
+            finally:
+                current_session.reset(context_token)
+            if save:
+                analyzer.state_version += 1
+                self.store.save(token, analyzer.to_state())
+
+    @asynccontextmanager
+    async def asession(self, token, save=True):
+        """
+        Async twin of session for handlers running on an event loop.
+
+        Turns of a session are serialized on the loop without blocking it, and the
+        store is read and written on a worker thread. Async and blocking turns of the
+        same session must not be mixed within one process.
+
+        Usage:
+            async with sessions.asession(token) as analyzer:
+                await analyzer.aprocess_message(message)
+        """
+        locks = self._async_locks.get(asyncio.get_running_loop())
+        if locks is None:
+            locks = self._async_locks[asyncio.get_running_loop()] = [asyncio.Lock() for _ in range(64)]
+
+        waiting = time.monotonic()
+        async with locks[zlib.crc32(token.encode()) % len(locks)]:
+            annotate(session_wait_ms=round((time.monotonic() - waiting) * 1000, 1))
+            analyzer = await asyncio.to_thread(self._load, token)
+            context_token = current_session.set(token)
+            try:
+                yield analyzer
+            finally:
+                current_session.reset(context_token)
+            if save:
+                analyzer.state_version += 1
+                await asyncio.to_thread(self.store.save, token, analyzer.to_state())
+
+    def prefetch(self, token, asynchronous=False):
+        """
+        Let a session's cached analyzer draft its next question without waiting for the turn lock.
+
+        Args:
+            token (str): Session token
+            asynchronous (bool): Draft on the running event loop, for sessions served by asession
+        """
+        with self._lock:
+            entry = self._sessions.get(token)
+        if entry is None:
+            return
+        context_token = current_session.set(token)
+        try:
+            entry[0].prefetch_question(asynchronous)
+        finally:
+            current_session.reset(context_token)
+    
+    def report_section(self, token, name, on_token=None):
+        """
+        Return one report section of a completed session, generating it on first request.
+
+        The section is generated outside the turn lock, so a client can load several
+        sections of its report at once. The result is stored in the session afterwards.
+
+        Args:
+            token (str): Session token
+            name (str): Section name, one of MBTIAnalyzer.report_section_names
+            on_token (callable, optional): Receives the section's tokens as they stream
+
+        Returns:
+            str: The section text
+
+        Raises:
+            ValueError: If the section is unknown or the session's test is not complete
+        """
+        with self.session(token, save=False) as analyzer:
+            text = analyzer.report_sections.get(name)
+            if text is not None:
+                return text
+            produce = analyzer.section_producer(name)
+
+        context_token = current_session.set(token)
+        try:
+            text, generated = produce(on_token)
+        finally:
+            current_session.reset(context_token)
+
+        if generated:
+            with self.session(token) as analyzer:
+                analyzer.report_sections.setdefault(name, text)
+        return text
+
+    async def areport_section(self, token, name, on_token=None):
+        """Async twin of report_section."""
+        async with self.asession(token, save=False) as analyzer:
+            text = analyzer.report_sections.get(name)
+            if text is not None:
+                return text
+            produce = analyzer.asection_producer(name)
+
+        context_token = current_session.set(token)
+        try:
+            text, generated = await produce(on_token)
+        finally:
+            current_session.reset(context_token)
+
+        if generated:
+            async with self.asession(token) as analyzer:
+                analyzer.report_sections.setdefault(name, text)
+        return text
+
+    def discard(self, token):
+        """Forget a session immediately."""
+        with self._lock:
+            self._sessions.pop(token, None)
+        self.store.delete(token)
+
+    def __len__(self):
+        return self.store.count()
+
+    def _load(self, token):
+        """Return the cached analyzer if it is current, otherwise rebuild it from the store."""
+        state = self.store.load(token)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            entry = self._sessions.get(token)
+            if entry is not None and (state is None or state.get('version') == entry[0].state_version):
+                entry[1] = now
+                self._sessions.move_to_end(token)
+                return entry[0]
+
+        if state is None:
+            analyzer = MBTIAnalyzer(self.resources)
+        else:
+            analyzer = MBTIAnalyzer.from_state(state, self.resources)
+
+        with self._lock:
+            self._sessions[token] = [analyzer, now]
+            self._sessions.move_to_end(token)
+            # Drop the least recently used sessions past the cap
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return analyzer
+
+    def _evict_expired(self, now=None):
+        """Drop cached analyzers idle for longer than the TTL. Caller must hold the lock."""
+        now = now or time.monotonic()
+        while self._sessions:
+            token, entry = next(iter(self._sessions.items()))
+            if now - entry[1] < self.idle_ttl:
+                break
+            self._sessions.popitem(last=False)
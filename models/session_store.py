@@ -0,0 +1,198 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+class InMemorySessionStore:
+    def __init__(self, max_sessions=None, idle_ttl=None):
+        """
+        Session state kept in this process only, bounded by count and idle time.
+
+        States are stored serialized, exactly as the shared backends store them, so
+        switching backends never changes behavior.
+
+        Args:
+            max_sessions (int, optional): Upper bound on stored sessions. Defaults to MBTI_MAX_SESSIONS or 500.
+            idle_ttl (float, optional): Seconds of inactivity before a session expires.
+                Defaults to MBTI_SESSION_TTL or 1800.
+        """
+        self.max_sessions = max_sessions or int(os.environ.get("MBTI_MAX_SESSIONS", 500))
+        self.idle_ttl = idle_ttl or float(os.environ.get("MBTI_SESSION_TTL", 1800))
+
+        # Session token -> (serialized state, last write time), least recently used first
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, token):
+        """Return the stored state for a token, or None if it is unknown or expired."""
+        with self._lock:
+            self._evict_expired()
+            entry = self._states.get(token)
+            if entry is None:
+                return None
+            self._states.move_to_end(token)
+            return json.loads(entry[0])
+
+    def save(self, token, state):
+        """Store the state for a token, dropping the least recently used sessions past the cap."""
+        data = json.dumps(state)
+        with self._lock:
+            self._states[token] = (data, time.monotonic())
+            self._states.move_to_end(token)
+            while len(self._states) > self.max_sessions:
+                self._states.popitem(last=False)
+
+    def delete(self, token):
+        """Forget a session."""
+        with self._lock:
+            self._states.pop(token, None)
+
+    def count(self):
+        """Number of live sessions."""
+        with self._lock:
+            self._evict_expired()
+            return len(self._states)
+
+    def _evict_expired(self):
+        """Drop sessions idle for longer than the TTL. Caller must hold the lock."""
+        now = time.monotonic()
+        while self._states:
+            token, (_, updated) = next(iter(self._states.items()))
+            if now - updated < self.idle_ttl:
+                break
+            self._states.popitem(last=False)
+
+class SQLiteSessionStore:
+    def __init__(self, path, idle_ttl=None):
+        """
+        Session state in a SQLite file, shared by all workers on one host.
+
+        Args:
+            path (str): Database file
+            idle_ttl (float, optional): Seconds of inactivity before a session expires.
+                Defaults to MBTI_SESSION_TTL or 1800.
+        """
+        self.path = path
+        self.idle_ttl = idle_ttl or float(os.environ.get("MBTI_SESSION_TTL", 1800))
+        self._local = threading.local()
+        self._last_purge = 0.0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "token TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def load(self, token):
+        """Return the stored state for a token, or None if it is unknown or expired."""
+        row = self._connection().execute(
+            "SELECT state FROM sessions WHERE token = ? AND updated > ?",
+            (token, time.time() - self.idle_ttl)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, token, state):
+        """Store the state for a token."""
+        with self._connection() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO sessions (token, state, updated) VALUES (?, ?, ?)",
+                (token, json.dumps(state), time.time())
+            )
+        self._purge_expired()
+
+    def delete(self, token):
+        """Forget a session."""
+        with self._connection() as db:
+            db.execute("DELETE FROM sessions WHERE token = ?", (token,))
+
+    def count(self):
+        """Number of live sessions."""
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM sessions WHERE updated > ?", (time.time() - self.idle_ttl,)
+        ).fetchone()[0]
+
+    def _connection(self):
+        """One connection per thread, since SQLite connections cannot be shared."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            self._local.db = db
+        return db
+
+    def _purge_expired(self):
+        """Delete expired sessions, at most once a minute."""
+        now = time.time()
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        with self._connection() as db:
+            db.execute("DELETE FROM sessions WHERE updated <= ?", (now - self.idle_ttl,))
+
+class RedisSessionStore:
+    def __init__(self, url, idle_ttl=None, prefix="mbti:session:"):
+        """
+        Session state in Redis (or any server speaking its protocol), shared by all nodes.
+
+        Args:
+            url (str): Connection URL, e.g. redis://localhost:6379/0
+            idle_ttl (float, optional): Seconds of inactivity before a session expires.
+                Defaults to MBTI_SESSION_TTL or 1800.
+            prefix (str): Key prefix for session entries
+        """
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("The redis package is required for Redis session storage: pip install redis")
+
+        self.client = redis.Redis.from_url(url)
+        self.idle_ttl = int(idle_ttl or float(os.environ.get("MBTI_SESSION_TTL", 1800)))
+        self.prefix = prefix
+
+    def load(self, token):
+        """Return the stored state for a token and refresh its expiry, or None if unknown."""
+        key = self.prefix + token
+        pipe = self.client.pipeline()
+        pipe.get(key)
+        pipe.expire(key, self.idle_ttl)
+        data, _ = pipe.execute()
+        return json.loads(data) if data else None
+
+    def save(self, token, state):
+        """Store the state for a token with the idle TTL."""
+        self.client.set(self.prefix + token, json.dumps(state), ex=self.idle_ttl)
+
+    def delete(self, token):
+        """Forget a session."""
+        self.client.delete(self.prefix + token)
+
+    def count(self):
+        """Number of live sessions."""
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + "*", count=1000))
+
+def make_store(url=None):
+    """
+    Build the session store configured by MBTI_SESSION_STORE.
+
+    Args:
+        url (str, optional): "memory" (default), "sqlite:///path/to/sessions.db" or
+            "redis://host:port/db"
+
+    Returns:
+        A session store with load, save, delete and count methods
+    """
+    url = url or os.environ.get("MBTI_SESSION_STORE", "memory")
+    if url == "memory":
+        return InMemorySessionStore()
+
+    parsed = urlparse(url)
+    if parsed.scheme == "sqlite":
+        return SQLiteSessionStore(url[len("sqlite:///"):] or "sessions.db")
+    if parsed.scheme in ("redis", "rediss", "unix"):
+        return RedisSessionStore(url)
+    raise ValueError(f"Invalid session store: {url}")
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+from concurrent.futures import Future, TimeoutError
+
+class SingleFlight:
+    def __init__(self):
+        """
+        Coalesce concurrent calls that share a key into one execution.
+
+        The first caller for a key runs the work. Callers arriving while it is still
+        running wait for it and receive the same result, or the same exception. A
+        waiter may bound its wait; the work goes on for the others when it gives up.
+        """
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0
+
+    def do(self, key, fn, timeout=None):
+        """
+        Run fn for a key unless a call for the key is already in flight.
+
+        Args:
+            key: Hashable identity of the work
+            fn (callable): Zero-argument function doing the work
+            timeout (float, optional): Seconds to wait for a call already in flight.
+                Does not limit fn when this caller runs it.
+
+        Returns:
+            tuple: (result, True if it came from another caller's execution)
+
+        Raises:
+            TimeoutError: If the call in flight did not finish within timeout
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = Future()
+                self._calls[key] = call
+            else:
+                self.shared += 1
+
+        if not leader:
+            return call.result(timeout=timeout), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+class AsyncSingleFlight:
+    def __init__(self):
+        """
+        SingleFlight for coroutines running on one event loop.
+
+        The work runs as a task of its own that every caller, the first one included,
+        awaits through a shield. A caller that is cancelled, e.g. by a timeout, stops
+        waiting without cancelling the work the others wait for.
+        """
+        self._calls = {}
+        self.shared = 0
+
+    async def do(self, key, fn, timeout=None):
+        """
+        Await fn() for a key unless a call for the key is already in flight.
+
+        Args:
+            key: Hashable identity of the work
+            fn (callable): Zero-argument coroutine function doing the work
+            timeout (float, optional): Seconds to wait for a call already in flight.
+                Does not limit fn when this caller starts it.
+
+        Returns:
+            tuple: (result, True if it came from another caller's execution)
+
+        Raises:
+            asyncio.TimeoutError: If the call in flight did not finish within timeout
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            self.shared += 1
+            return await asyncio.wait_for(asyncio.shield(task), timeout), True
+        task = asyncio.ensure_future(fn())
+        self._calls[key] = task
+        task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task), False
+
+    def _finished(self, key, task):
+        """Forget a finished call and retrieve its error in case nobody was waiting any more."""
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,107 @@
+import threading
+from langchain.callbacks.base import BaseCallbackHandler
+
+class TokenStreamHandler(BaseCallbackHandler):
+    # Async LLM calls invoke the handler on the event loop instead of a worker thread
+    run_inline = True
+
+    def __init__(self, on_token, section):
+        """
+        Forward tokens from a streaming LLM call to a callback.
+
+        Args:
+            on_token (callable): Called as on_token(section, token) for every new token
+            section (str): Name of the output being streamed, e.g. "question" or "roast"
+        """
+        self.on_token = on_token
+        self.section = section
+
+    def on_llm_new_token(self, token, **kwargs):
+        """Pass each generated token on as it arrives."""
+        if token:
+            self.on_token(self.section, token)
+
+def stream_callbacks(on_token, section):
+    """Return the callbacks list streaming a section to on_token, or None when nobody listens."""
+    if on_token is None:
+        return None
+    return [TokenStreamHandler(on_token, section)]
+
+class DelimitedStreamHandler(TokenStreamHandler):
+    def __init__(self, on_token, section, delimiter, gate=None):
+        """
+        Stream only the part of the output that follows a delimiter.
+
+        Args:
+            on_token (callable): Called as on_token(section, token) for tokens after the delimiter
+            section (str): Name of the output being streamed
+            delimiter (str): Marker separating the hidden prefix from the streamed part
+            gate (callable, optional): Called with the hidden prefix once the delimiter
+                arrives; if it returns False, nothing after the delimiter is streamed
+        """
+        super().__init__(on_token, section)
+        self.delimiter = delimiter
+        self.gate = gate
+        self._buffer = ""
+        self._streaming = False
+        self._suppressed = False
+
+    def on_llm_new_token(self, token, **kwargs):
+        """Hold tokens back until the delimiter has been seen, then pass them on."""
+        if self._suppressed:
+            return
+        if self._streaming:
+            super().on_llm_new_token(token, **kwargs)
+            return
+
+        self._buffer += token
+        if self.delimiter in self._buffer:
+            hidden, remainder = self._buffer.split(self.delimiter, 1)
+            self._buffer = ""
+            if self.gate is not None and not self.gate(hidden):
+                self._suppressed = True
+                return
+            self._streaming = True
+            super().on_llm_new_token(remainder.lstrip(), **kwargs)
+
+class RequestAbandoned(Exception):
+    """Raised into a streaming request whose answer is no longer wanted, to stop it."""
+
+class GatedStreamHandler(BaseCallbackHandler):
+    run_inline = True
+
+    def __init__(self, handlers=None, abandon=False):
+        """
+        Pass tokens on to other handlers until the gate is closed.
+
+        Lets the gateway tell whether a request has started answering, and silence a
+        request whose answer is no longer wanted, e.g. the loser of a hedged pair.
+
+        Args:
+            handlers (list, optional): Handlers receiving the tokens while the gate is open
+            abandon (bool): Raise RequestAbandoned on the first token after the gate is
+                closed, so a blocking request stops and frees its slot and thread
+        """
+        self.handlers = handlers or []
+        self.abandon = abandon
+        # LangChain only passes on errors of handlers that ask for it
+        self.raise_error = abandon
+        self.streamed = False
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def on_llm_new_token(self, token, **kwargs):
+        """Forward a token unless the gate is closed."""
+        with self._lock:
+            if self._closed:
+                if self.abandon:
+                    raise RequestAbandoned("The answer is no longer wanted")
+                return
+            self.streamed = True
+            for handler in self.handlers:
+                handler.on_llm_new_token(token, **kwargs)
+
+    def close(self):
+        """Drop every later token."""
+        with self._lock:
+            self._closed = True
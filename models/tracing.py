@@ -0,0 +1,170 @@
+import os
+import json
+import asyncio
+import time
+import random
+import secrets
+import logging
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+# Span the current code runs in. Pooled work inherits it through llm_gateway.submit,
+# asyncio tasks when they are created.
+current_span = contextvars.ContextVar("current_span", default=None)
+
+# Marks a trace that was not sampled, so its nested spans are skipped as well
+NOT_SAMPLED = object()
+
+class Span:
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        """One timed operation within a trace."""
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.error = None
+
+    def set(self, **attributes):
+        """Attach attributes to the span."""
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        """Finish the span and return it as a JSON-serializable record."""
+        record = {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'duration_ms': round((time.perf_counter() - self._started) * 1000, 3),
+            'thread': threading.current_thread().name,
+            'attributes': self.attributes,
+        }
+        if self.error:
+            record['error'] = self.error
+        return record
+
+class Tracer:
+    def __init__(self, path=None, sample_rate=None, max_bytes=None, backups=None):
+        """
+        Record sampled traces of turns as JSON lines in a rotating local file.
+
+        Whether a trace is recorded is decided once, at its root span. Nested spans
+        follow that decision, so an unsampled turn costs a context variable lookup per
+        span. Tracing is off unless a file is configured.
+
+        Args:
+            path (str, optional): Trace file. Defaults to MBTI_TRACE_FILE; unset disables tracing.
+            sample_rate (float, optional): Share of traces recorded, 0 to 1.
+                Defaults to MBTI_TRACE_SAMPLE_RATE or 0.1.
+            max_bytes (int, optional): Size at which the file is rotated.
+                Defaults to MBTI_TRACE_MB (20) megabytes.
+            backups (int, optional): Rotated files kept. Defaults to MBTI_TRACE_BACKUPS or 3.
+        """
+        self.path = path or os.environ.get("MBTI_TRACE_FILE")
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.environ.get("MBTI_TRACE_SAMPLE_RATE", 0.1))
+        self.enabled = bool(self.path) and self.sample_rate > 0
+        self._logger = None
+
+        if self.enabled:
+            max_bytes = max_bytes or int(float(os.environ.get("MBTI_TRACE_MB", 20)) * 1024 * 1024)
+            backups = backups if backups is not None else int(os.environ.get("MBTI_TRACE_BACKUPS", 3))
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            handler = RotatingFileHandler(self.path, maxBytes=max_bytes, backupCount=backups)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            # A private logger: the handler does the locking and rotation
+            self._logger = logging.getLogger(f"{__name__}.{id(self)}")
+            self._logger.propagate = False
+            self._logger.setLevel(logging.INFO)
+            self._logger.addHandler(handler)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Time a block as a span of the current trace, starting a new trace if there is none.
+
+        Usage:
+            with tracer.span("analysis", site="analysis") as span:
+                ...
+
+        Yields:
+            Span or None: None when the trace is not recorded
+        """
+        parent = current_span.get()
+        if not self.enabled or parent is NOT_SAMPLED:
+            yield None
+            return
+
+        if parent is None and random.random() >= self.sample_rate:
+            context_token = current_span.set(NOT_SAMPLED)
+            try:
+                yield None
+            finally:
+                current_span.reset(context_token)
+            return
+
+        if parent is None:
+            span = Span(name, secrets.token_hex(16), None, attributes)
+        else:
+            span = Span(name, parent.trace_id, parent.span_id, attributes)
+        context_token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            current_span.reset(context_token)
+            self._logger.info(json.dumps(span.to_dict(), default=str))
+
+_default_tracer = None
+_default_lock = threading.Lock()
+
+def get_tracer():
+    """Return the process-wide tracer, creating it on first use."""
+    global _default_tracer
+    with _default_lock:
+        if _default_tracer is None:
+            _default_tracer = Tracer()
+        return _default_tracer
+
+def set_tracer(tracer):
+    """Replace the process-wide tracer, e.g. to trace every turn of a benchmark."""
+    global _default_tracer
+    with _default_lock:
+        _default_tracer = tracer
+
+def span(name, **attributes):
+    """Open a span on the process-wide tracer; see Tracer.span."""
+    return get_tracer().span(name, **attributes)
+
+def annotate(**attributes):
+    """Attach attributes to the current span, if the trace is being recorded."""
+    current = current_span.get()
+    if current is not None and current is not NOT_SAMPLED:
+        current.set(**attributes)
+
+def traced(name=None):
+    """Decorate a function or coroutine function so each call is recorded as a span named after it."""
+    def decorate(fn):
+        span_name = name or fn.__qualname__
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
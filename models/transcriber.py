@@ -0,0 +1,233 @@
+import os
+import math
+import queue
+import threading
+import time
+from array import array
+import speech_recognition as sr
+from .metrics import STT_SECONDS
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # 16-bit little-endian mono PCM
+FRAME_MS = 20
+FRAME_BYTES = SAMPLE_RATE * SAMPLE_WIDTH * FRAME_MS // 1000
+
+class GoogleBackend:
+    """Recognize speech with the free Google Web Speech API."""
+    def __init__(self):
+        self.recognizer = sr.Recognizer()
+
+    def transcribe(self, audio):
+        return self.recognizer.recognize_google(audio)
+
+class SphinxBackend:
+    """Recognize speech offline with CMU Sphinx (requires the pocketsphinx package)."""
+    def __init__(self):
+        self.recognizer = sr.Recognizer()
+
+    def transcribe(self, audio):
+        return self.recognizer.recognize_sphinx(audio)
+
+class StubBackend:
+    """Return a fixed transcript for every utterance; meant for tests and load generation."""
+    def __init__(self, text=None):
+        self.text = text or os.environ.get("MBTI_STT_STUB_TEXT", "I like spending time with friends")
+
+    def transcribe(self, audio):
+        return self.text
+
+BACKENDS = {
+    'google': GoogleBackend,
+    'sphinx': SphinxBackend,
+    'stub': StubBackend,
+}
+
+def make_backend(name=None):
+    """Build the recognizer backend named by MBTI_STT_BACKEND (google, sphinx or stub)."""
+    name = name or os.environ.get("MBTI_STT_BACKEND", "google")
+    if name not in BACKENDS:
+        raise ValueError(f"Invalid speech recognition backend: {name}")
+    return BACKENDS[name]()
+
+def frame_rms(frame):
+    """Root mean square energy of a frame of 16-bit PCM."""
+    samples = array('h')
+    samples.frombytes(frame[:len(frame) - len(frame) % SAMPLE_WIDTH])
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+class StreamingRecognizer:
+    def __init__(self, backend, executor, on_partial, on_final, max_queue=None,
+                 silence_ms=700, partial_ms=1500, max_utterance_ms=15000, min_energy=300.0):
+        """
+        Turn a stream of PCM chunks from one client into partial and final transcripts.
+
+        An adaptive energy detector splits the stream into utterances. While someone is
+        speaking, the audio so far is re-recognized every partial_ms to produce partial
+        transcripts. A finished utterance goes on a bounded queue that is drained on the
+        shared executor. When the queue is full, the oldest utterance is dropped.
+
+        Args:
+            backend: Recognizer backend with a transcribe(sr.AudioData) method
+            executor (Executor): Shared pool the recognition calls run on
+            on_partial (callable): Called with the partial transcript of the current utterance
+            on_final (callable): Called with the transcript of each finished utterance
+            max_queue (int, optional): Finished utterances waiting for recognition.
+                Defaults to MBTI_STT_QUEUE or 4.
+            silence_ms (int): Silence that ends an utterance
+            partial_ms (int): Speech between partial transcripts
+            max_utterance_ms (int): Utterances are cut at this length
+            min_energy (float): Lowest RMS energy that can count as speech
+        """
+        self.backend = backend
+        self.executor = executor
+        self.on_partial = on_partial
+        self.on_final = on_final
+        self.silence_frames = silence_ms // FRAME_MS
+        self.partial_frames = partial_ms // FRAME_MS
+        self.max_utterance_frames = max_utterance_ms // FRAME_MS
+        self.min_energy = min_energy
+
+        self.utterances = queue.Queue(maxsize=max_queue or int(os.environ.get("MBTI_STT_QUEUE", 4)))
+
+        self._lock = threading.Lock()
+        self._pending = b""
+        self._speech = bytearray()
+        self._speech_frames = 0
+        self._silent_frames = 0
+        self._noise_floor = min_energy / 3
+        self._last_partial_frames = 0
+        self._partial_running = False
+        self._draining = False
+        self._closed = False
+
+    def feed(self, chunk):
+        """Add a chunk of 16 kHz, 16-bit mono PCM from the client."""
+        with self._lock:
+            if self._closed:
+                return
+            data = self._pending + chunk
+            usable = len(data) - len(data) % FRAME_BYTES
+            self._pending = data[usable:]
+            for start in range(0, usable, FRAME_BYTES):
+                self._process_frame(data[start:start + FRAME_BYTES])
+
+    def close(self):
+        """Stop accepting audio and recognize whatever was being said."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._end_utterance()
+
+    def _process_frame(self, frame):
+        """Voice activity detection for one frame. Caller must hold the lock."""
+        energy = frame_rms(frame)
+        is_speech = energy > max(self.min_energy, self._noise_floor * 3)
+        if not is_speech:
+            # Track background noise so the threshold adapts to the microphone
+            self._noise_floor = 0.95 * self._noise_floor + 0.05 * energy
+
+        if self._speech_frames == 0 and not is_speech:
+            return
+
+        self._speech.extend(frame)
+        self._speech_frames += 1
+        self._silent_frames = 0 if is_speech else self._silent_frames + 1
+
+        if self._silent_frames >= self.silence_frames or self._speech_frames >= self.max_utterance_frames:
+            self._end_utterance()
+        elif self._speech_frames - self._last_partial_frames >= self.partial_frames:
+            self._last_partial_frames = self._speech_frames
+            self._schedule_partial(bytes(self._speech))
+
+    def _end_utterance(self):
+        """Queue the current utterance for final recognition. Caller must hold the lock."""
+        speech_frames = self._speech_frames - self._silent_frames
+        audio = bytes(self._speech)
+        self._speech = bytearray()
+        self._speech_frames = 0
+        self._silent_frames = 0
+        self._last_partial_frames = 0
+        if speech_frames * FRAME_MS < 200:
+            # Too short to be words; clicks and breaths end up here
+            return
+
+        try:
+            self.utterances.put_nowait(audio)
+        except queue.Full:
+            # Drop the oldest utterance rather than falling further behind
+            try:
+                self.utterances.get_nowait()
+            except queue.Empty:
+                pass
+            print("Speech recognition queue is full, dropping an utterance")
+            self.utterances.put_nowait(audio)
+
+        if not self._draining:
+            self._draining = True
+            self.executor.submit(self._drain)
+
+    def _schedule_partial(self, audio):
+        """Recognize the utterance so far, skipping if the previous partial is still running."""
+        if self._partial_running:
+            return
+        self._partial_running = True
+
+        def run():
+            try:
+                text = self._transcribe(audio, "partial")
+                if text:
+                    self.on_partial(text)
+            finally:
+                with self._lock:
+                    self._partial_running = False
+
+        self.executor.submit(run)
+
+    def _drain(self):
+        """
+        Recognize queued utterances in order on the shared executor.
+
+        on_final should hand the transcript off, e.g. to a background task, rather than
+        handle the turn on this executor, which the other streams share.
+        """
+        drained = False
+        try:
+            while True:
+                with self._lock:
+                    try:
+                        audio = self.utterances.get_nowait()
+                    except queue.Empty:
+                        # Cleared under the lock, so a new utterance starts a new drain
+                        self._draining = False
+                        drained = True
+                        return
+                text = self._transcribe(audio, "final")
+                if not text:
+                    continue
+                try:
+                    self.on_final(text)
+                except Exception as e:
+                    print(f"Error handling a final transcript: {e!r}")
+        finally:
+            if not drained:
+                # Let the next utterance start draining again instead of going unheard
+                with self._lock:
+                    self._draining = False
+
+    def _transcribe(self, audio, kind="final"):
+        """Run the backend on raw PCM, returning None when nothing was understood."""
+        start = time.monotonic()
+        try:
+            return self.backend.transcribe(sr.AudioData(audio, SAMPLE_RATE, SAMPLE_WIDTH))
+        except sr.UnknownValueError:
+            return None
+        except sr.RequestError as e:
+            print(f"Could not request results; {str(e)}")
+        except Exception as e:
+            print(f"Error in speech recognition: {str(e)}")
+        finally:
+            STT_SECONDS.observe(time.monotonic() - start, kind=kind)
+        return None
@@ -1,122 +1,131 @@
 import os
-import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from gtts import gTTS
-import speech_recognition as sr
-import pygame
 import threading
-import queue
-import time
+from .audio_cache import AudioCache
+from .transcriber import StreamingRecognizer, make_backend
+from .metrics import TTS_SECONDS
+from .llm_gateway import submit
+from .tracing import traced
 
 class VoiceProcessor:
     def __init__(self):
         """Initialize the voice processor with text-to-speech and speech-to-text capabilities."""
-        # Initialize speech recognizer
-        self.recognizer = sr.Recognizer()
+        # Speech synthesis runs on a worker pool and is cached by content
+        self.tts_executor = ThreadPoolExecutor(
+            max_workers=int(os.environ.get("MBTI_TTS_WORKERS", 4)),
+            thread_name_prefix="tts"
+        )
+        self.audio_cache = AudioCache()
+        self.tts_lang = os.environ.get("MBTI_TTS_LANG", "en")
+        self.tts_tld = os.environ.get("MBTI_TTS_TLD", "com")
+        self._pending = {}
+        self._pending_lock = threading.Lock()
         
-        # Initialize pygame for audio playback
-        try:
-            pygame.mixer.init()
-            self.audio_enabled = True
-        except pygame.error:
-            print("Audio playback is not supported in this environment.")
-            self.audio_enabled = False
+        # Speech recognition streams from the browser, one per client session
+        self.stt_backend = make_backend()
+        self.stt_executor = ThreadPoolExecutor(
+            max_workers=int(os.environ.get("MBTI_STT_WORKERS", 8)),
+            thread_name_prefix="stt"
+        )
+        self._streams = {}
+        self._streams_lock = threading.Lock()
         
-        # Audio processing queue
-        self.audio_queue = queue.Queue()
+    def text_to_speech(self, text, callback=None):
+        """
+        Convert text to speech on the worker pool; playback happens in the browser.
         
-        # Speech recognition thread
-        self.recognition_thread = None
-        self.is_listening = False
+        Identical text is synthesized once: cached audio is returned immediately and
+        concurrent requests for the same text share one synthesis.
         
-        # Temporary directory for audio files
-        self.temp_dir = tempfile.mkdtemp()
+        Args:
+            text (str): Text to speak
+            callback (callable, optional): Called with the audio digest once the file is ready
         
-    def text_to_speech(self, text):
-        """Convert text to speech and play it."""
-        if not self.audio_enabled:
-            print("Audio playback is disabled.")
-            return False
+        Returns:
+            Future: Resolves to the digest of the cached mp3, or None if synthesis failed
+        """
+        digest = AudioCache.key(text, self.tts_lang, self.tts_tld)
+        
+        with self._pending_lock:
+            future = self._pending.get(digest)
+            if future is None:
+                future = submit(self.tts_executor, self._synthesize, digest, text)
+                self._pending[digest] = future
+                future.add_done_callback(lambda _: self._forget_pending(digest))
+        
+        if callback is not None:
+            def notify(done):
+                if done.result() is not None:
+                    callback(done.result())
+            future.add_done_callback(notify)
+        return future
+    
+    def audio_path(self, digest):
+        """Return the path of synthesized audio, or None if it is not cached."""
+        return self.audio_cache.get(digest)
+    
+    @traced("text_to_speech")
+    def _synthesize(self, digest, text):
+        """Worker function that synthesizes text into the audio cache."""
+        if self.audio_cache.get(digest):
+            return digest
         try:
-            # Generate temporary file path
-            temp_file = os.path.join(self.temp_dir, f'speech_{time.time()}.mp3')
-            
-            # Convert text to speech
-            tts = gTTS(text=text, lang='en', slow=False)
-            tts.save(temp_file)
-            
-            # Play the audio
-            pygame.mixer.music.load(temp_file)
-            pygame.mixer.music.play()
-            
-            # Wait for playback to finish
-            while pygame.mixer.music.get_busy():
-                pygame.time.Clock().tick(10)
-                
-            # Clean up temporary file
-            os.remove(temp_file)
-            
-            return True
+            start = time.monotonic()
+            tts = gTTS(text=text, lang=self.tts_lang, tld=self.tts_tld, slow=False)
+            self.audio_cache.put(digest, tts.save)
+            TTS_SECONDS.observe(time.monotonic() - start)
+            return digest
         except Exception as e:
             print(f"Error in text_to_speech: {str(e)}")
-            return False
+            return None
     
-    def start_listening(self, callback):
-        """Start continuous speech recognition."""
-        if self.recognition_thread is not None and self.recognition_thread.is_alive():
-            return False
+    def _forget_pending(self, digest):
+        with self._pending_lock:
+            self._pending.pop(digest, None)
+    
+    def start_listening(self, session_id, on_partial, on_final):
+        """
+        Start streaming speech recognition for one client session.
         
-        self.is_listening = True
-        self.recognition_thread = threading.Thread(
-            target=self._recognition_worker,
-            args=(callback,)
-        )
-        self.recognition_thread.daemon = True
-        self.recognition_thread.start()
+        Args:
+            session_id (str): Identifies the client stream
+            on_partial (callable): Called with partial transcripts while the user speaks
+            on_final (callable): Called with the transcript of each finished utterance
+        
+        Returns:
+            bool: False if the session is already streaming
+        """
+        with self._streams_lock:
+            if session_id in self._streams:
+                return False
+            self._streams[session_id] = StreamingRecognizer(
+                self.stt_backend, self.stt_executor, on_partial, on_final
+            )
         return True
     
-    def stop_listening(self):
-        """Stop continuous speech recognition."""
-        self.is_listening = False
-        if self.recognition_thread is not None:
-            self.recognition_thread.join()
-            self.recognition_thread = None
+    def feed_audio(self, session_id, chunk):
+        """Pass a chunk of 16 kHz, 16-bit mono PCM from the client to its recognizer."""
+        with self._streams_lock:
+            stream = self._streams.get(session_id)
+        if stream is None:
+            return False
+        stream.feed(chunk)
+        return True
     
-    def _recognition_worker(self, callback):
-        """Worker function for continuous speech recognition."""
-        try:
-            with sr.Microphone() as source:
-                # Adjust for ambient noise
-                self.recognizer.adjust_for_ambient_noise(source)
-                
-                while self.is_listening:
-                    try:
-                        # Listen for speech
-                        audio = self.recognizer.listen(source, timeout=1, phrase_time_limit=10)
-                        
-                        # Recognize speech using Google Speech Recognition
-                        text = self.recognizer.recognize_google(audio)
-                        
-                        if text:
-                            # Call the callback function with the recognized text
-                            callback(text)
-                            
-                    except sr.WaitTimeoutError:
-                        continue
-                    except sr.UnknownValueError:
-                        continue
-                    except sr.RequestError as e:
-                        print(f"Could not request results; {str(e)}")
-                    except Exception as e:
-                        print(f"Error in speech recognition: {str(e)}")
-        except Exception as e:
-            print("Microphone input is not supported in this environment.")
+    def stop_listening(self, session_id):
+        """Stop streaming recognition for a session, transcribing any speech in progress."""
+        with self._streams_lock:
+            stream = self._streams.pop(session_id, None)
+        if stream is not None:
+            stream.close()
     
     def cleanup(self):
         """Clean up resources."""
-        self.stop_listening()
-        pygame.mixer.quit()
-        # Clean up temporary directory
-        if os.path.exists(self.temp_dir):
-            for file in os.listdir(self.temp_dir):
-                os.remove(os.path.join(self.temp_dir, file))
-            os.rmdir(self.temp_dir) 
+        with self._streams_lock:
+            session_ids = list(self._streams)
+        for session_id in session_ids:
+            self.stop_listening(session_id)
+        self.tts_executor.shutdown(wait=False)
+        self.stt_executor.shutdown(wait=False) 
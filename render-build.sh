@@ -1,8 +1,4 @@
 #!/bin/bash
 
-# Install PortAudio dependencies
-apt-get update
-apt-get install -y portaudio19-dev python3-pyaudio
-
 # Install Python dependencies
 pip install -r requirements.txt
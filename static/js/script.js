@@ -5,6 +5,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const sendButton = document.getElementById('send-button');
     const resultContainer = document.getElementById('result-container');
     const mbtiTitle = document.getElementById('mbti-title');
+    const mbtiDescription = document.getElementById('mbti-description');
     const mbtiOverview = document.getElementById('mbti-overview');
     const roastContainer = document.getElementById('roast-container');
     const roastToggle = document.getElementById('roast-toggle');
@@ -17,9 +18,35 @@ document.addEventListener('DOMContentLoaded', () => {
     
     // Voice state
     let isVoiceActive = false;
+    let audioContext = null;
+    let mediaStream = null;
+    let audioProcessor = null;
+    const VOICE_SAMPLE_RATE = 16000;
     
-    // Connect to Socket.IO server
-    const socket = io();
+    // Streaming state: the bot bubble receiving the next question, and raw text per report section
+    let streamingMessage = null;
+    let streamedSections = {};
+    
+    // Report sections already asked from the server
+    let requestedSections = {};
+    
+    // Whether the server has been told the user started answering the current question
+    let typingReported = false;
+    const sectionElements = {
+        insights: mbtiOverview,
+        roast: roastContainer,
+        recommendations: recommendations,
+        celebrities: doppelgangers,
+        relationship: relationshipInsights,
+        career: careerInsights
+    };
+    
+    // Connect to Socket.IO server, resuming the previous session if this tab has one.
+    // WebSocket-only transport keeps each connection on one worker, so no sticky sessions are needed
+    const socket = io({
+        transports: ['websocket'],
+        auth: (cb) => cb({ session_token: sessionStorage.getItem('mbtiSessionToken') })
+    });
     
     // Initialize chat
     init();
@@ -31,6 +58,13 @@ document.addEventListener('DOMContentLoaded', () => {
             sendMessage();
         }
     });
+    userInput.addEventListener('input', () => {
+        // Once per question, so the server can start drafting the next one
+        if (!typingReported && userInput.value.trim()) {
+            typingReported = true;
+            socket.emit('typing');
+        }
+    });
     
     voiceToggle.addEventListener('click', toggleVoice);
     roastToggle.addEventListener('click', toggleRoast);
@@ -73,6 +107,29 @@ document.addEventListener('DOMContentLoaded', () => {
         
         // Scroll to bottom of chat
         chatMessages.scrollTop = chatMessages.scrollHeight;
+        
+        return messageDiv;
+    }
+    
+    function appendStreamedToken(section, token) {
+        if (section === 'question') {
+            // Grow the pending bot message token by token
+            if (!streamingMessage) {
+                streamingMessage = addMessageToChat('bot', '');
+                streamingMessage.dataset.raw = '';
+            }
+            streamingMessage.dataset.raw += token;
+            streamingMessage.innerHTML = formatBotMessage(streamingMessage.dataset.raw);
+            chatMessages.scrollTop = chatMessages.scrollHeight;
+            return;
+        }
+        
+        // Report sections stream straight into their result panels
+        const element = sectionElements[section];
+        if (!element) return;
+        revealResults();
+        streamedSections[section] = (streamedSections[section] || '') + token;
+        element.innerHTML = formatBotMessage(streamedSections[section]);
     }
     
     function formatBotMessage(content) {
@@ -92,92 +149,59 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
     
-    function showResults(resultContent) {
-        // For debugging - log the raw result content
-        console.log("Raw result content:", resultContent);
-        
+    function revealResults() {
         // Hide chat container and show results
         document.querySelector('.chat-container').classList.add('hidden');
         resultContainer.classList.remove('hidden');
+    }
+    
+    function showResults(mbtiType, resultContent) {
+        revealResults();
+        streamedSections = {};
+        requestedSections = {};
         
-        // Extract MBTI type and title
-        const mbtiTypeMatch = resultContent.match(/🎉 Your MBTI Personality Type: (\w{4})/);
-        if (mbtiTypeMatch) {
-            const mbtiType = mbtiTypeMatch[1];
-            const mbtiTypeTitle = getMbtiTypeTitle(mbtiType);
-            mbtiTitle.innerHTML = `${mbtiType}: ${mbtiTypeTitle}`;
-            console.log("Found MBTI type:", mbtiType);
+        // The completion message carries only the type and its description
+        if (mbtiType) {
+            mbtiTitle.innerHTML = `${mbtiType}: ${getMbtiTypeTitle(mbtiType)}`;
         } else {
-            console.error("Failed to match MBTI type");
-            // Fallback to display something
             mbtiTitle.innerHTML = "Your Personality Type";
         }
+        mbtiDescription.innerHTML = formatBotMessage(
+            resultContent.replace(/🎉 Your MBTI Personality Type: \w{4}/, '').trim()
+        );
         
-        // Extract overview - updated regex to be more flexible
-        const overviewMatch = resultContent.match(/📝\s*Overview([\s\S]*?)(?=🔥\s*Roast|🎯)/i);
-        if (overviewMatch) {
-            mbtiOverview.innerHTML = formatBotMessage(overviewMatch[1]);
-            console.log("Found overview");
-        } else {
-            console.error("Failed to match overview section");
-            // Fallback for overview
-            const descriptionMatch = resultContent.match(/🎉.*?(\w{4})\s*([\s\S]*?)(?=📝|🔥|🎯)/i);
-            if (descriptionMatch) {
-                mbtiOverview.innerHTML = formatBotMessage(descriptionMatch[2]);
-                console.log("Found description as fallback for overview");
-            } else {
-                mbtiOverview.innerHTML = "<p>No overview available</p>";
+        // Sections are generated on the server when first requested: the visible ones
+        // as they scroll into view, the roast when the user asks for it
+        Object.entries(sectionElements).forEach(([section, element]) => {
+            if (section === 'roast') return;
+            element.innerHTML = '<p class="section-loading">Loading...</p>';
+            if (!('IntersectionObserver' in window)) {
+                requestSection(section);
+                return;
             }
-        }
-        
-        // Extract roast - updated regex to be more flexible
-        const roastMatch = resultContent.match(/🔥\s*Roast([\s\S]*?)(?=🎯)/i);
-        if (roastMatch) {
-            roastContainer.innerHTML = formatBotMessage(roastMatch[1]);
-            console.log("Found roast");
-        } else {
-            console.error("Failed to match roast section");
-            roastContainer.innerHTML = "<p>No roast available</p>";
-        }
-        
-        // Extract recommendations - updated regex to be more flexible
-        const recommendationsMatch = resultContent.match(/🎯[\s\S]*?recommendations([\s\S]*?)(?=Who are your celebrity|Remember|Career|Relationship)/i);
-        if (recommendationsMatch) {
-            displayRecommendations(recommendationsMatch[1]);
-            console.log("Found recommendations");
-        } else {
-            console.error("Failed to match recommendations section");
-            recommendations.innerHTML = "<p>No recommendations available</p>";
-        }
-        
-        // Extract doppelgangers - updated regex to be more flexible
-        const doppelgangersMatch = resultContent.match(/Who are your celebrity doppelgangers\?([\s\S]*?)(?=Relationship|Career|Remember)/i);
-        if (doppelgangersMatch) {
-            displayDoppelgangers(doppelgangersMatch[1]);
-            console.log("Found doppelgangers");
-        } else {
-            console.error("Failed to match doppelgangers section");
-            doppelgangers.innerHTML = "<p>No celebrity doppelgangers available</p>";
-        }
-        
-        // Extract relationship insights - updated regex to be more flexible
-        const relationshipMatch = resultContent.match(/Relationship?([\s\S]*?)(?=Career|Remember)/i);
-        if (relationshipMatch) {
-            relationshipInsights.innerHTML = formatBotMessage(relationshipMatch[1]);
-            console.log("Found relationship insights");
-        } else {
-            console.error("Failed to match relationship section");
-            relationshipInsights.innerHTML = "<p>No relationship insights available</p>";
-        }
-        
-        // Extract career insights - updated regex to be more flexible
-        const careerMatch = resultContent.match(/Career insights?([\s\S]*?)(?=Remember|$)/i);
-        if (careerMatch) {
-            careerInsights.innerHTML = formatBotMessage(careerMatch[1]);
-            console.log("Found career insights");
+            const observer = new IntersectionObserver((entries) => {
+                if (entries.some(entry => entry.isIntersecting)) {
+                    observer.disconnect();
+                    requestSection(section);
+                }
+            });
+            observer.observe(element);
+        });
+    }
+    
+    function requestSection(section) {
+        if (requestedSections[section]) return;
+        requestedSections[section] = true;
+        socket.emit('report_section', { section });
+    }
+    
+    function displaySection(section, content) {
+        if (section === 'recommendations') {
+            displayRecommendations(content);
+        } else if (section === 'celebrities') {
+            displayDoppelgangers(content);
         } else {
-            console.error("Failed to match career section");
-            careerInsights.innerHTML = "<p>No career insights available</p>";
+            sectionElements[section].innerHTML = formatBotMessage(content);
         }
     }
     
@@ -205,8 +229,12 @@ document.addEventListener('DOMContentLoaded', () => {
     
     function toggleRoast() {
         if (roastContainer.classList.contains('hidden')) {
-            // Show roast
+            // Show roast, generating it the first time
             roastContainer.classList.remove('hidden');
+            if (!requestedSections.roast) {
+                roastContainer.innerHTML = '<p class="section-loading">Loading...</p>';
+                requestSection('roast');
+            }
             roastToggle.textContent = 'Hide Roast';
         } else {
             // Hide roast
@@ -347,14 +375,60 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
     
-    function startVoice() {
+    async function startVoice() {
+        try {
+            mediaStream = await navigator.mediaDevices.getUserMedia({ audio: true });
+        } catch (error) {
+            console.error('Microphone access denied:', error);
+            updateVoiceUI(false);
+            return;
+        }
+        
+        // Tell the server a stream is coming, then send raw PCM frames as they are captured
         socket.emit('start_voice');
+        audioContext = new AudioContext();
+        const source = audioContext.createMediaStreamSource(mediaStream);
+        audioProcessor = audioContext.createScriptProcessor(4096, 1, 1);
+        audioProcessor.onaudioprocess = (event) => {
+            const samples = event.inputBuffer.getChannelData(0);
+            socket.emit('audio_chunk', toPcm16(samples, audioContext.sampleRate));
+        };
+        source.connect(audioProcessor);
+        audioProcessor.connect(audioContext.destination);
     }
     
     function stopVoice() {
+        releaseMicrophone();
         socket.emit('stop_voice');
     }
     
+    function releaseMicrophone() {
+        if (audioProcessor) {
+            audioProcessor.disconnect();
+            audioProcessor = null;
+        }
+        if (audioContext) {
+            audioContext.close();
+            audioContext = null;
+        }
+        if (mediaStream) {
+            mediaStream.getTracks().forEach(track => track.stop());
+            mediaStream = null;
+        }
+    }
+    
+    function toPcm16(samples, inputRate) {
+        // Downsample float samples to 16 kHz, 16-bit PCM as expected by the server
+        const ratio = inputRate / VOICE_SAMPLE_RATE;
+        const length = Math.floor(samples.length / ratio);
+        const pcm = new Int16Array(length);
+        for (let i = 0; i < length; i++) {
+            const sample = Math.max(-1, Math.min(1, samples[Math.floor(i * ratio)]));
+            pcm[i] = sample < 0 ? sample * 0x8000 : sample * 0x7FFF;
+        }
+        return pcm.buffer;
+    }
+    
     function updateVoiceUI(isActive) {
         isVoiceActive = isActive;
         voiceToggle.classList.toggle('active', isActive);
@@ -367,13 +441,28 @@ document.addEventListener('DOMContentLoaded', () => {
         console.log('Connected to server');
     });
     
+    socket.on('session', (data) => {
+        // Remember the session so a reload or reconnect picks up where we left off
+        sessionStorage.setItem('mbtiSessionToken', data.session_token);
+    });
+    
+    socket.on('response_chunk', (data) => {
+        appendStreamedToken(data.section, data.token);
+    });
+    
+    socket.on('report_section', (data) => {
+        // The complete section replaces its streamed text
+        streamedSections[data.section] = data.content;
+        displaySection(data.section, data.content);
+    });
+    
     socket.on('response', (data) => {
         console.log('Socket response received:', data);
         
-        if (data.voice_input) {
-            // Add the transcribed voice input to chat
-            addMessageToChat('user', data.voice_input);
-        }
+        // The final message supersedes whatever was streamed for it
+        const streamedMessage = streamingMessage;
+        streamingMessage = null;
+        typingReported = false;
         
         if (data.is_complete && data.mbti_result) {
             // Test is complete, show results
@@ -387,12 +476,18 @@ document.addEventListener('DOMContentLoaded', () => {
             });
             
             // Process the results
-            showResults(data.message);
+            showResults(data.mbti_result, data.message);
             
             // Stop voice input when test is complete
             if (isVoiceActive) {
                 stopVoice();
             }
+        } else if (streamedMessage) {
+            // Replace the streamed text with the final message
+            streamedMessage.innerHTML = data.message.includes('\n') ? formatBotMessage(data.message) : data.message;
+            
+            // Re-enable input
+            setInputState(true);
         } else {
             // Regular message, add to chat
             addMessageToChat('bot', data.message);
@@ -402,10 +497,30 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
     
+    socket.on('audio', (data) => {
+        // Play the spoken version of the latest response
+        new Audio(data.url).play().catch((error) => {
+            console.log('Audio playback was blocked:', error);
+        });
+    });
+    
+    socket.on('transcript', (data) => {
+        if (data.final) {
+            // Add the transcribed voice input to chat
+            userInput.value = '';
+            addMessageToChat('user', data.text);
+            setInputState(false);
+        } else {
+            // Show what has been understood so far
+            userInput.value = data.text;
+        }
+    });
+    
     socket.on('voice_status', (data) => {
         if (data.status === 'started') {
             updateVoiceUI(true);
         } else if (data.status === 'stopped' || data.status === 'error') {
+            releaseMicrophone();
             updateVoiceUI(false);
         }
     });
@@ -419,6 +534,7 @@ document.addEventListener('DOMContentLoaded', () => {
     socket.on('disconnect', () => {
         console.log('Disconnected from server');
         addMessageToChat('bot', 'Disconnected from server. Please refresh the page to reconnect.');
+        releaseMicrophone();
         updateVoiceUI(false);
     });
 });
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The analyzer refuses to start without a key; no test ever reaches OpenAI
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("MBTI_CLASSIFIER_PATH", os.path.join(os.path.dirname(__file__), "no-classifier.json"))
+os.environ.setdefault("MBTI_SPECULATIVE_QUESTIONS", "0")
+
+from benchmarks.fake_llm import FakeChatModel, LatencyModel
+from models.content_cache import TypeContentCache
+from models.llm_gateway import LLMGateway
+from models.response_cache import ResponseCache
+
+@pytest.fixture
+def gateway(tmp_path):
+    """Gateway answering every call from the benchmark's fake chat model, without delay."""
+    fake = FakeChatModel(latency=LatencyModel("fixed:0"))
+    return LLMGateway(
+        client_factory=lambda model_name, temperature, max_tokens, timeout: fake,
+        response_cache=ResponseCache(str(tmp_path / "llm.db")),
+    )
+
+@pytest.fixture
+def resources(gateway, tmp_path):
+    """Analyzer resources on the fake gateway and a scratch content cache."""
+    from models.mbti_analyzer import AnalyzerResources
+    return AnalyzerResources(gateway=gateway, content_cache=TypeContentCache(path=str(tmp_path / "content")))
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from models.analysis_parser import AnalysisParseError, extract_json, parse_analysis, validate_analysis
+
+ANALYSIS = {
+    "dimension_analysis": {
+        "E-I": {"confidence": 0.8, "preference": "E", "indicators": ["parties"]},
+        "S-N": {"confidence": 0.4, "preference": "N", "indicators": []},
+    },
+    "themes": ["social"],
+    "context_relevance": 0.9,
+}
+
+def test_reply_in_a_code_fence_with_prose():
+    reply = f"Sure! Here is the analysis:\n```json\n{json.dumps(ANALYSIS)}\n```\nLet me know."
+    assert extract_json(reply) == ANALYSIS
+
+def test_trailing_commas_are_tolerated():
+    reply = '{"dimension_analysis": {"E-I": {"confidence": 0.8, "preference": "E",},}, "themes": ["a",],}'
+    assert extract_json(reply)['dimension_analysis']['E-I']['preference'] == "E"
+
+def test_object_with_dimension_analysis_is_preferred():
+    reply = '{"note": "first"} and then ' + json.dumps(ANALYSIS)
+    assert 'dimension_analysis' in extract_json(reply)
+
+def test_other_object_is_returned_when_no_analysis_is_found():
+    assert extract_json('prefix {"note": 1} suffix') == {"note": 1}
+
+@pytest.mark.parametrize("reply", ["", "no json here", '{"dimension_analysis": {"E-I": ', "[1, 2, 3]"])
+def test_replies_without_an_object_are_rejected(reply):
+    with pytest.raises(AnalysisParseError):
+        extract_json(reply)
+
+def test_dimensions_and_values_are_normalized():
+    analysis = validate_analysis({"dimension_analysis": {
+        "e/i": {"confidence": "75%", "preference": "Introverted"},
+        "S/N": {"confidence": 3, "preference": "sensing"},
+        "T-F": {"confidence": 250, "preference": "t"},
+        "J-P": {"confidence": -0.2, "preference": " P "},
+    }})
+    assert analysis['dimension_analysis'] == {
+        'E-I': {'confidence': 0.75, 'preference': 'I', 'indicators': []},
+        'S-N': {'confidence': 0.03, 'preference': 'S', 'indicators': []},
+        'T-F': {'confidence': 1.0, 'preference': 'T', 'indicators': []},
+        'J-P': {'confidence': 0.0, 'preference': 'P', 'indicators': []},
+    }
+    assert analysis['themes'] == []
+    assert analysis['context_relevance'] == 0.0
+
+def test_invalid_dimensions_are_dropped():
+    analysis = validate_analysis({"dimension_analysis": {
+        "E-I": {"confidence": 0.8, "preference": "N"},
+        "S-N": {"confidence": "high", "preference": "S"},
+        "T-F": {"confidence": float("nan"), "preference": "F"},
+        "X-Y": {"confidence": 0.5, "preference": "X"},
+        "J-P": {"confidence": 0.6, "preference": "P"},
+    }})
+    assert list(analysis['dimension_analysis']) == ['J-P']
+
+@pytest.mark.parametrize("data", [
+    {},
+    {"dimension_analysis": []},
+    {"dimension_analysis": {"E-I": "E"}},
+    {"dimension_analysis": {"E-I": {"confidence": 0.8, "preference": "maybe"}}},
+])
+def test_analyses_without_a_usable_dimension_are_rejected(data):
+    with pytest.raises(AnalysisParseError):
+        validate_analysis(data)
+
+def test_parse_analysis_on_a_fenced_reply():
+    analysis = parse_analysis(f"```\n{json.dumps(ANALYSIS)}\n```")
+    assert analysis['dimension_analysis']['E-I'] == {'confidence': 0.8, 'preference': 'E', 'indicators': ['parties']}
+    assert analysis['themes'] == ['social']
@@ -0,0 +1,29 @@
+from models.answer_classifier import AnswerClassifier
+
+def lean_extravert(text):
+    """A training example the LLM analysed as a confident E with no other evidence."""
+    return text, {'dimension_analysis': {
+        dimension: {'preference': dimension[0], 'confidence': 0.9} for dimension in ['E-I', 'S-N', 'T-F', 'J-P']
+    }}
+
+def test_filler_answers_skip_the_llm():
+    analysis, local_only = AnswerClassifier().classify("ok idk")
+    assert local_only
+    assert all(data['confidence'] == 0.0 for data in analysis['dimension_analysis'].values())
+
+def test_short_meaningful_answers_go_to_the_llm():
+    for answer in ["people", "alone", "planning", "yeah, alone"]:
+        _, local_only = AnswerClassifier().classify(answer)
+        assert not local_only, answer
+
+def test_confident_model_settles_short_answers():
+    classifier = AnswerClassifier(margin=0.5).train([lean_extravert("people") for _ in range(50)], epochs=20)
+    analysis, local_only = classifier.classify("people")
+    assert local_only
+    assert analysis['dimension_analysis']['E-I']['preference'] == 'E'
+    assert analysis['dimension_analysis']['E-I']['confidence'] > 0
+
+def test_long_answers_always_go_to_the_llm():
+    classifier = AnswerClassifier(margin=0.01, rich_words=5).train([lean_extravert("people") for _ in range(50)])
+    _, local_only = classifier.classify("people people people people people people")
+    assert not local_only
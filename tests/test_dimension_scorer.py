@@ -0,0 +1,62 @@
+import pytest
+
+from models.dimension_scorer import DIMENSIONS, DimensionScorer
+
+def analysis(confidence, **preferences):
+    """A parsed analysis giving the same confidence to each preference, e.g. E='E'."""
+    return {'dimension_analysis': {
+        dimension: {'preference': preferences.get(dimension.replace('-', ''), dimension[0]), 'confidence': confidence}
+        for dimension in DIMENSIONS
+    }}
+
+def test_no_evidence_is_undecided():
+    scorer = DimensionScorer(stop_confidence=0.9, min_evidence=1.5)
+    assert not scorer.is_decisive()
+    assert scorer.certainty('E-I') == pytest.approx(0.5)
+
+def test_consistent_evidence_becomes_decisive():
+    scorer = DimensionScorer(stop_confidence=0.9, min_evidence=1.5)
+    turns = 0
+    while not scorer.is_decisive():
+        scorer.update(analysis(0.9))
+        turns += 1
+        assert turns < 20
+    assert turns > 1
+    assert scorer.result() == "ESTJ"
+
+def test_one_emphatic_answer_is_not_enough():
+    scorer = DimensionScorer(stop_confidence=0.5, min_evidence=1.5)
+    scorer.update(analysis(1.0))
+    assert scorer.certainty('E-I') >= 0.5
+    assert not scorer.resolved('E-I')
+
+def test_conflicting_evidence_stays_undecided():
+    scorer = DimensionScorer(stop_confidence=0.9, min_evidence=1.5)
+    for _ in range(5):
+        scorer.update(analysis(0.8, EI='E'))
+        scorer.update(analysis(0.8, EI='I'))
+    assert scorer.certainty('E-I') == pytest.approx(0.5)
+    assert not scorer.resolved('E-I')
+    assert not scorer.is_decisive()
+    assert scorer.most_uncertain() == 'E-I'
+
+def test_ties_go_to_the_second_letter():
+    scorer = DimensionScorer()
+    assert scorer.result() == "INFP"
+    scorer.update(analysis(0.5, EI='E'))
+    scorer.update(analysis(0.5, EI='I'))
+    assert scorer.result()[0] == 'I'
+
+def test_invalid_entries_and_missing_analyses_add_nothing():
+    scorer = DimensionScorer()
+    scorer.update(None)
+    scorer.update({'dimension_analysis': {'E-I': {'preference': 'N', 'confidence': 1.0}, 'X-Y': {}}})
+    assert all(value == 0.0 for value in scorer.evidence.values())
+
+def test_state_round_trip():
+    scorer = DimensionScorer()
+    scorer.update(analysis(0.7, EI='I', TF='F'))
+    restored = DimensionScorer()
+    restored.load_state(scorer.to_state())
+    assert restored.evidence == scorer.evidence
+    assert restored.result() == scorer.result() == "ISFJ"
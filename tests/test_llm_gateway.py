@@ -0,0 +1,22 @@
+from models.llm_gateway import SESSION_SITES, LLMGateway
+from models.response_cache import ResponseCache
+
+def test_per_turn_sites_skip_the_response_cache_by_default(monkeypatch, tmp_path):
+    monkeypatch.delenv("MBTI_LLM_CACHE_BYPASS", raising=False)
+    gateway = LLMGateway(response_cache=ResponseCache(str(tmp_path / "llm.db")))
+    assert gateway.cache_bypass == set(SESSION_SITES)
+
+def test_per_turn_sites_can_opt_in_to_the_response_cache(monkeypatch, tmp_path):
+    monkeypatch.setenv("MBTI_LLM_CACHE_BYPASS", "")
+    gateway = LLMGateway(response_cache=ResponseCache(str(tmp_path / "llm.db")))
+    assert gateway.cache_bypass == set()
+
+def test_per_turn_replies_are_not_stored(gateway):
+    gateway.predict("same prompt", site="question")
+    gateway.predict("same prompt", site="question")
+    assert gateway.response_cache.stats()['writes'] == 0
+
+def test_report_replies_are_stored(gateway):
+    first = gateway.predict("same prompt", site="roast")
+    assert gateway.predict("same prompt", site="roast") == first
+    assert gateway.response_cache.stats()['hits'] == 1
@@ -0,0 +1,114 @@
+import asyncio
+import copy
+import threading
+
+from models.answer_classifier import ExampleLog
+from models.llm_gateway import GatewayBusy, current_session
+from models.mbti_analyzer import MBTIAnalyzer
+
+ANSWERS = [
+    "I love going to parties and meeting new people, it gives me so much energy.",
+    "I usually dive right in and figure things out as I go along.",
+    "Spending the day outdoors with a big group of friends, trying something new.",
+    "I go with my gut and think about how everyone involved will feel.",
+    "I like to keep my options open rather than plan everything in advance.",
+]
+
+def refuse_questions(gateway, asynchronous=False):
+    """Make the gateway raise GatewayBusy on every question call."""
+    predict = gateway.apredict if asynchronous else gateway.predict
+
+    def check(site):
+        if site == 'question':
+            raise GatewayBusy("question call refused")
+
+    if asynchronous:
+        async def apredict(prompt, *args, site=None, **kwargs):
+            check(site)
+            return await predict(prompt, *args, site=site, **kwargs)
+        gateway.apredict = apredict
+    else:
+        def sync_predict(prompt, *args, site=None, **kwargs):
+            check(site)
+            return predict(prompt, *args, site=site, **kwargs)
+        gateway.predict = sync_predict
+
+def start(resources):
+    """An analyzer past the opening questions, which never call the LLM for a question."""
+    current_session.set("rollback-test")
+    analyzer = MBTIAnalyzer(resources, turn_mode='split')
+    # Keep the test going however decisive the fake analyses are
+    analyzer.min_responses = 100
+    analyzer.process_message("")
+    analyzer.process_message("ready")
+    for answer in ANSWERS[:len(MBTIAnalyzer.initial_questions) - 1]:
+        analyzer.process_message(answer)
+    return analyzer
+
+def test_busy_turn_is_rolled_back(resources):
+    analyzer = start(resources)
+    # Deep copy, so the comparison cannot pass by sharing the analyzer's own lists
+    before = copy.deepcopy(analyzer.to_state())
+    refuse_questions(resources.gateway)
+
+    reply, complete, _ = analyzer.process_message(ANSWERS[len(MBTIAnalyzer.initial_questions) - 1])
+
+    assert reply == analyzer.busy_message
+    assert not complete
+    assert analyzer.to_state() == before
+
+def test_busy_async_turn_is_rolled_back(resources):
+    analyzer = start(resources)
+    before = copy.deepcopy(analyzer.to_state())
+    refuse_questions(resources.gateway, asynchronous=True)
+
+    reply, _, _ = asyncio.run(analyzer.aprocess_message(ANSWERS[len(MBTIAnalyzer.initial_questions) - 1]))
+
+    assert reply == analyzer.busy_message
+    assert analyzer.to_state() == before
+
+def test_resent_answer_is_stored_once(resources):
+    analyzer = start(resources)
+    answered = len(analyzer.conversation_context)
+    predict = resources.gateway.predict
+    refuse_questions(resources.gateway)
+    message = ANSWERS[len(MBTIAnalyzer.initial_questions) - 1]
+    analyzer.process_message(message)
+
+    resources.gateway.predict = predict
+    analyzer.process_message(message)
+
+    assert len(analyzer.conversation_context) == answered + 1
+
+def test_state_is_a_copy(resources):
+    analyzer = start(resources)
+    state = analyzer.to_state()
+    state['conversation_context'].append({'answer': "not part of the session"})
+    state['dimension_coverage']['E-I'] = 99.0
+
+    assert len(analyzer.conversation_context) == len(state['conversation_context']) - 1
+    assert analyzer.dimension_coverage['E-I'] != 99.0
+
+def test_async_turn_logs_examples_off_the_loop(resources, tmp_path):
+    log = ExampleLog(str(tmp_path / "examples.jsonl"))
+    append = log.append
+    threads = []
+
+    def recording_append(text, analysis):
+        threads.append(threading.get_ident())
+        append(text, analysis)
+
+    log.append = recording_append
+    resources.example_log = log
+    current_session.set("example-log-test")
+    analyzer = MBTIAnalyzer(resources, turn_mode='split')
+
+    async def scenario():
+        await analyzer.aprocess_message("")
+        await analyzer.aprocess_message("ready")
+        await analyzer.aprocess_message(ANSWERS[0])
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(scenario())
+    assert [text for text, _ in log.read()] == [ANSWERS[0]]
+    assert threads and loop_thread not in threads
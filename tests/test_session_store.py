@@ -0,0 +1,87 @@
+import os
+import time
+
+import pytest
+
+from models.session_manager import SessionManager
+from models.session_store import InMemorySessionStore, SQLiteSessionStore, make_store
+
+STATE = {
+    'version': 3,
+    'conversation_context': [{'question': "What energizes you?", 'response': "People", 'analysis': None}],
+    'dimension_coverage': {'E-I': 0.4, 'S-N': 0.0, 'T-F': 0.0, 'J-P': 0.0},
+    'current_question': "Tell me more — what's a great weekend?",
+}
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemorySessionStore()
+    if request.param == "sqlite":
+        return SQLiteSessionStore(str(tmp_path / "sessions.db"))
+    url = os.environ.get("MBTI_TEST_REDIS_URL")
+    if not url:
+        pytest.skip("Set MBTI_TEST_REDIS_URL to test the Redis session store")
+    store = make_store(url)
+    store.prefix = f"mbti:test:{time.time_ns()}:"
+    return store
+
+def test_state_round_trip(store):
+    store.save("token", STATE)
+    assert store.load("token") == STATE
+    assert store.count() == 1
+
+def test_loaded_state_is_a_copy(store):
+    store.save("token", STATE)
+    store.load("token")['conversation_context'].append({})
+    assert store.load("token") == STATE
+
+def test_unknown_and_deleted_sessions(store):
+    assert store.load("missing") is None
+    store.save("token", STATE)
+    store.delete("token")
+    assert store.load("token") is None
+    assert store.count() == 0
+
+def test_memory_store_drops_the_least_recently_used():
+    store = InMemorySessionStore(max_sessions=2)
+    store.save("a", STATE)
+    store.save("b", STATE)
+    store.load("a")
+    store.save("c", STATE)
+    assert store.load("b") is None
+    assert store.load("a") == STATE
+
+def test_idle_sessions_expire(tmp_path):
+    for store in [InMemorySessionStore(idle_ttl=0.05), SQLiteSessionStore(str(tmp_path / "sessions.db"), idle_ttl=0.05)]:
+        store.save("token", STATE)
+        time.sleep(0.1)
+        assert store.load("token") is None
+
+def test_sqlite_store_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    SQLiteSessionStore(path).save("token", STATE)
+    assert SQLiteSessionStore(path).load("token") == STATE
+
+def test_make_store_parses_urls(tmp_path):
+    assert isinstance(make_store("memory"), InMemorySessionStore)
+    assert isinstance(make_store(f"sqlite:///{tmp_path / 'sessions.db'}"), SQLiteSessionStore)
+    with pytest.raises(ValueError):
+        make_store("postgres://localhost/sessions")
+
+def test_session_resumes_on_another_worker(resources, tmp_path):
+    path = str(tmp_path / "sessions.db")
+    first = SessionManager(resources, store=SQLiteSessionStore(path))
+    token = first.bind("sid-1")
+    with first.session(token) as analyzer:
+        analyzer.process_message("")
+        analyzer.process_message("ready")
+        analyzer.process_message("I love meeting new people at big parties.")
+    # Taken after the save, which bumps the state version
+    expected = analyzer.to_state()
+
+    # A second worker with its own analyzer cache, sharing only the store
+    second = SessionManager(resources, store=SQLiteSessionStore(path))
+    assert second.bind("sid-2", token) == token
+    with second.session(token, save=False) as analyzer:
+        assert analyzer.to_state() == expected
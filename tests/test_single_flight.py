@@ -0,0 +1,124 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import pytest
+
+from models.llm_gateway import DeadlineExceeded, deadline
+from models.single_flight import AsyncSingleFlight, SingleFlight
+
+def blocking(started, release, result="done", error=None):
+    """Work that signals when it starts and finishes once released."""
+    def fn():
+        started.set()
+        release.wait(5)
+        if error is not None:
+            raise error
+        return result
+    return fn
+
+def test_concurrent_callers_share_one_result():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        return blocking(started, release)()
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, "key", work)
+        started.wait(5)
+        follower = pool.submit(flight.do, "key", work)
+        while flight.shared == 0:
+            pass
+        release.set()
+        assert leader.result() == ("done", False)
+        assert follower.result() == ("done", True)
+    assert len(calls) == 1
+
+def test_concurrent_callers_share_the_error():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    work = blocking(started, release, error=ValueError("boom"))
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, "key", work)
+        started.wait(5)
+        follower = pool.submit(flight.do, "key", work)
+        while flight.shared == 0:
+            pass
+        release.set()
+        with pytest.raises(ValueError):
+            leader.result()
+        with pytest.raises(ValueError):
+            follower.result()
+
+def test_finished_calls_are_not_shared():
+    flight = SingleFlight()
+    assert flight.do("key", lambda: 1) == (1, False)
+    assert flight.do("key", lambda: 2) == (2, False)
+
+def test_waiter_gives_up_after_its_timeout():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        leader = pool.submit(flight.do, "key", blocking(started, release))
+        started.wait(5)
+        with pytest.raises(TimeoutError):
+            flight.do("key", lambda: "unused", timeout=0.05)
+        release.set()
+        # The leader's work is not affected by the waiter giving up
+        assert leader.result() == ("done", False)
+
+def test_async_callers_share_one_result():
+    async def scenario():
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "done"
+
+        results = await asyncio.gather(flight.do("key", work), flight.do("key", work))
+        return results, calls
+
+    results, calls = asyncio.run(scenario())
+    assert results == [("done", False), ("done", True)]
+    assert len(calls) == 1
+
+def test_async_waiter_gives_up_without_cancelling_the_work():
+    async def scenario():
+        flight = AsyncSingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.1)
+            return "done"
+
+        leader = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.TimeoutError):
+            await flight.do("key", work, timeout=0.01)
+        return await leader
+
+    assert asyncio.run(scenario()) == ("done", False)
+
+def test_gateway_waiter_keeps_its_own_deadline(gateway, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_call(*args, **kwargs):
+        started.set()
+        release.wait(5)
+        return "late reply"
+
+    monkeypatch.setattr(gateway, "_call", slow_call)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        # The leader has no deadline; the waiter has a short one
+        leader = pool.submit(gateway.predict, "same prompt", site="roast")
+        started.wait(5)
+        with deadline(0.05), pytest.raises(DeadlineExceeded):
+            gateway.predict("same prompt", site="roast")
+        release.set()
+        assert leader.result() == "late reply"